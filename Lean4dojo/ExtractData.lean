@@ -42,8 +42,13 @@ def getImports (header: TSyntax `Lean.Parser.Module.header) : IO String := do
 
 /--
 Trace a *.lean file.
+
+By default the whole trace is written to `ast.json` at the end. With `opts.stream`,
+`ast.jsonl` gets one `commandAST` record per command up front, then the `premiseDef`,
+`tactic` and `premise` records of each top-level command as soon as it is traversed.
+Components not selected in `opts` are neither traced nor written.
 -/
-unsafe def processFile (path : FilePath) : IO Unit := do
+unsafe def processFile (path : FilePath) (opts : TraceOptions := {}) : IO Unit := do
   println! s!"processFile, path: {path}"
   let input ← IO.FS.readFile path
   enableInitializersExecution
@@ -63,22 +68,43 @@ unsafe def processFile (path : FilePath) : IO Unit := do
   let env' := s.commandState.env
   let commands := s.commands.pop -- Remove EOI command.
   let trees := s.commandState.infoState.trees.toArray
-
-  let traceM := (traverseForest trees env').run' ⟨#[header] ++ commands, #[], #[]⟩
-  let (trace, _) ← traceM.run'.toIO {fileName := s!"{path}", fileMap := FileMap.ofString input} {env := env}
+  let commandASTs : Array Syntax := #[header] ++ commands
 
   let cwd ← IO.currentDir
   assert! cwd.fileName != "lean4"
 
   let some relativePath := Path.relativeTo path cwd | throw $ IO.userError s!"Invalid path: {path}"
-  let json_path := Path.toBuildDir "ir" relativePath "ast.json" |>.get!
-  Path.makeParentDirs json_path
-  IO.FS.writeFile json_path (toJson trace).pretty
+
+  let runTrace (init : TraceState) : IO (Trace × TraceState) := do
+    let traceM := (traverseForest trees env').run init
+    let ((trace, traceState), _) ← traceM.run'.toIO {fileName := s!"{path}", fileMap := FileMap.ofString input} {env := env}
+    return (trace, traceState)
+
+  let traceState ← if opts.stream then do
+    let jsonl_path := Path.toBuildDir "ir" relativePath "ast.jsonl" |>.get!
+    Path.makeParentDirs jsonl_path
+    IO.FS.withFile jsonl_path .write fun h => do
+      if opts.asts then
+        for stx in commandASTs do
+          h.putStrLn (Json.mkObj [("commandAST", toJson stx)]).compress
+        h.flush
+      let (_, traceState) ← runTrace { trace := ⟨#[], #[], #[], #[]⟩, opts := opts, stream := some h }
+      return traceState
+  else do
+    let asts := if opts.asts then commandASTs else #[]
+    let (trace, traceState) ← runTrace { trace := ⟨asts, #[], #[], #[]⟩, opts := opts }
+    let json_path := Path.toBuildDir "ir" relativePath "ast.json" |>.get!
+    Path.makeParentDirs json_path
+    IO.FS.writeFile json_path (trace.toJsonWith opts).pretty
+    pure traceState
 
   let dep_path := Path.toBuildDir "ir" relativePath "dep_paths" |>.get!
   Path.makeParentDirs dep_path
   IO.FS.writeFile dep_path (← getImports header)
 
+  let ppTotal := traceState.ppHits + traceState.ppMisses
+  let ppHitRate := if ppTotal == 0 then 0 else traceState.ppHits * 100 / ppTotal
+  println! s!"INFO: pp cache: {traceState.ppHits} hits, {traceState.ppMisses} misses ({ppHitRate}% hit rate)"
   println! s!"INFO: Success to process: {path}"
 
 /--
@@ -115,7 +141,7 @@ def shouldProcess (path : FilePath) (extractLeanPath : String) (noDeps : Bool) :
 /--
 Trace all *.lean files in the current directory whose corresponding *.olean file exists.
 -/
-def processAllFiles (extractLeanPath : String) (noDeps : Bool) : IO Unit := do
+def processAllFiles (extractLeanPath : String) (noDeps : Bool) (flags : List String := []) : IO Unit := do
   let cwd ← IO.currentDir
   IO.println s!"processAllFiles, extractLeanPath: {extractLeanPath}, noDeps: {noDeps}, at {cwd}"
   assert! cwd.fileName != "lean4"
@@ -124,7 +150,7 @@ def processAllFiles (extractLeanPath : String) (noDeps : Bool) : IO Unit := do
   for path in ← System.FilePath.walkDir cwd do
     if ← shouldProcess path extractLeanPath noDeps then
       let t ← IO.asTask $ IO.Process.run
-        {cmd := "lake", args := #["env", "lean", "--run", extractLeanPath, path.toString]}
+        {cmd := "lake", args := #["env", "lean", "--run", extractLeanPath, path.toString] ++ flags.toArray}
       tasks := tasks.push (t, path)
 
   for (t, path) in tasks do
@@ -138,8 +164,10 @@ def processAllFiles (extractLeanPath : String) (noDeps : Bool) : IO Unit := do
       pure ()
 
 unsafe def process (extractLeanPath : String) (args : List String) : IO Unit := do
+  let (flags, args) := args.partition (·.startsWith "--")
+  let opts ← TraceOptions.parse flags
   match args with
-  | ["noDeps"] => processAllFiles (extractLeanPath := extractLeanPath) (noDeps := false)
-  | [path] => processFile (← Path.toAbsolute ⟨path⟩)
-  | [] => processAllFiles (extractLeanPath := extractLeanPath) (noDeps := false)
+  | ["noDeps"] => processAllFiles (extractLeanPath := extractLeanPath) (noDeps := false) flags
+  | [path] => processFile (← Path.toAbsolute ⟨path⟩) opts
+  | [] => processAllFiles (extractLeanPath := extractLeanPath) (noDeps := false) flags
   | _ => throw $ IO.userError "Invalid arguments"
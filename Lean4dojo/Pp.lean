@@ -78,4 +78,52 @@ def ppGoals (ctx : ContextInfo) (goals : List MVarId) : IO String :=
     return (← fmt).pretty.trim
 
 
+private unsafe def mctxAddrImpl (mctx : MetavarContext) : USize :=
+  ptrAddrUnsafe mctx
+
+/--
+Identity of a `MetavarContext`. Only meaningful while the context is alive: the cache is
+emptied after every top-level command (see `Traversal.traverseForest`), and the `InfoTree`
+of the command being traversed keeps all of its contexts alive until then.
+-/
+@[implemented_by mctxAddrImpl]
+private opaque mctxAddr (mctx : MetavarContext) : USize
+
+
+/--
+Entries kept in `TraceState.ppCache`; past it the oldest entry is evicted for each new one.
+-/
+def ppCacheLimit : Nat := 4096
+
+
+/--
+Make room for one more entry in `ppCache` by dropping the oldest one when it is full.
+The state after a step is looked up again right away as the state before the next step,
+so the oldest entries are the least likely to be hit.
+-/
+private def evictOldest (st : TraceState) : TraceState :=
+  if st.ppCache.size < ppCacheLimit then
+    st
+  else
+    match st.ppOrder.dequeue? with
+    | some (oldest, order) => { st with ppCache := st.ppCache.erase oldest, ppOrder := order }
+    | none => st
+
+
+/--
+`ppGoals` memoized per (metavariable context, goals). In a tactic sequence the state
+after one step is the state before the next, so most states would be printed twice.
+-/
+def ppGoalsCached (ctx : ContextInfo) (mctx : MetavarContext) (goals : List MVarId) : TraceM String := do
+  let key := (mctxAddr mctx, goals)
+  if let some s := (← get).ppCache[key]? then
+    modify fun st => { st with ppHits := st.ppHits + 1 }
+    return s
+  let s ← ppGoals { ctx with mctx := mctx } goals
+  modify fun st =>
+    let st := evictOldest st
+    { st with ppCache := st.ppCache.insert key s, ppOrder := st.ppOrder.enqueue key, ppMisses := st.ppMisses + 1 }
+  return s
+
+
 end Pp
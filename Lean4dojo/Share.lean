@@ -1,5 +1,6 @@
 import Lean
 import Lake
+import Std.Data.HashMap
 
 
 open Lean Elab System
@@ -31,14 +32,22 @@ deriving ToJson
 
 
 /--
-The trace of a premise.
+Where a premise is defined. Stored once per constant in `Trace.premiseDefs`.
 -/
-structure PremiseTrace where
+structure PremiseDef where
   fullName: String            -- Fully-qualified name of the premise.
   defPos: Option Position     -- Where the premise is defined.
   defEndPos: Option Position
   modName: String             -- In which module the premise is defined.
   defPath: String             -- The path of the file where the premise is defined.
+deriving ToJson
+
+
+/--
+The trace of a premise.
+-/
+structure PremiseTrace where
+  defIdx: Nat                 -- Index of the premise in `Trace.premiseDefs`.
   pos: Option Position        -- Where the premise is used.
   endPos: Option Position
 deriving ToJson
@@ -50,8 +59,96 @@ The trace of a Lean file.
 structure Trace where
   commandASTs : Array Syntax    -- The ASTs of the commands in the file.
   tactics: Array TacticTrace    -- All tactics in the file.
-  premises: Array PremiseTrace  -- All premises in the file.
+  premiseDefs: Array PremiseDef -- Every premise used in the file, once per constant.
+  premises: Array PremiseTrace  -- All premise uses in the file.
 deriving ToJson
 
 
-abbrev TraceM := StateT Trace MetaM
+/--
+Options of a tracing run, parsed from the `--flags` on the command line.
+-/
+structure TraceOptions where
+  stream : Bool := false  -- Write `ast.jsonl` records per top-level command instead of one `ast.json`.
+  asts : Bool := true     -- Keep the command ASTs.
+  tactics : Bool := true  -- Trace tactics, which pretty-prints every proof state.
+  premises : Bool := true -- Trace premises.
+
+
+/--
+Parse `--stream` and `--components=asts,tactics,premises` (any non-empty subset, each at most once;
+empty pieces such as a trailing comma are ignored).
+-/
+def TraceOptions.parse (flags : List String) : IO TraceOptions := do
+  let mut opts : TraceOptions := {}
+  for flag in flags do
+    if flag == "--stream" then
+      opts := { opts with stream := true }
+    else if flag.startsWith "--components=" then
+      let components := (flag.drop "--components=".length).splitOn "," |>.filter (· != "")
+      if components.isEmpty then
+        throw $ IO.userError "empty --components"
+      let mut seen : List String := []
+      for c in components do
+        if c != "asts" ∧ c != "tactics" ∧ c != "premises" then
+          throw $ IO.userError s!"Invalid component: {c}"
+        if seen.contains c then
+          throw $ IO.userError s!"Duplicate component: {c}"
+        seen := c :: seen
+      opts := { opts with
+        asts := components.contains "asts",
+        tactics := components.contains "tactics",
+        premises := components.contains "premises"
+      }
+    else
+      throw $ IO.userError s!"Invalid option: {flag}"
+  return opts
+
+
+/--
+Serialize only the components selected in `opts`; the others are left out of the JSON.
+-/
+def Trace.toJsonWith (trace : Trace) (opts : TraceOptions) : Json :=
+  Json.mkObj $
+    (if opts.asts then [("commandASTs", toJson trace.commandASTs)] else []) ++
+    (if opts.tactics then [("tactics", toJson trace.tactics)] else []) ++
+    (if opts.premises then [("premiseDefs", toJson trace.premiseDefs), ("premises", toJson trace.premises)] else [])
+
+
+/--
+The state of a traversal: the trace being built and caches that are not serialized.
+-/
+structure TraceState where
+  trace : Trace
+  opts : TraceOptions := {}
+  stream : Option IO.FS.Handle := none          -- Where `flushStream` writes records in streaming mode.
+  defCache : Std.HashMap Name PremiseDef := {}  -- Resolved premise metadata, per constant.
+  defIdx : Std.HashMap Name Nat := {}           -- Position of each constant in `trace.premiseDefs`.
+  ppCache : Std.HashMap (USize × List MVarId) String := {}  -- Pretty-printed proof states of the current command, see `Pp.ppGoalsCached`.
+  ppOrder : Std.Queue (USize × List MVarId) := .empty       -- Keys of `ppCache`, oldest first.
+  ppHits : Nat := 0
+  ppMisses : Nat := 0
+
+
+abbrev TraceM := StateT TraceState MetaM
+
+
+def modifyTrace (f : Trace → Trace) : TraceM Unit :=
+  modify fun s => { s with trace := f s.trace }
+
+
+/--
+In streaming mode, write the tactics and premises collected so far as one JSON record
+per line and drop them from memory. Premise definitions come first and in `defIdx` order,
+so every premise refers to a definition already written.
+-/
+def flushStream : TraceM Unit := do
+  let some h := (← get).stream | return ()
+  let trace := (← get).trace
+  for d in trace.premiseDefs do
+    h.putStrLn (Json.mkObj [("premiseDef", toJson d)]).compress
+  for t in trace.tactics do
+    h.putStrLn (Json.mkObj [("tactic", toJson t)]).compress
+  for p in trace.premises do
+    h.putStrLn (Json.mkObj [("premise", toJson p)]).compress
+  h.flush
+  modifyTrace fun trace => { trace with tactics := #[], premiseDefs := #[], premises := #[] }
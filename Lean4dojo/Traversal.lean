@@ -31,10 +31,8 @@ private def visitTacticInfo (ctx : ContextInfo) (ti : TacticInfo) (parent : Info
   | .node (Info.ofTacticInfo i) _ =>
     match i.stx.getKind with
     | ``Lean.Parser.Tactic.tacticSeq1Indented | ``Lean.Parser.Tactic.tacticSeqBracketed | ``Lean.Parser.Tactic.rewriteSeq =>
-      let ctxBefore := { ctx with mctx := ti.mctxBefore }
-      let ctxAfter := { ctx with mctx := ti.mctxAfter }
-      let stateBefore ← Pp.ppGoals ctxBefore ti.goalsBefore
-      let stateAfter ← Pp.ppGoals ctxAfter ti.goalsAfter
+      let stateBefore ← Pp.ppGoalsCached ctx ti.mctxBefore ti.goalsBefore
+      let stateAfter ← Pp.ppGoalsCached ctx ti.mctxAfter ti.goalsAfter
       if stateBefore == "no goals" || stateBefore == stateAfter then
         pure ()
       else
@@ -42,7 +40,7 @@ private def visitTacticInfo (ctx : ContextInfo) (ti : TacticInfo) (parent : Info
         let some posAfter := ti.stx.getTailPos? true | pure ()
         match ti.stx with
         | .node _ _ _ =>
-          modify fun trace => {
+          modifyTrace fun trace => {
             trace with tactics := trace.tactics.push {
               stateBefore := stateBefore,
               stateAfter := stateAfter,
@@ -56,19 +54,12 @@ private def visitTacticInfo (ctx : ContextInfo) (ti : TacticInfo) (parent : Info
 
 
 /--
-Extract premise information from `TermInfo` in `InfoTree`.
+Resolve where a premise is defined. `findDeclarationRanges?` and `Path.findLean` run
+at most once per constant, later uses hit `defCache`.
 -/
-private def visitTermInfo (ti : TermInfo) (env : Environment) : TraceM Unit := do
-  let some fullName := ti.expr.constName? | return ()
-  let fileMap ← getFileMap
-
-  let posBefore := match ti.toElabInfo.stx.getPos? with
-    | some posInfo => fileMap.toPosition posInfo
-    | none => none
-
-  let posAfter := match ti.toElabInfo.stx.getTailPos? with
-    | some posInfo => fileMap.toPosition posInfo
-    | none => none
+private def resolvePremiseDef (fullName : Name) (env : Environment) : TraceM PremiseDef := do
+  if let some premiseDef := (← get).defCache[fullName]? then
+    return premiseDef
 
   let decRanges ← withEnv env $ findDeclarationRanges? fullName
   let defPos := decRanges >>= fun (decR : DeclarationRanges) => decR.selectionRange.pos
@@ -86,14 +77,54 @@ private def visitTermInfo (ti : TermInfo) (env : Environment) : TraceM Unit := d
   if defPath.startsWith "/lake/" then
     defPath := ".lake/" ++ (defPath.drop 6)
 
-  if defPos != posBefore ∧ defEndPos != posAfter then  -- Don't include defintions as premises.
-    modify fun trace => {
+  let premiseDef : PremiseDef := {
+    fullName := toString fullName,
+    defPos := defPos,
+    defEndPos := defEndPos,
+    defPath := defPath,
+    modName := toString modName,
+  }
+  modify fun s => { s with defCache := s.defCache.insert fullName premiseDef }
+  return premiseDef
+
+
+/--
+Index of a premise in `Trace.premiseDefs`, adding it on its first use.
+-/
+private def premiseIndex (fullName : Name) (premiseDef : PremiseDef) : TraceM Nat := do
+  let s ← get
+  if let some idx := s.defIdx[fullName]? then
+    return idx
+  let idx := s.defIdx.size  -- `trace.premiseDefs` is emptied by `flushStream` in streaming mode.
+  set { s with
+    trace := { s.trace with premiseDefs := s.trace.premiseDefs.push premiseDef },
+    defIdx := s.defIdx.insert fullName idx
+  }
+  return idx
+
+
+/--
+Extract premise information from `TermInfo` in `InfoTree`.
+-/
+private def visitTermInfo (ti : TermInfo) (env : Environment) : TraceM Unit := do
+  let some fullName := ti.expr.constName? | return ()
+  let fileMap ← getFileMap
+
+  let posBefore := match ti.toElabInfo.stx.getPos? with
+    | some posInfo => fileMap.toPosition posInfo
+    | none => none
+
+  let posAfter := match ti.toElabInfo.stx.getTailPos? with
+    | some posInfo => fileMap.toPosition posInfo
+    | none => none
+
+  let premiseDef ← resolvePremiseDef fullName env
+
+  if premiseDef.defPos != posBefore ∧ premiseDef.defEndPos != posAfter then  -- Don't include defintions as premises.
+    let defIdx ← premiseIndex fullName premiseDef
+    modifyTrace fun trace => {
         trace with premises := trace.premises.push {
-          fullName := toString fullName,
-          defPos := defPos,
-          defEndPos := defEndPos,
-          defPath := defPath,
-          modName := toString modName,
+          defIdx := defIdx,
           pos := posBefore,
           endPos := posAfter,
         }
@@ -101,9 +132,10 @@ private def visitTermInfo (ti : TermInfo) (env : Environment) : TraceM Unit := d
 
 
 private def visitInfo (ctx : ContextInfo) (i : Info) (parent : InfoTree) (env : Environment) : TraceM Unit := do
+  let opts := (← get).opts
   match i with
-  | .ofTacticInfo ti => visitTacticInfo ctx ti parent
-  | .ofTermInfo ti => visitTermInfo ti env
+  | .ofTacticInfo ti => if opts.tactics then visitTacticInfo ctx ti parent
+  | .ofTermInfo ti => if opts.premises then visitTermInfo ti env
   | _ => pure ()
 
 
@@ -132,11 +164,18 @@ private def traverseTopLevelTree (tree : InfoTree) (env : Environment) : TraceM
 
 /--
 Process an array of `InfoTree` (one for each top-level command in the file).
+In streaming mode the records of each command are written as soon as it is traversed.
+Proof states are only cached within a command, so the cache does not grow with the file.
 -/
 def traverseForest (trees : Array InfoTree) (env : Environment) : TraceM Trace := do
+  let opts := (← get).opts
+  if ¬ opts.tactics ∧ ¬ opts.premises then
+    return (← get).trace
   for t in trees do
     traverseTopLevelTree t env
-  get
+    flushStream
+    modify fun s => { s with ppCache := {}, ppOrder := .empty }
+  return (← get).trace
 
 
 end Traversal
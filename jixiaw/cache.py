@@ -0,0 +1,141 @@
+import gc
+import os
+import types
+import typing
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Callable, Optional, Self, Union
+
+import msgspec
+import pydantic
+
+# =============================
+# Parsed-module cache
+# =============================
+# 把驗證過的 plugin 輸出以 msgpack 存在 <output_dir>/.cache，下次直接重建 model，
+# 不用再 parse JSON 也不用再跑 pydantic validation（驗證是 load_info 最慢的部分）。
+# key 是 JSON 檔的大小與 mtime；JSON 重新產生後 key 不同，就重新 parse 並覆寫 cache。
+# 重建時不做驗證，model_fields_set 會是全部欄位。
+
+CACHE_VERSION = 1
+
+_object_setattr = object.__setattr__
+
+
+def _make_builder(tp, owner, builders: dict) -> Optional[Callable[[Any], Any]]:
+    """Function turning the msgpack form of tp back into tp, None if it is already the same"""
+    if tp is Self:
+        tp = owner
+    origin = typing.get_origin(tp)
+
+    if origin is typing.Annotated:
+        return _make_builder(typing.get_args(tp)[0], owner, builders)
+
+    if origin is Union or origin is types.UnionType:
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        inner = [b for b in (_make_builder(a, owner, builders) for a in args) if b is not None]
+        if not inner:
+            return None
+        if len(inner) > 1:
+            raise TypeError(f"cannot cache ambiguous union {tp}")
+        b = inner[0]
+        return lambda v: None if v is None else b(v)
+
+    if origin in (list, Sequence, typing.Sequence) or tp in (list, Sequence):
+        args = typing.get_args(tp)
+        b = _make_builder(args[0], owner, builders) if args else None
+        if b is None:
+            return None
+        return lambda v: [b(x) for x in v]
+
+    if origin is tuple:
+        return tuple
+
+    if isinstance(tp, type) and issubclass(tp, tuple) and hasattr(tp, "_fields"):
+        return lambda v: tp(*v)
+
+    if isinstance(tp, type) and issubclass(tp, pydantic.BaseModel):
+        return _model_builder(tp, builders)
+
+    return None
+
+
+def _model_builder(cls, builders: dict):
+    if cls in builders:
+        # 遞迴型別（InfoTree.children）：先回傳會查表的函式
+        return lambda v: builders[cls](v)
+    builders[cls] = None
+    fields = []
+    for name, info in cls.model_fields.items():
+        fields.append((name, _make_builder(info.annotation, cls, builders)))
+    plain = [name for name, b in fields if b is None]
+    nested = [(name, b) for name, b in fields if b is not None]
+    field_names = set(cls.model_fields)
+
+    def build(v: dict):
+        d = {name: v[name] for name in plain}
+        for name, b in nested:
+            d[name] = b(v[name])
+        m = cls.__new__(cls)
+        _object_setattr(m, '__dict__', d)
+        _object_setattr(m, '__pydantic_fields_set__', set(field_names))
+        _object_setattr(m, '__pydantic_extra__', None)
+        _object_setattr(m, '__pydantic_private__', None)
+        return m
+
+    builders[cls] = build
+    return build
+
+
+_BUILDERS: dict = {}
+_ENCODER = msgspec.msgpack.Encoder()
+_DECODER = msgspec.msgpack.Decoder()
+
+
+def _json_key(json_path: Path) -> list:
+    st = os.stat(json_path)
+    return [CACHE_VERSION, st.st_size, st.st_mtime_ns]
+
+
+def cache_path(json_path, cache_dir=None) -> Path:
+    json_path = Path(json_path)
+    if cache_dir is None:
+        cache_dir = json_path.parent / ".cache"
+    return Path(cache_dir) / (json_path.stem + ".msgpack")
+
+
+def load_cached(json_path, cls, loader: Callable[[Path], list], cache_dir=None) -> list:
+    """
+    Load a list of cls from json_path through the cache.
+    loader(json_path) is only called when the cache is missing or stale.
+    """
+    json_path = Path(json_path)
+    path = cache_path(json_path, cache_dir)
+    key = _json_key(json_path)
+    # 一次建立幾十萬個物件時，大部分時間花在 gc 反覆掃描，載入期間先關掉
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, 'rb') as fd:
+            cached_key, data = _DECODER.decode(fd.read())
+        if cached_key == key:
+            build = _BUILDERS.get(cls) or _model_builder(cls, _BUILDERS)
+            return [build(v) for v in data]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"xxxxx ignore broken cache {path}: {e}")
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    models = loader(json_path)
+    # loader 失敗時 (from_json_file 回傳 []) 不寫 cache，下次再試
+    if models:
+        data = [m.model_dump(by_alias=False) for m in models]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, 'wb') as fd:
+            fd.write(_ENCODER.encode([key, data]))
+        os.replace(tmp, path)
+    return models
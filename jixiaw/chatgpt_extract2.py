@@ -92,24 +92,60 @@ def build_line_index(lines):
 
 
 # =============================
-# Find Closest Line + State
+# Sweep-line Grouping
 # =============================
 
-def find_line_and_state(line_idx, pos):
+def group_tactics_by_theorem(theorems, tactics):
+    """
+    Assign every tactic to each theorem whose range contains its start
+    offset, in a single pass over both lists.
+
+    Both `theorems` and `tactics` must be sorted by start offset.  Nested
+    theorem ranges stay open together, so a tactic inside an inner range is
+    also reported for the enclosing one, exactly as the pairwise scan did.
+    Returns one list of tactic indices per theorem.
+    """
+
+    groups = [[] for _ in theorems]
+    active = []
+    next_thm = 0
+
+    for t_index, t in enumerate(tactics):
+
+        pos = t["range"][0]
+
+        while next_thm < len(theorems) and theorems[next_thm]["range"][0] <= pos:
+            active.append(next_thm)
+            next_thm += 1
+
+        active = [i for i in active if pos <= theorems[i]["range"][1]]
+
+        for i in active:
+            groups[i].append(t_index)
+
+    return groups
+
+
+def locate_tactic_lines(tactics, line_idx):
+    """Closest line start and state for each tactic, advancing one pointer."""
 
     keys = sorted(line_idx.keys())
 
-    best = None
-    for k in keys:
-        if k <= pos:
-            best = k
-        else:
-            break
+    located = []
+    k = 0
+    for t in tactics:
+
+        pos = t["range"][0]
+
+        while k < len(keys) and keys[k] <= pos:
+            k += 1
 
-    if best is None:
-        return None, None
+        if k == 0:
+            located.append((None, None))
+        else:
+            located.append((keys[k - 1], line_idx[keys[k - 1]]))
 
-    return best, line_idx[best]
+    return located
 
 
 # =============================
@@ -120,21 +156,17 @@ def build_dataset(theorems, tactics, line_idx):
 
     dataset = []
 
-    for thm in theorems:
+    groups = group_tactics_by_theorem(theorems, tactics)
+    located = locate_tactic_lines(tactics, line_idx)
 
-        start = thm["range"][0]
-        end = thm["range"][1]
+    for thm, group in zip(theorems, groups):
 
         proof_steps = []
 
-        for t in tactics:
-
-            pos = t["range"][0]
-
-            if not (start <= pos <= end):
-                continue
+        for t_index in group:
 
-            line, pretty = find_line_and_state(line_idx, pos)
+            t = tactics[t_index]
+            line, pretty = located[t_index]
 
             proof_steps.append({
                 "line": line,
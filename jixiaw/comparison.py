@@ -1,4 +1,19 @@
+import hashlib
+import heapq
 import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from jixia_api.digest import write_digest_line, digest_jsonl, load_digests
+
+def print_summary(counts):
+    """counts: only_in_1 / only_in_2 / same / different 的筆數"""
+    print(f"比對完成！")
+    print(f"- 僅在文件 1: {counts['only_in_1']}")
+    print(f"- 僅在文件 2: {counts['only_in_2']}")
+    print(f"- 內容完全相同: {counts['same']}")
+    print(f"- 內容不同: {counts['different']}")
 
 def compare_jsonl(file1_path, file2_path):
     def load_data(filepath):
@@ -52,11 +67,193 @@ def compare_jsonl(file1_path, file2_path):
     write_output('same.jsonl', same_content, map1)
     write_output('different.jsonl', diff_content, map2) # 這裡選擇存儲 file2 的版本
 
-    print(f"比對完成！")
-    print(f"- 僅在文件 1: {len(only_in_1)}")
-    print(f"- 僅在文件 2: {len(only_in_2)}")
-    print(f"- 內容完全相同: {len(same_content)}")
-    print(f"- 內容不同: {len(diff_content)}")
+    print_summary({
+        "only_in_1": len(only_in_1),
+        "only_in_2": len(only_in_2),
+        "same": len(same_content),
+        "different": len(diff_content),
+    })
 
 # 使用範例
 # compare_jsonl('file1.jsonl', 'file2.jsonl')
+
+
+# =============================
+# Streaming comparator
+# =============================
+# compare_jsonl 會把兩個檔案整個讀進記憶體，對整個 Mathlib 的 ast.jsonl 行不通。
+# 這裡先依 (module, full_name) 的雜湊把兩邊切成多個分區檔，
+# 再逐個分區比對，每次只需要一個分區的資料在記憶體中。
+
+OUTPUT_NAMES = {
+    "only_in_1": "only_in_file1.jsonl",
+    "only_in_2": "only_in_file2.jsonl",
+    "same": "same.jsonl",
+    "different": "different.jsonl",
+}
+
+
+def record_key(item):
+    return (item.get('module'), item.get('full_name'))
+
+
+def partition_of(key, partitions):
+    digest = hashlib.blake2b(json.dumps(key, ensure_ascii=False).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % partitions
+
+
+def partition_jsonl(filepath, part_dir, side, partitions):
+    fds = [open(os.path.join(part_dir, f"{side}.{i}.jsonl"), 'w', encoding='utf-8') for i in range(partitions)]
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip(): continue
+                item = json.loads(line)
+                key = record_key(item)
+                out_item = {
+                    "module": key[0],
+                    "full_name": key[1],
+                    "tactic_proof": item.get('tactic_proof', '')
+                }
+                fds[partition_of(key, partitions)].write(json.dumps(out_item, ensure_ascii=False) + '\n')
+    finally:
+        for fd in fds:
+            fd.close()
+
+
+def compare_partition(part_dir, index):
+    def load_part(side):
+        data_map = {}
+        with open(os.path.join(part_dir, f"{side}.{index}.jsonl"), 'r', encoding='utf-8') as f:
+            for line in f:
+                item = json.loads(line)
+                data_map[record_key(item)] = item['tactic_proof']
+        return data_map
+
+    map1 = load_part(1)
+    map2 = load_part(2)
+    keys1 = set(map1.keys())
+    keys2 = set(map2.keys())
+    common_keys = keys1 & keys2
+    results = {
+        "only_in_1": (keys1 - keys2, map1),
+        "only_in_2": (keys2 - keys1, map2),
+        "same": ([k for k in common_keys if map1[k] == map2[k]], map1),
+        "different": ([k for k in common_keys if map1[k] != map2[k]], map2),
+    }
+
+    counts = {}
+    for name, (keys, data_source_map) in results.items():
+        with open(os.path.join(part_dir, f"{name}.{index}.jsonl"), 'w', encoding='utf-8') as f:
+            for k in sorted(keys):
+                out_item = {
+                    "module": k[0],
+                    "full_name": k[1],
+                    "tactic_proof": data_source_map[k]
+                }
+                f.write(json.dumps(out_item, ensure_ascii=False) + '\n')
+        counts[name] = len(keys)
+    return counts
+
+
+def merge_partition_outputs(part_dir, name, partitions, output_path):
+    # 每個分區的結果已排序，用 heapq.merge 合併後和 compare_jsonl 的輸出順序一致
+    fds = [open(os.path.join(part_dir, f"{name}.{i}.jsonl"), 'r', encoding='utf-8') for i in range(partitions)]
+    try:
+        with open(output_path, 'w', encoding='utf-8') as out:
+            for line in heapq.merge(*fds, key=lambda line: record_key(json.loads(line))):
+                out.write(line)
+    finally:
+        for fd in fds:
+            fd.close()
+
+
+def compare_jsonl_streaming(file1_path, file2_path, output_dir=".", partitions=64, max_workers=1):
+    """
+    Same outputs as :func:`compare_jsonl`, with memory bounded by one hash partition.
+
+    :param partitions: number of hash partitions; raise it when a single partition does not fit in memory
+    :param max_workers: compare partitions in that many processes (1 keeps everything in this process)
+    :return: summary counts keyed by only_in_1 / only_in_2 / same / different
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output_dir) as part_dir:
+        partition_jsonl(file1_path, part_dir, 1, partitions)
+        partition_jsonl(file2_path, part_dir, 2, partitions)
+
+        if max_workers == 1:
+            part_counts = [compare_partition(part_dir, i) for i in range(partitions)]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                part_counts = list(executor.map(compare_partition, [part_dir] * partitions, range(partitions)))
+
+        counts = {name: sum(c[name] for c in part_counts) for name in OUTPUT_NAMES}
+        for name, filename in OUTPUT_NAMES.items():
+            merge_partition_outputs(part_dir, name, partitions, os.path.join(output_dir, filename))
+
+    print_summary(counts)
+    return counts
+
+# 使用範例
+# compare_jsonl_streaming('file1.jsonl', 'file2.jsonl', output_dir='compare_out', partitions=256, max_workers=8)
+
+
+# =============================
+# Digest mode
+# =============================
+# 每個定理只記一行：module \t full_name \t 16-byte hash \t 完整紀錄在 jsonl 中的位移。
+# 比對時只看 hash，只有內容不同的 key 才回到完整檔案用位移讀出原始紀錄。
+# 檔案格式（寫入與讀取）在 jixia_api/digest.py。
+
+
+def fetch_record(fd, key, offset):
+    if fd is None or offset < 0:
+        return {"module": key[0], "full_name": key[1]}
+    fd.seek(offset)
+    item = json.loads(fd.readline())
+    return {
+        "module": key[0],
+        "full_name": key[1],
+        "tactic_proof": item.get('tactic_proof', '')
+    }
+
+
+def compare_digests(digest1_path, digest2_path, file1_path=None, file2_path=None, output_dir="."):
+    """
+    Diff two digest files, writing the same four outputs as :func:`compare_jsonl`.
+
+    Only keys that are missing on one side or whose hashes differ are read back from
+    file1_path / file2_path; without them (or for same.jsonl) just the keys are written.
+    """
+    map1 = load_digests(digest1_path)
+    map2 = load_digests(digest2_path)
+    keys1 = set(map1.keys())
+    keys2 = set(map2.keys())
+    common_keys = keys1 & keys2
+    results = {
+        "only_in_1": (keys1 - keys2, map1, file1_path),
+        "only_in_2": (keys2 - keys1, map2, file2_path),
+        "same": ([k for k in common_keys if map1[k][0] == map2[k][0]], None, None),
+        "different": ([k for k in common_keys if map1[k][0] != map2[k][0]], map2, file2_path),
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {}
+    for name, (keys, digest_map, full_path) in results.items():
+        full_fd = open(full_path, 'rb') if full_path is not None else None
+        try:
+            with open(os.path.join(output_dir, OUTPUT_NAMES[name]), 'w', encoding='utf-8') as f:
+                for k in sorted(keys):
+                    offset = digest_map[k][1] if digest_map is not None else -1
+                    f.write(json.dumps(fetch_record(full_fd, k, offset), ensure_ascii=False) + '\n')
+        finally:
+            if full_fd is not None:
+                full_fd.close()
+        counts[name] = len(keys)
+
+    print_summary(counts)
+    return counts
+
+# 使用範例
+# digest_jsonl('file1.jsonl', 'file1.digest.tsv')
+# compare_digests('file1.digest.tsv', 'file2.digest.tsv', 'file1.jsonl', 'file2.jsonl', output_dir='compare_out')
@@ -0,0 +1,206 @@
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass, asdict
+
+from jixia import LeanProject
+from jixia.structs import Declaration, InfoTree, LineModel
+from .proof import FileRange, collect_all_tactics, extract_theorems
+from .proof import process_module as proof_process_module
+from .copy_module import process_module as copy_process_module
+from . import compact, flat, proof
+from .dojo import find_dojo_trace, process_module as dojo_process_module
+from .synthetic import SyntheticConfig, generate_project
+
+# =============================
+# Benchmarks
+# =============================
+# 在合成的 jixia 輸出上量測熱點的吞吐量與記憶體，不需要 Lean toolchain。
+# python -m jixia_api.benchmark --theorems 500 --depth 8 --json bench.json
+# python -m jixia_api.benchmark --theorems 500 --depth 8 --baseline bench.json
+
+sys.setrecursionlimit(1000000)
+
+
+@dataclass
+class BenchResult:
+    name: str
+    seconds: float
+    """best wall time over all repeats"""
+    items: int
+    unit: str
+    throughput: float
+    """items per second"""
+    mb_per_s: float
+    """MB of JSON input per second, 0 when the benchmark does not parse files"""
+    peak_mb: float
+    """peak traced Python allocation of one run"""
+
+
+def measure(name, func, items, unit, input_bytes=0, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # 記憶體另外量一次，tracemalloc 會拖慢上面的計時
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = max(best, 1e-9)
+    return BenchResult(
+        name=name,
+        seconds=best,
+        items=items,
+        unit=unit,
+        throughput=items / best,
+        mb_per_s=input_bytes / best / 1e6,
+        peak_mb=peak / 1e6,
+    )
+
+
+def run_benchmarks(root, config: SyntheticConfig, repeat: int = 3) -> list[BenchResult]:
+    module_name = generate_project(root, config, dojo=True)
+    project = LeanProject(root)
+    jixia_dir = project.output_dir
+    module_id = ".".join(module_name)
+    sizes = {p: os.path.getsize(jixia_dir / f"{module_id}.{p}.json") for p in ("decl", "elab", "line", "mod", "sym")}
+    sizes["dojo"] = os.path.getsize(find_dojo_trace(project, module_name))
+
+    declarations = project.load_info(module_name, Declaration)
+    infoTrees = project.load_info(module_name, InfoTree)
+    lines = project.load_info(module_name, LineModel)
+    ranges = []
+
+    def collect_ranges(nodes):
+        for node in nodes:
+            ranges.append(node.ref.range)
+            collect_ranges(node.children)
+    collect_ranges(infoTrees)
+
+    flatTrees = flat.flatten(infoTrees)
+    lineTable = compact.LineTable(lines)
+
+    def build_tactics(module, table):
+        # 每個節點一個 Tactic，排序、做 inRange，最後取 line/column，和 extract_theorems 的用法一樣
+        tactics = sorted((module.Tactic(module.FileRange.fromStringRange(table, r), "", [], []) for r in ranges),
+                         key=lambda t: t.fileRange)
+        outer = tactics[0].fileRange
+        inside = [t for t in tactics if outer.inRange(t.fileRange)]
+        positions = [(t.fileRange.start, t.fileRange.stop) for t in tactics]
+        return tactics, inside, positions
+
+    output_dir = os.path.join(root, ".jixiaw_bench")
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = [
+        measure("from_json_file[decl]", lambda: Declaration.from_json_file(jixia_dir / f"{module_id}.decl.json"),
+                len(declarations), "decls", sizes["decl"], repeat),
+        measure("from_json_file[elab]", lambda: InfoTree.from_json_file(jixia_dir / f"{module_id}.elab.json"),
+                len(ranges), "nodes", sizes["elab"], repeat),
+        measure("from_json_file[line]", lambda: LineModel.from_json_file(jixia_dir / f"{module_id}.line.json"),
+                len(lines), "lines", sizes["line"], repeat),
+        measure("FileRange.fromStringRange", lambda: [FileRange.fromStringRange(lines, r) for r in ranges],
+                len(ranges), "ranges", 0, repeat),
+        measure("compact.FileRange.fromStringRange", lambda: [compact.FileRange.fromStringRange(lineTable, r) for r in ranges],
+                len(ranges), "ranges", 0, repeat),
+        measure("proof.Tactic per node", lambda: build_tactics(proof, lines),
+                len(ranges), "nodes", 0, repeat),
+        measure("compact.Tactic per node", lambda: build_tactics(compact, lineTable),
+                len(ranges), "nodes", 0, repeat),
+        measure("collect_all_tactics", lambda: collect_all_tactics(infoTrees, lines),
+                config.theorems, "theorems", 0, repeat),
+        measure("flat.flatten", lambda: flat.flatten(infoTrees),
+                len(ranges), "nodes", 0, repeat),
+        measure("flat.collect_all_tactics", lambda: flat.collect_all_tactics(flatTrees, lines),
+                config.theorems, "theorems", 0, repeat),
+        measure("extract_theorems", lambda: extract_theorems(project, module_name),
+                config.theorems, "theorems", sizes["decl"] + sizes["elab"] + sizes["line"], repeat),
+        measure("flat.extract_theorems", lambda: flat.extract_theorems(project, module_name),
+                config.theorems, "theorems", sizes["decl"] + sizes["elab"] + sizes["line"], repeat),
+        measure("proof.process_module", lambda: proof_process_module(project, module_name, {}),
+                config.theorems, "theorems", sizes["decl"] + sizes["elab"] + sizes["line"], repeat),
+        measure("dojo.process_module", lambda: dojo_process_module(project, module_name, {}),
+                config.theorems, "theorems", sizes["decl"] + sizes["dojo"], repeat),
+        measure("copy_module.process_module", lambda: copy_process_module(project, module_name, output_dir),
+                config.theorems, "theorems", sum(sizes[p] for p in ("decl", "elab", "mod", "sym")), repeat),
+    ]
+    return results
+
+
+def print_results(results: list[BenchResult]):
+    print(f"{'benchmark':36} {'best(s)':>10} {'throughput':>22} {'MB/s':>8} {'peak MB':>9}")
+    for r in results:
+        throughput = f"{r.throughput:,.0f} {r.unit}/s"
+        mb_per_s = f"{r.mb_per_s:.1f}" if r.mb_per_s else "-"
+        print(f"{r.name:36} {r.seconds:10.4f} {throughput:>22} {mb_per_s:>8} {r.peak_mb:9.1f}")
+
+
+def compare_baseline(results: list[BenchResult], baseline_path, tolerance: float):
+    """Return the names of benchmarks slower than the baseline by more than tolerance"""
+    with open(baseline_path, 'r', encoding='utf-8') as fd:
+        baseline = {r["name"]: r for r in json.load(fd)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r.name)
+        if base is None:
+            continue
+        if r.seconds > base["seconds"] * (1 + tolerance):
+            print(f"xxxxx regression: {r.name} {base['seconds']:.4f}s -> {r.seconds:.4f}s")
+            regressions.append(r.name)
+    return regressions
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--theorems", type=int, default=200)
+    parser.add_argument("--tactics", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--hypotheses", type=int, default=3)
+    parser.add_argument("--target-width", type=int, default=40)
+    parser.add_argument("--term-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--root", help="directory for the synthetic project, defaults to a temporary one")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    config = SyntheticConfig(
+        theorems=args.theorems,
+        tactics=args.tactics,
+        depth=args.depth,
+        hypotheses=args.hypotheses,
+        target_width=args.target_width,
+        term_ratio=args.term_ratio,
+        seed=args.seed,
+    )
+    if args.root is not None:
+        results = run_benchmarks(args.root, config, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as root:
+            results = run_benchmarks(root, config, args.repeat)
+
+    print_results(results)
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as fd:
+            json.dump({"config": asdict(config), "results": [asdict(r) for r in results]}, fd, indent=2)
+
+    if args.baseline is not None and compare_baseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import NamedTuple
+
+# =============================
+# Compact proof structures
+# =============================
+# proof.py 的 FilePos / FileRange / Term / Tactic / RootTactic / Theorem 的精簡版本，公開欄位相同。
+# FileRange 只存兩個 byte offset 和共用的 LineTable，line/column 用到時才算；
+# 比較與 inRange 直接比 offset（offset 和 (line, column) 的順序一致）。
+# 其他類別是 slots 的 dataclass，每個物件不再帶 __dict__。
+
+MAX_OFFSET = 1 << 62
+"""Stop offset of a range without stop, after every real position"""
+
+
+class FilePos(NamedTuple):
+    line: int
+    column: int
+
+
+class LineTable:
+    """Start byte offset of every line, shared by all FileRanges of a module"""
+
+    __slots__ = ("starts",)
+
+    def __init__(self, lines):
+        self.starts = [line.start for line in lines]
+
+    @classmethod
+    def fromStarts(cls, starts: list[int]):
+        table = cls([])
+        table.starts = starts
+        return table
+
+    def filePos(self, charPos: int) -> FilePos:
+        """Same as proof.FileRange.createFilePos"""
+        starts = self.starts
+        if charPos >= MAX_OFFSET:
+            return FilePos(len(starts) + 1, 1)
+        index = bisect_right(starts, charPos) - 1
+        if index < 0:
+            return FilePos(1, charPos + 1)
+        return FilePos(index + 1, charPos - starts[index] + 1)
+
+
+class FileRange:
+    __slots__ = ("startOffset", "stopOffset", "table", "_start", "_stop")
+
+    def __init__(self, startOffset: int, stopOffset: int, table: LineTable):
+        self.startOffset = startOffset
+        self.stopOffset = stopOffset
+        self.table = table
+        self._start = None
+        self._stop = None
+
+    @classmethod
+    def fromStringRange(cls, lines, stringRange):
+        """lines is a LineTable, or a list of LineModel as in proof.FileRange (slower)"""
+        table = lines if isinstance(lines, LineTable) else LineTable(lines)
+        start = 0
+        stop = MAX_OFFSET
+        if stringRange is not None:
+            if stringRange.start is not None:
+                start = int(stringRange.start)
+            if stringRange.stop is not None:
+                stop = int(stringRange.stop)
+        return cls(start, stop, table)
+
+    @classmethod
+    def createFilePos(cls, lines, charPos: int):
+        table = lines if isinstance(lines, LineTable) else LineTable(lines)
+        return table.filePos(charPos)
+
+    @property
+    def start(self) -> FilePos:
+        if self._start is None:
+            self._start = self.table.filePos(self.startOffset)
+        return self._start
+
+    @property
+    def stop(self) -> FilePos:
+        if self._stop is None:
+            self._stop = self.table.filePos(self.stopOffset)
+        return self._stop
+
+    def __eq__(self, other):
+        if not isinstance(other, FileRange):
+            return NotImplemented
+        return self.startOffset == other.startOffset and self.stopOffset == other.stopOffset
+
+    def __hash__(self):
+        return hash((self.startOffset, self.stopOffset))
+
+    def __lt__(self, other):
+        return self.startOffset < other.startOffset or self.startOffset == other.startOffset and self.stopOffset >= other.stopOffset
+
+    def inRange(self, fileRange):
+        return self.startOffset <= fileRange.startOffset and fileRange.stopOffset <= self.stopOffset
+
+    def __repr__(self):
+        return f"FileRange(start={self.start}, stop={self.stop})"
+
+
+@dataclass(frozen=True, eq=False, slots=True)
+class Term:
+    fileRange: FileRange
+    ident: str
+    type: str
+
+
+@dataclass(frozen=True, eq=False, slots=True)
+class TacticBase:
+    fileRange: FileRange
+    pp: str
+    before: list[str]
+    after: list[str]
+
+
+@dataclass(frozen=True, eq=False, slots=True)
+class Tactic(TacticBase):
+    pass
+
+
+@dataclass(frozen=True, eq=False, slots=True)
+class RootTactic(TacticBase):
+    children: list[Tactic]
+
+    def __str__(self):
+        children_len = None
+        if self.children is not None:
+            children_len = len(self.children)
+        return f"tactic={self.fileRange}, {self.pp}, children={children_len}"
+
+
+@dataclass(frozen=True, eq=False, slots=True)
+class Theorem:
+    fileRange: FileRange
+    name: str
+
+    signature: str
+    signatureFileRange: FileRange
+
+    proofOperator: str
+
+    proof: str
+    proofFileRange: FileRange
+    proofType: str
+
+    proofTactic: RootTactic
+    tactics: list[RootTactic]
+
+    tactic_before: list
+    tactic_after: list
+
+    def __str__(self):
+        return f"range={self.fileRange}, name={self.name}, tactics: {len(self.tactics)}"
@@ -1,60 +1,117 @@
 import os
+from argparse import ArgumentParser
+from typing import Optional
 from jixia import LeanProject
 from jixia.structs import Symbol,Declaration,InfoTree
 from .module import ModuleData,SymbolData,DeclarationData,InfoTreeData
-from .util import collect_match_modules
+from .util import collect_match_modules, write_atomic
+from .names import print_name_stats
+from .instrument import INSTR, timed
+from .profiler import NullProfiler, make_profiler, add_profile_arguments
+from .memory import start_memory_tracking, stop_memory_tracking
+from .journal import RunJournal, FAILED
+from .shard import select_shard, shard_suffix, write_manifest, load_costs, add_shard_arguments
 
 def to_module_id(module_name):
     return ".".join(module_name)
 
-def write_obj_to_json(module_name, obj_type, obj, output_dir):
-    module_id = to_module_id(module_name)
-    with open(os.path.join(output_dir, module_id + "." + obj_type + ".json"), 'w', encoding='utf-8') as fd:
-        fd.write(obj.to_json())
-
-def write_list_to_jsonl(module_name, obj_type, list, output_dir):
-    module_id = to_module_id(module_name)
-    with open(os.path.join(output_dir, module_id + "." + obj_type + ".json"), 'w', encoding='utf-8') as fd:
-        for obj in list:
-            fd.write(obj.to_json())
-            fd.write("\n")
-
 def write_lean(project, module_name, output_dir):
     module_id = to_module_id(module_name)
     content = project.path_of_module(module_name, project.root).read_bytes()
     with open(os.path.join(output_dir, module_id + ".lean"), 'w', encoding='utf-8') as fd:
         fd.write(content.decode('utf-8'))
 
-def process_module(project, module_name, output_dir):
-    module = project.load_module_info(module_name)
+def process_module(project, module_name, output_dir) -> bool:
+    """True when all the copies were written"""
+    with INSTR.timer("load"):
+        module = project.load_module_info(module_name)
     if module is None:
-        return
+        return False
     try:
         #write_lean(project, module_name, output_dir)
-        write_obj_to_json(module_name, "module", ModuleData.create(module), output_dir)
+        with INSTR.timer("load"):
+            symbols = project.load_info(module_name, Symbol)
+            decls = project.load_info(module_name, Declaration)
+            infoTrees = project.load_info(module_name, InfoTree)
+        write_module(module_name, module, symbols, decls, infoTrees, output_dir)
+    except Exception as e:
+        print(f"xxxx Fail to process module: {module_name}, {e}")
+        return False
+    return True
 
-        symbols = project.load_info(module_name, Symbol)
-        write_list_to_jsonl(module_name, "symbol", [SymbolData.create(symbol) for symbol in symbols], output_dir)
+def write_module(module_name, module, symbols, decls, infoTrees, output_dir):
+    """Write the copies of plugin outputs that are already loaded"""
+    write_rendered(module_name, render_module(module, symbols, decls, infoTrees), output_dir)
 
-        decls = project.load_info(module_name, Declaration)
-        write_list_to_jsonl(module_name, "decl", [DeclarationData.create(decl) for decl in decls], output_dir)
+@timed("serialize")
+def render_module(module, symbols, decls, infoTrees) -> dict[str, str]:
+    """File contents write_module would write, by obj_type"""
+    return {
+        "module": ModuleData.create(module).to_json(),
+        "symbol": "".join(SymbolData.create(symbol).to_json() + "\n" for symbol in symbols),
+        "decl": "".join(DeclarationData.create(decl).to_json() + "\n" for decl in decls),
+        "elab": "".join(InfoTreeData.create(infoTree).to_json() + "\n" for infoTree in infoTrees),
+    }
 
-        infoTrees = project.load_info(module_name, InfoTree)
-        write_list_to_jsonl(module_name, "elab", [InfoTreeData.create(infoTree) for infoTree in infoTrees], output_dir)
-    except Exception as e:
-        print(f"xxxx Fail to process module: {module_name}, {e}")
+@timed("write")
+def write_rendered(module_name, rendered: dict[str, str], output_dir):
+    if INSTR.enabled:
+        INSTR.count("bytes_written", sum(len(content.encode('utf-8')) for content in rendered.values()))
+    module_id = to_module_id(module_name)
+    for obj_type, content in rendered.items():
+        write_atomic(os.path.join(output_dir, module_id + "." + obj_type + ".json"), content)
 
 
-def process_searches(working_dir: str, search_list: list[str], exclude_list: list[str]):
+def process_searches(working_dir: str, search_list: list[str], exclude_list: list[str], instrument: bool = False,
+                     profiler=None, memory: bool = False, resume: bool = False,
+                     shard: Optional[tuple[int, int]] = None, shard_costs: Optional[dict[str, float]] = None):
+    """
+    instrument=True writes per-stage timings to <output_dir>/instrument.json
+    profiler: see profiler.make_profiler
+    memory=True writes the modules ranked by peak memory to <output_dir>/memory.json (slow)
+    resume=True skips the modules finished by the previous run (see journal.py)
+    shard=(i, N) only processes the i-th of N shards, shard_costs balances them (see shard.py)
+    """
+    if profiler is None:
+        profiler = NullProfiler()
     output_dir = working_dir + "/.jixiaw_test"
     os.makedirs(output_dir, exist_ok=True)
     project = LeanProject(working_dir)
     modules = []
     for search in search_list:
         modules.extend(collect_match_modules(project, search, exclude_list))
+    modules = select_shard(modules, shard, shard_costs)
+    suffix = shard_suffix(shard)
+    journal = RunJournal(f"{output_dir}/.journal{suffix}", resume)
+    assigned = modules
+    modules = journal.remaining(modules)
+
+    if instrument:
+        INSTR.enable()
+    if memory:
+        start_memory_tracking()
 
     for module_name in modules:
-        process_module(project, module_name, output_dir)
+        with INSTR.module(module_name), profiler.module(module_name):
+            try:
+                ok = process_module(project, module_name, output_dir)
+            except Exception as e:
+                # load_module_info 找不到 mod.json 時
+                print(f"xxxx Fail to process module: {module_name}, {e}")
+                ok = False
+        if ok:
+            journal.record(module_name)
+        else:
+            journal.record(module_name, FAILED)
+    journal.close()
+    if shard is not None:
+        write_manifest(output_dir, shard, assigned, journal, shard_costs)
+    profiler.finish()
+    print_name_stats()
+    if memory:
+        stop_memory_tracking(f"{output_dir}/memory{suffix}.json")
+    if instrument:
+        INSTR.write_report(f"{output_dir}/instrument{suffix}.json")
 
 if __name__ == "__main__":
     search_list = [
@@ -68,4 +125,16 @@ if __name__ == "__main__":
         'Mathlib.Data.Prod.Basic'
     ]
 
-    process_searches("/home/linfe/math/lean_test", search_list, exclude_list)
\ No newline at end of file
+    parser = ArgumentParser()
+    parser.add_argument("--working-dir", default="/home/linfe/math/lean_test")
+    parser.add_argument("--instrument", action="store_true")
+    parser.add_argument("--memory", action="store_true", help="per-module memory accounting with tracemalloc")
+    parser.add_argument("--resume", action="store_true", help="continue the previous run from its journal")
+    add_profile_arguments(parser)
+    add_shard_arguments(parser)
+    args = parser.parse_args()
+    shard_costs = None if args.shard_costs is None else load_costs(args.shard_costs)
+    profiler = make_profiler(args.profile, args.working_dir + "/.jixiaw_test/profile", args.profile_top, args.profile_interval)
+
+    process_searches(args.working_dir, search_list, exclude_list, instrument=args.instrument, profiler=profiler,
+                     memory=args.memory, resume=args.resume, shard=args.shard, shard_costs=shard_costs)
\ No newline at end of file
@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+# =============================
+# Digest files
+# =============================
+# 每個定理只記一行：module \t full_name \t 16-byte hash \t 完整紀錄在 jsonl 中的位移。
+# 抽取時順便寫（jixia_ast_extract.py --digest），或用 digest_jsonl 從現有的輸出補做；
+# 比對見 comparison.compare_digests。
+
+DIGEST_SIZE = 16
+
+
+def normalize_proof(text):
+    return " ".join((text or "").split())
+
+
+def proof_digest(text):
+    return hashlib.blake2b(normalize_proof(text).encode('utf-8'), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def write_digest_line(digest_fd, module, full_name, proof, offset=-1):
+    digest_fd.write(f"{module}\t{full_name}\t{proof_digest(proof)}\t{offset}\n")
+
+
+def digest_jsonl(jsonl_path, digest_path):
+    """Build the digest file of an existing extraction output"""
+    with open(jsonl_path, 'rb') as f, open(digest_path, 'w', encoding='utf-8') as digest_fd:
+        offset = 0
+        for raw in f:
+            if raw.strip():
+                item = json.loads(raw)
+                write_digest_line(digest_fd, item.get('module'), item.get('full_name'), item.get('tactic_proof', ''), offset)
+            offset += len(raw)
+
+
+def load_digests(digest_path):
+    digests = {}
+    with open(digest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip(): continue
+            module, full_name, digest, offset = line.rstrip('\n').split('\t')
+            digests[(module, full_name)] = (digest, int(offset))
+    return digests
@@ -0,0 +1,316 @@
+import os
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from pathlib import Path
+
+import msgspec
+
+from jixia import LeanProject
+from jixia.structs import Declaration
+from .proof import FilePos, FileRange, Tactic, RootTactic, Theorem, getTheoremName, getToken, create_theorem_lines
+from .structs import LeanDojoTrace, LeanDojoTacticTrace, LeanDojoPremiseDef, LeanDojoPremiseTrace
+from .util import getLeanSourceDirOrFile, collect_match_modules
+from .names import print_name_stats
+
+# =============================
+# Lean4dojo trace loaders
+# =============================
+# 讀 Lean4dojo/ExtractData.lean 寫出的 ast.json / ast.jsonl。
+# components 對應 ExtractData 的 --components=asts,tactics,premises，
+# 沒選的部分在解碼時直接跳過，不建 Python 物件；commandASTs 通常佔檔案的大半。
+
+TRACE_COMPONENTS = ("asts", "tactics", "premises")
+
+# component -> (struct field, JSON key)
+_COMPONENT_FIELDS = {
+    "asts": [("command_asts", "commandASTs")],
+    "tactics": [("tactics", "tactics")],
+    "premises": [("premise_defs", "premiseDefs"), ("premises", "premises")],
+}
+
+# ast.jsonl 每行的前綴 -> (component, struct field, record type)
+_STREAM_RECORDS = {
+    b'{"commandAST":': ("asts", "command_asts", msgspec.Raw),
+    b'{"tactic":': ("tactics", "tactics", LeanDojoTacticTrace),
+    b'{"premiseDef":': ("premises", "premise_defs", LeanDojoPremiseDef),
+    b'{"premise":': ("premises", "premises", LeanDojoPremiseTrace),
+}
+
+
+def _check_components(components) -> tuple[str, ...]:
+    for c in components:
+        if c not in TRACE_COMPONENTS:
+            raise ValueError(f"Invalid component: {c}")
+    return tuple(c for c in TRACE_COMPONENTS if c in components)
+
+
+@lru_cache(maxsize=None)
+def trace_decoder(components: tuple[str, ...] = TRACE_COMPONENTS) -> msgspec.json.Decoder:
+    """Decoder for ast.json that only materialises the given components"""
+    if components == TRACE_COMPONENTS:
+        return msgspec.json.Decoder(LeanDojoTrace)
+    fields = []
+    for component in components:
+        for field, key in _COMPONENT_FIELDS[component]:
+            fields.append((field, LeanDojoTrace.__annotations__[field], msgspec.field(default_factory=list, name=key)))
+    partial = msgspec.defstruct("LeanDojoPartialTrace", fields)
+    return msgspec.json.Decoder(partial)
+
+
+def load_trace(path, components=TRACE_COMPONENTS) -> LeanDojoTrace:
+    """
+    Load ast.json or ast.jsonl, keeping only the given components.
+    The others are left empty, as if ExtractData had been run without them.
+    """
+    components = _check_components(components)
+    if str(path).endswith(".jsonl"):
+        return load_trace_stream(path, components)
+    with open(path, 'rb') as fd:
+        data = fd.read()
+    partial = trace_decoder(components).decode(data)
+    if components == TRACE_COMPONENTS:
+        return partial
+    return LeanDojoTrace(**{f: getattr(partial, f) for f in partial.__struct_fields__})
+
+
+def load_trace_stream(path, components=TRACE_COMPONENTS) -> LeanDojoTrace:
+    """Load the ast.jsonl written by `ExtractData --stream`, skipping unselected records by prefix"""
+    components = _check_components(components)
+    decoders = {}
+    for prefix, (component, field, record_type) in _STREAM_RECORDS.items():
+        if component in components:
+            wrapper = msgspec.defstruct("Record", [(prefix[2:-2].decode(), record_type)])
+            decoders[prefix] = (field, prefix[2:-2].decode(), msgspec.json.Decoder(wrapper))
+
+    trace = LeanDojoTrace()
+    with open(path, 'rb') as fd:
+        for line in fd:
+            prefix = line[:line.find(b':') + 1]
+            entry = decoders.get(prefix)
+            if entry is None:
+                if prefix not in _STREAM_RECORDS:
+                    print("xxxxx unknown trace record", line[:40])
+                continue
+            field, key, decoder = entry
+            getattr(trace, field).append(getattr(decoder.decode(line), key))
+    return trace
+
+
+def load_dep_paths(path) -> list[str]:
+    """The dep_paths file next to ast.json, one .lean path per line"""
+    with open(path, 'r', encoding='utf-8') as fd:
+        return [line.strip() for line in fd if line.strip()]
+
+
+def dojo_trace_path(project, module_name: list[str], ext: str = "ast.json"):
+    """
+    Where ExtractData puts the trace of a module: `.lake/build/ir/<path>.<ext>` of the
+    package that owns the .lean file, e.g. `.lake/packages/mathlib/.lake/build/ir/Mathlib/...`.
+    """
+    lean_file = getLeanSourceDirOrFile(project, module_name, True)
+    if lean_file is None:
+        return None
+    lean_path = Path(lean_file).resolve()
+    root = Path(project.root).resolve()
+    packages = root / ".lake" / "packages"
+    if lean_path.is_relative_to(packages):
+        package, *rest = lean_path.relative_to(packages).parts
+        ir_dir = packages / package / ".lake" / "build" / "ir"
+        relative = Path(*rest)
+    elif lean_path.is_relative_to(root):
+        ir_dir = root / ".lake" / "build" / "ir"
+        relative = lean_path.relative_to(root)
+    else:
+        return None
+    return ir_dir / relative.with_suffix("." + ext)
+
+
+def find_dojo_trace(project, module_name: list[str]):
+    """ast.json if present, else the ast.jsonl of a --stream run, else None"""
+    for ext in ("ast.json", "ast.jsonl"):
+        path = dojo_trace_path(project, module_name, ext)
+        if path is not None and path.is_file():
+            return path
+    return None
+
+
+# =============================
+# Extract Theorems from a Lean4dojo trace
+# =============================
+# 和 proof.process_module 輸出同樣的 per-theorem JSONL，但 tactic 與 proof state 來自
+# Lean4dojo 的 trace，jixia 只需要跑 decl plugin，不用跑很慢的 elaboration plugin。
+# 差異：
+#   - Lean4dojo 只記錄 tacticSeq 裡的 tactic，tactic 文字取自原始碼而不是 pp
+#   - term proof 的 goal 要靠 elaboration 的 term type，trace 沒有，所以略過
+#   - 不產生 ref_tactics
+
+def line_starts(source: bytes) -> list[int]:
+    starts = [0]
+    index = source.find(b"\n")
+    while index != -1:
+        starts.append(index + 1)
+        index = source.find(b"\n", index + 1)
+    return starts
+
+
+_TOKEN = re.compile(rb"\S+")
+
+
+def find_token(source: bytes, start: int, stop: int, index: int):
+    """The index-th token of source[start:stop] as a re.Match (byte offsets), split on whitespace like getToken"""
+    for k, token in enumerate(_TOKEN.finditer(source, start, stop)):
+        if k == index:
+            return token
+    return None
+
+
+def createFilePos(starts: list[int], charPos: int) -> FilePos:
+    """Same as FileRange.createFilePos, by bisection over the line starts"""
+    index = max(bisect_right(starts, charPos) - 1, 0)
+    return FilePos(index + 1, charPos - starts[index] + 1)
+
+
+def createFileRange(starts: list[int], stringRange) -> FileRange:
+    """Same as FileRange.fromStringRange"""
+    start = FilePos(1, 1)
+    stop = FilePos(len(starts) + 1, 1)
+    if stringRange is not None:
+        if stringRange[0] is not None:
+            start = createFilePos(starts, int(stringRange[0]))
+        if stringRange[1] is not None:
+            stop = createFilePos(starts, int(stringRange[1]))
+    return FileRange(start, stop)
+
+
+def _state(state: str) -> list[str]:
+    """One pp string per goal, like the before/after of proof.Tactic"""
+    # Pp.ppGoals 用 "\n\n" 把 goal 接起來（單一 goal 裡的行只用 "\n" 分隔），拆回 list；
+    # create_tacitic_data 會用 "\n\n" 再接回去，theorem 的 tactic_before 則和 jixia 路徑一樣是 goal 的 list
+    return [] if state == "no goals" else state.split("\n\n")
+
+
+def _top_level(tactics: list[LeanDojoTacticTrace]) -> list[LeanDojoTacticTrace]:
+    tops = []
+    for tactic in tactics:
+        if tops and tactic.end_pos <= tops[-1].end_pos:
+            continue
+        tops.append(tactic)
+    return tops
+
+
+def create_root_tactic(source: bytes, starts: list[int], by_start: int, stop: int, tactics: list[LeanDojoTacticTrace]):
+    """The `by` block of a proof, children filtered like proof.collect_sub_tactics"""
+    children = []
+    previousFileRange = None
+    for tactic in tactics:
+        pp = source[tactic.pos:tactic.end_pos].decode('utf-8')
+        if "\n" in pp or ";" in pp:
+            continue
+        fileRange = createFileRange(starts, (tactic.pos, tactic.end_pos))
+        if previousFileRange is not None and previousFileRange.inRange(fileRange):
+            continue
+        children.append(Tactic(fileRange, pp, _state(tactic.state_before), _state(tactic.state_after)))
+        previousFileRange = fileRange
+    tops = _top_level(tactics)
+    pp = source[by_start:stop].decode('utf-8').rstrip()
+    return RootTactic(createFileRange(starts, (by_start, stop)), pp,
+                      _state(tops[0].state_before), _state(tops[-1].state_after), children)
+
+
+def extract_theorems(project, module_name, trace: LeanDojoTrace, source: bytes):
+    if not project.has_info(module_name, Declaration):
+        return []
+    declarations = project.load_info(module_name, Declaration)
+    starts = line_starts(source)
+    tactics = sorted(trace.tactics, key=lambda t: (t.pos, -t.end_pos))
+    positions = [t.pos for t in tactics]
+    theorems = []
+    for decl in declarations:
+        if decl.kind != "theorem" or len(decl.name) == 0 or decl.value is None or decl.value.range is None:
+            continue
+        theorem_name = getTheoremName(module_name, decl)
+        value_start, value_stop = decl.value.range
+        statement = decl.value.pp
+        if statement is None:
+            statement = source[value_start:value_stop].decode('utf-8')
+
+        proofOperator = getToken(statement, 0)
+        if proofOperator != ":=" and proofOperator != "|" and proofOperator != "where":
+            print(f"xxxxx proofOperator {proofOperator}  is not valid, remove: {theorem_name} {module_name}")
+            continue
+        statement = statement.rstrip()[len(proofOperator) + 1:].lstrip()
+        if getToken(statement, 0) != "by":
+            continue
+        theorem_proof = statement[len(proofOperator):].lstrip()
+
+        lo = bisect_left(positions, value_start)
+        hi = bisect_left(positions, value_stop, lo)
+        proof_tactics = [t for t in tactics[lo:hi] if t.end_pos <= value_stop]
+        proofTactic = None
+        tactic_before = None
+        tactic_after = None
+        if proof_tactics:
+            # 和上面的 statement 一樣：第 0 個 token 是 proofOperator，第 1 個是 by
+            by_token = find_token(source, value_start, value_stop, 1)
+            if by_token is None or by_token.group() != b"by":
+                print(f"xxxxx no by token in the source, remove: {theorem_name} {module_name}")
+                continue
+            proofTactic = create_root_tactic(source, starts, by_token.start(), value_stop, proof_tactics)
+            tactic_before = proofTactic.before
+            tactic_after = proofTactic.after
+        else:
+            print(f"xxxxx ERROR tactic_before is none on Tactic: {theorem_name} {module_name}")
+
+        theorems.append(Theorem(
+            createFileRange(starts, decl.ref.range), theorem_name,
+            decl.signature.pp, createFileRange(starts, decl.signature.range),
+            proofOperator, theorem_proof, createFileRange(starts, decl.value.range), "Tactic",
+            proofTactic, [], tactic_before, tactic_after,
+        ))
+    return theorems
+
+
+def process_module(project, module_name, operatorSet, trace_path=None):
+    if trace_path is None:
+        trace_path = find_dojo_trace(project, module_name)
+    if trace_path is None:
+        print(f"xxxxx no Lean4dojo trace: {module_name}")
+        return []
+    source_path = getLeanSourceDirOrFile(project, module_name, True)
+    if source_path is None:
+        print(f"xxxxx no Lean source: {module_name}")
+        return []
+    trace = load_trace(trace_path, ("tactics",))
+    with open(source_path, 'rb') as fd:
+        source = fd.read()
+    theorems = extract_theorems(project, module_name, trace, source)
+    return create_theorem_lines(module_name, theorems, operatorSet)
+
+
+def process_searches(working_dir: str, search_list: list[str]):
+    output_dir = working_dir + "/.jixiaw"
+    os.makedirs(output_dir, exist_ok=True)
+    project = LeanProject(working_dir)
+    modules = []
+    for search in search_list:
+        modules.extend(collect_match_modules(project, search, []))
+
+    operatorSet = {":=": 0}
+    for module_name in modules:
+        module_str = ".".join(module_name)
+        path = f"{output_dir}/{module_str}.jsonl"
+        with open(path, 'w', encoding='utf-8') as fd:
+            lines = process_module(project, module_name, operatorSet)
+            fd.write('\n'.join(lines) + '\n')
+
+    print(f"Theorem Operator Set: {operatorSet}")
+    print_name_stats()
+
+
+if __name__ == "__main__":
+    search_list = [
+        "LeanTest",
+    ]
+
+    process_searches("/home/linfe/math/lean_test", search_list)
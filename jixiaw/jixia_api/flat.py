@@ -0,0 +1,411 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from jixia.structs import Declaration, InfoTree, LineModel
+from .proof import FilePos, FileRange, Tactic, RootTactic, Term, extract_theorem, declaration_ranges
+
+# =============================
+# Flat InfoTree
+# =============================
+# InfoTree 攤平成 struct-of-arrays：節點依 preorder 排，第 i 個節點的子樹就是 [i, end[i])，
+# 字串（pp、kind、goal）放在共用的 string table，只存 index。
+# 查詢用 NumPy mask 一次算完，不再對每個節點做 Python 遞迴。
+# 接受 jixia.structs.InfoTree 或 jixia_api.structs.LeanInfoTree（欄位名稱相同）。
+
+KIND_SIMPLE = 0
+KIND_TERM = 1
+KIND_TACTIC = 2
+KIND_MACRO = 3
+
+NONE = -1
+"""Missing range position or string"""
+
+
+class StringTable:
+    """Interned strings, index by id"""
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def intern(self, s) -> int:
+        if s is None:
+            return NONE
+        id = self.ids.get(s)
+        if id is None:
+            id = len(self.strings)
+            self.ids[s] = id
+            self.strings.append(s)
+        return id
+
+    def get(self, id: int):
+        return None if id == NONE else self.strings[id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+@dataclass
+class FlatInfoTree:
+    kind: np.ndarray
+    """int8 KIND_* of every node"""
+    parent: np.ndarray
+    """int32, NONE for the roots"""
+    first_child: np.ndarray
+    next_sibling: np.ndarray
+    end: np.ndarray
+    """int32, one past the last node of the subtree"""
+    start: np.ndarray
+    """int64 byte offset of ref.range, NONE if unknown"""
+    stop: np.ndarray
+    pp: np.ndarray
+    """int32 string id of ref.pp"""
+    ref_kind: np.ndarray
+    """int32 string id of ".".join(ref.kind)"""
+    term_value: np.ndarray
+    term_type: np.ndarray
+    term_expected_type: np.ndarray
+    before_ptr: np.ndarray
+    """CSR offsets into before_goals, length n + 1"""
+    before_goals: np.ndarray
+    """int32 string ids of the goal pp of tactic nodes"""
+    after_ptr: np.ndarray
+    after_goals: np.ndarray
+    strings: StringTable
+
+    def __len__(self):
+        return len(self.kind)
+
+    def before(self, i: int) -> list[str]:
+        return [self.strings.get(g) for g in self.before_goals[self.before_ptr[i]:self.before_ptr[i + 1]]]
+
+    def after(self, i: int) -> list[str]:
+        return [self.strings.get(g) for g in self.after_goals[self.after_ptr[i]:self.after_ptr[i + 1]]]
+
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+
+def flatten(trees: list) -> FlatInfoTree:
+    """Convert an InfoTree forest, iteratively so deep trees do not hit the recursion limit"""
+    strings = StringTable()
+    kind, parent, end, start, stop, pp, ref_kind = [], [], [], [], [], [], []
+    term_value, term_type, term_expected_type = [], [], []
+    before_ptr, before_goals, after_ptr, after_goals = [0], [], [0], []
+
+    stack = [(tree, NONE) for tree in reversed(trees)]
+    open_nodes = []
+    while stack:
+        node, p = stack.pop()
+        i = len(kind)
+        # 關掉已經走完的子樹
+        while open_nodes and open_nodes[-1] != p:
+            end[open_nodes.pop()] = i
+        open_nodes.append(i)
+
+        info = node.info
+        ref = node.ref
+        if info.tactic is not None:
+            kind.append(KIND_TACTIC)
+            before_goals.extend(strings.intern(goal.pp) for goal in info.tactic.before)
+            after_goals.extend(strings.intern(goal.pp) for goal in info.tactic.after)
+        elif info.term is not None:
+            kind.append(KIND_TERM)
+        elif info.macro is not None:
+            kind.append(KIND_MACRO)
+        else:
+            kind.append(KIND_SIMPLE)
+        before_ptr.append(len(before_goals))
+        after_ptr.append(len(after_goals))
+
+        term = info.term
+        term_value.append(NONE if term is None else strings.intern(term.value))
+        term_type.append(NONE if term is None else strings.intern(term.type))
+        term_expected_type.append(NONE if term is None else strings.intern(term.expected_type))
+
+        parent.append(p)
+        end.append(i + 1)
+        r = ref.range
+        start.append(NONE if r is None or r.start is None else int(r.start))
+        stop.append(NONE if r is None or r.stop is None else int(r.stop))
+        pp.append(strings.intern(ref.pp))
+        ref_kind.append(strings.intern(".".join(str(k) for k in ref.kind)))
+
+        children = node.children or []
+        stack.extend((child, i) for child in reversed(children))
+    n = len(kind)
+    while open_nodes:
+        end[open_nodes.pop()] = n
+
+    parent = np.array(parent, dtype=np.int32)
+    end = np.array(end, dtype=np.int32)
+    index = np.arange(n, dtype=np.int32)
+    # preorder：有子節點的話第一個子節點就是 i + 1；下一個兄弟從 end[i] 開始，但要同一個 parent
+    first_child = np.where(end > index + 1, index + 1, NONE).astype(np.int32)
+    next_sibling = np.full(n, NONE, dtype=np.int32)
+    has_next = end < n
+    candidates = np.where(has_next, end, 0)
+    has_next &= parent[candidates] == parent
+    next_sibling[has_next] = end[has_next]
+
+    return FlatInfoTree(
+        kind=np.array(kind, dtype=np.int8),
+        parent=parent,
+        first_child=first_child,
+        next_sibling=next_sibling,
+        end=end,
+        start=np.array(start, dtype=np.int64),
+        stop=np.array(stop, dtype=np.int64),
+        pp=np.array(pp, dtype=np.int32),
+        ref_kind=np.array(ref_kind, dtype=np.int32),
+        term_value=np.array(term_value, dtype=np.int32),
+        term_type=np.array(term_type, dtype=np.int32),
+        term_expected_type=np.array(term_expected_type, dtype=np.int32),
+        before_ptr=np.array(before_ptr, dtype=np.int32),
+        before_goals=np.array(before_goals, dtype=np.int32),
+        after_ptr=np.array(after_ptr, dtype=np.int32),
+        after_goals=np.array(after_goals, dtype=np.int32),
+        strings=strings,
+    )
+
+
+# =============================
+# Vectorised queries
+# =============================
+def subtree_mask(tree: FlatInfoTree, roots: np.ndarray, include_roots: bool = True) -> np.ndarray:
+    """Mask of every node in the subtree of any of roots"""
+    n = len(tree)
+    diff = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(diff, roots if include_roots else roots + 1, 1)
+    np.add.at(diff, tree.end[roots], -1)
+    return np.cumsum(diff[:n]) > 0
+
+
+def line_start_array(lines) -> np.ndarray:
+    return np.array([line.start for line in lines], dtype=np.int64)
+
+
+def file_positions(line_starts: np.ndarray, pos: np.ndarray):
+    """Vectorised FileRange.createFilePos, returns (line, column) arrays"""
+    index = np.searchsorted(line_starts, pos, side='right') - 1
+    base = np.where(index >= 0, line_starts[np.maximum(index, 0)] if len(line_starts) else 0, 0)
+    return np.maximum(index, 0) + 1, pos - base + 1
+
+
+def file_ranges(tree: FlatInfoTree, line_starts: np.ndarray, nodes: np.ndarray) -> list[FileRange]:
+    """FileRange.fromStringRange of every node in nodes"""
+    start = tree.start[nodes]
+    stop = tree.stop[nodes]
+    start_line, start_column = file_positions(line_starts, start)
+    stop_line, stop_column = file_positions(line_starts, stop)
+    last_line = len(line_starts) + 1
+    ranges = []
+    for k in range(len(nodes)):
+        startPos = FilePos(1, 1) if start[k] == NONE else FilePos(int(start_line[k]), int(start_column[k]))
+        stopPos = FilePos(last_line, 1) if stop[k] == NONE else FilePos(int(stop_line[k]), int(stop_column[k]))
+        ranges.append(FileRange(startPos, stopPos))
+    return ranges
+
+
+def root_tactic_mask(tree: FlatInfoTree) -> np.ndarray:
+    """
+    Nodes collect_all_tactics turns into root tactics: tactic nodes without a tactic ancestor,
+    not preceded by a tactic sibling (the walk returns at the first tactic of a child list).
+    """
+    n = len(tree)
+    is_tactic = tree.kind == KIND_TACTIC
+    tactics = np.flatnonzero(is_tactic)
+    if len(tactics) == 0:
+        return is_tactic
+    # roots 的 parent 是 NONE，放在最後一格
+    parent_slot = np.where(tree.parent == NONE, n, tree.parent)
+    first_tactic_child = np.full(n + 1, n, dtype=np.int64)
+    np.minimum.at(first_tactic_child, parent_slot[tactics], tactics)
+    index = np.arange(n)
+    skipped = first_tactic_child[parent_slot] < index
+    hidden = subtree_mask(tree, tactics, include_roots=False) | subtree_mask(tree, np.flatnonzero(skipped))
+    return is_tactic & ~hidden
+
+
+def sub_tactic_candidates(tree: FlatInfoTree, root: int) -> np.ndarray:
+    """Tactic nodes below root that collect_sub_tactics would consider, before the containment check"""
+    lo, hi = root + 1, tree.end[root]
+    nodes = lo + np.flatnonzero(tree.kind[lo:hi] == KIND_TACTIC)
+    if len(nodes) == 0:
+        return nodes
+    strings = tree.strings.strings
+    keep = [i for i in nodes
+            if tree.pp[i] != NONE and "\n" not in strings[tree.pp[i]] and ";" not in strings[tree.pp[i]]
+            and strings[tree.pp[i]] != "by"]
+    return np.array(keep, dtype=np.int64)
+
+
+def collect_all_tactics(tree: FlatInfoTree, lines) -> list[RootTactic]:
+    """Same result as proof.collect_all_tactics on the original forest"""
+    return collect_root_tactics(tree, lines)[1]
+
+
+def collect_root_tactics(tree: FlatInfoTree, lines) -> tuple[np.ndarray, list[RootTactic]]:
+    """Root tactics sorted like collect_all_tactics, with the node index of each"""
+    line_starts = line_start_array(lines)
+    strings = tree.strings
+    roots = np.flatnonzero(root_tactic_mask(tree))
+    root_ranges = file_ranges(tree, line_starts, roots)
+    rootTactics = []
+    for root, rootRange in zip(roots, root_ranges):
+        candidates = sub_tactic_candidates(tree, root)
+        children = []
+        # previousFileRange 是最近一個「還看得到」的保留節點（父節點的子樹還包含 i）：祖先，或祖先的前面兄弟。
+        # i 依 preorder 遞增，看不到的節點之後也看不到，所以從頂端丟掉即可，頂端就是最近一個看得到的
+        visible = []
+        for i, fileRange in zip(candidates, file_ranges(tree, line_starts, candidates)):
+            while visible and i >= tree.end[tree.parent[visible[-1][0]]]:
+                visible.pop()
+            if visible and visible[-1][1].inRange(fileRange):
+                continue
+            visible.append((i, fileRange))
+            children.append(Tactic(fileRange, strings.get(tree.pp[i]), tree.before(i), tree.after(i)))
+        rootTactics.append(RootTactic(rootRange, strings.get(tree.pp[root]), tree.before(root), tree.after(root), children))
+    order = sorted(range(len(roots)), key=lambda k: rootTactics[k].fileRange)
+    return roots[order], [rootTactics[k] for k in order]
+
+
+def term_nodes(tree: FlatInfoTree) -> np.ndarray:
+    """Nodes proof.collect_all_terms picks: ident terms without expected type, outermost only"""
+    ident = tree.strings.ids.get("ident", NONE)
+    match = (tree.kind == KIND_TERM) & (tree.ref_kind == ident) & (tree.term_expected_type == NONE)
+    if ident == NONE or not match.any():
+        return np.flatnonzero(match)
+    match &= ~subtree_mask(tree, np.flatnonzero(match), include_roots=False)
+    return np.flatnonzero(match)
+
+
+def collect_all_terms(tree: FlatInfoTree, lines) -> list[Term]:
+    """Same result as proof.collect_all_terms"""
+    nodes = term_nodes(tree)
+    strings = tree.strings
+    return [Term(fileRange, strings.get(tree.term_value[i]), strings.get(tree.term_type[i]))
+            for i, fileRange in zip(nodes, file_ranges(tree, line_start_array(lines), nodes))]
+
+
+# =============================
+# Range containment joins
+# =============================
+# 判斷 tactic / term 屬於哪個 declaration，直接比 byte offset，
+# 不用對每個 declaration 掃過所有節點做 FileRange.inRange。
+
+MAX_OFFSET = np.iinfo(np.int64).max
+
+
+def _offsets(start, stop):
+    """Missing starts and stops cover the whole file, like FileRange.fromStringRange"""
+    start = np.asarray(start, dtype=np.int64)
+    stop = np.asarray(stop, dtype=np.int64)
+    return np.where(start == NONE, 0, start), np.where(stop == NONE, MAX_OFFSET, stop)
+
+
+def _innermost(outer_start, outer_stop, inner_start, inner_stop):
+    """
+    (order, enclosing, owner): order sorts the outer ranges by start (outermost first on ties),
+    enclosing[k] is the position in that order of the range around the k-th one, owner[i] is the position of
+    the innermost range around inner range i; NONE where there is none.
+    """
+    outer_start, outer_stop = _offsets(outer_start, outer_stop)
+    inner_start, inner_stop = _offsets(inner_start, inner_stop)
+    order = np.lexsort((-outer_stop, outer_start))
+    starts = outer_start[order]
+    stops = outer_stop[order]
+    # 外層 range 一般互不重疊；有巢狀時記下每個 range 的外層，沒對上就往外找
+    enclosing = np.full(len(order), NONE, dtype=np.int64)
+    stack = []
+    for k in range(len(order)):
+        while stack and stops[stack[-1]] < stops[k]:
+            stack.pop()
+        if stack:
+            enclosing[k] = stack[-1]
+        stack.append(k)
+
+    owner = np.searchsorted(starts, inner_start, side='right') - 1
+    pending = np.flatnonzero(owner >= 0)
+    while len(pending):
+        miss = stops[owner[pending]] < inner_stop[pending]
+        pending = pending[miss]
+        owner[pending] = enclosing[owner[pending]]
+        pending = pending[owner[pending] >= 0]
+    return order, enclosing, owner
+
+
+def containment_join(outer_start, outer_stop, inner_start, inner_stop) -> np.ndarray:
+    """
+    For every inner range, the index of the innermost outer range containing it, or NONE.
+    Bounds are inclusive on both ends, as in FileRange.inRange.
+    """
+    if len(outer_start) == 0:
+        return np.full(len(inner_start), NONE, dtype=np.int64)
+    order, _, owner = _innermost(outer_start, outer_stop, inner_start, inner_stop)
+    return np.where(owner >= 0, order[np.maximum(owner, 0)], NONE)
+
+
+def containment_groups(outer_start, outer_stop, inner_start, inner_stop) -> list[np.ndarray]:
+    """
+    Indices of the inner ranges inside each outer range, in their original order.
+    An inner range inside nested outer ranges is in the group of every one of them, like
+    proof.find_root_tactrics checking every declaration range; outer ranges must be nested or disjoint.
+    """
+    count = len(outer_start)
+    if count == 0:
+        return []
+    order, enclosing, owner = _innermost(outer_start, outer_stop, inner_start, inner_stop)
+    # 從最內層往外走，每一層都記一對 (outer, inner)
+    outers = []
+    inners = []
+    pending = np.flatnonzero(owner >= 0)
+    level = owner[pending]
+    while len(pending):
+        outers.append(order[level])
+        inners.append(pending)
+        level = enclosing[level]
+        pending = pending[level >= 0]
+        level = level[level >= 0]
+    if not outers:
+        return [np.empty(0, dtype=np.int64) for _ in range(count)]
+    outers = np.concatenate(outers)
+    inners = np.concatenate(inners)
+    pairs = np.lexsort((inners, outers))
+    outers = outers[pairs]
+    inners = inners[pairs]
+    bounds = np.searchsorted(outers, np.arange(count + 1))
+    return [inners[bounds[k]:bounds[k + 1]] for k in range(count)]
+
+
+def extract_theorems(project, module_name):
+    """Same result as proof.extract_theorems, with tactics and terms joined to declarations by byte range"""
+    if not project.has_info(module_name, Declaration) or not project.has_info(module_name, InfoTree):
+        return []
+    declarations = project.load_info(module_name, Declaration)
+    tree = flatten(project.load_info(module_name, InfoTree))
+    if project.has_info(module_name, LineModel):
+        lines = project.load_info(module_name, LineModel)
+    else:
+        lines = []
+
+    decls = [decl for decl in declarations if decl.kind == "theorem" and len(decl.name) > 0]
+    decl_ranges = [decl.ref.range for decl in decls]
+    decl_start = [NONE if r is None or r.start is None else r.start for r in decl_ranges]
+    decl_stop = [NONE if r is None or r.stop is None else r.stop for r in decl_ranges]
+
+    tactic_nodes, rootTactics = collect_root_tactics(tree, lines)
+    nodes = term_nodes(tree)
+    terms = collect_all_terms(tree, lines)
+    # 巢狀的 declaration（例如 where 裡的 theorem）和 tree walk 一樣，外層也拿到內層的 tactic 與 term
+    tactic_groups = containment_groups(decl_start, decl_stop, tree.start[tactic_nodes], tree.stop[tactic_nodes])
+    term_groups = containment_groups(decl_start, decl_stop, tree.start[nodes], tree.stop[nodes])
+
+    theorems = []
+    for decl, ranges, tactic_group, term_group in zip(decls, declaration_ranges(decls, lines), tactic_groups, term_groups):
+        theorem = extract_theorem(project, module_name, decl, lines,
+                                  [rootTactics[k] for k in tactic_group], [terms[k] for k in term_group], ranges)
+        if theorem is not None:
+            theorems.append(theorem)
+    return theorems
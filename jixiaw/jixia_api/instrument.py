@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# =============================
+# Instrumentation
+# =============================
+# 預設關閉：關閉時 timer() 回傳共用的空 context manager，count() 只檢查一次 enabled，幾乎沒有成本。
+# enable() 之後每個 stage 的秒數、呼叫次數與 counter 記在目前的模組下（沒有模組時記在 "-"）。
+# 目前的模組是每個 thread 各自的，staged pipeline 的 worker 同時處理不同模組也不會記錯。
+# stage 的時間是包含式的，巢狀的 stage 也算在外層裡。position 只算 declaration range 的批次換算，
+# tree_walk 中 tactic 與 term 的位置換算算在 tree_walk 裡。
+# memory 設成 memory.MemoryTracker 時，module() 和 memory.stages 裡的 timer 也會記錄記憶體。
+
+STAGES = ("load", "tree_walk", "position", "source", "serialize", "write")
+"""Stages timed by the extractors"""
+
+NO_MODULE = "-"
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats, stage: str):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _MemoryTimer:
+    __slots__ = ("timer", "stage")
+
+    def __init__(self, timer: _Timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.stage.__enter__()
+        self.timer.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        # snapshot 的時間不算進 timer
+        self.timer.__exit__(*exc)
+        return self.stage.__exit__(*exc)
+
+
+class ModuleStats:
+    def __init__(self, module: str):
+        self.module = module
+        self.elapsed = 0.0
+        """wall time inside Instrument.module()"""
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def merge(self, other: "ModuleStats"):
+        self.elapsed += other.elapsed
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        for stage, calls in other.calls.items():
+            self.calls[stage] = self.calls.get(stage, 0) + calls
+        for name, n in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def as_dict(self) -> dict:
+        return {
+            "module": self.module,
+            "elapsed": round(self.elapsed, 6),
+            "seconds": {stage: round(seconds, 6) for stage, seconds in self.seconds.items()},
+            "calls": dict(self.calls),
+            "counts": dict(self.counts),
+        }
+
+
+class Instrument:
+    def __init__(self):
+        self.enabled = False
+        self.entries: list[ModuleStats] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.memory = None
+        """memory.MemoryTracker, when memory accounting is on"""
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.entries = []
+        self.local = threading.local()
+
+    def _current(self) -> ModuleStats:
+        stats = getattr(self.local, "stats", None)
+        if stats is None:
+            stats = self._new_entry(NO_MODULE)
+            self.local.stats = stats
+        return stats
+
+    def _new_entry(self, module: str) -> ModuleStats:
+        stats = ModuleStats(module)
+        with self.lock:
+            self.entries.append(stats)
+        return stats
+
+    @contextmanager
+    def module(self, module_name):
+        """Attribute everything measured in this thread to module_name"""
+        if not self.enabled:
+            yield
+            return
+        if not isinstance(module_name, str):
+            module_name = ".".join(module_name)
+        previous = getattr(self.local, "stats", None)
+        stats = self._new_entry(module_name)
+        self.local.stats = stats
+        start = time.perf_counter()
+        try:
+            if self.memory is None:
+                yield
+            else:
+                with self.memory.module(module_name):
+                    yield
+        finally:
+            stats.elapsed += time.perf_counter() - start
+            self.local.stats = previous
+
+    def timer(self, stage: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        timer = _Timer(self._current(), stage)
+        if self.memory is not None and stage in self.memory.stages:
+            return _MemoryTimer(timer, self.memory.stage(stage))
+        return timer
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        counts = self._current().counts
+        counts[name] = counts.get(name, 0) + n
+
+    def report(self) -> dict:
+        """{"total": ..., "modules": [...]}, a module seen by several threads is merged into one entry"""
+        with self.lock:
+            entries = list(self.entries)
+        modules: dict[str, ModuleStats] = {}
+        total = ModuleStats("total")
+        for stats in entries:
+            merged = modules.get(stats.module)
+            if merged is None:
+                merged = modules[stats.module] = ModuleStats(stats.module)
+            merged.merge(stats)
+            total.merge(stats)
+        return {
+            "total": total.as_dict(),
+            "modules": [stats.as_dict() for stats in modules.values()],
+        }
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf-8') as fd:
+            json.dump(self.report(), fd, ensure_ascii=False, indent=2)
+        print(f"Instrument report: {path}")
+
+
+INSTR = Instrument()
+"""Process-wide instrument, disabled until INSTR.enable()"""
+
+
+def timed(stage: str):
+    """Decorator version of INSTR.timer(stage)"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not INSTR.enabled:
+                return fn(*args, **kwargs)
+            with INSTR.timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
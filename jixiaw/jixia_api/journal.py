@@ -0,0 +1,72 @@
+import json
+import os
+import time
+
+# =============================
+# Run journal
+# =============================
+# 每完成一個模組就在 journal 附加一行 JSON，寫完 flush + fsync；輸出檔本身用 temp file + rename 寫，
+# 所以 journal 裡有的模組，輸出一定是完整的。crash 在一行寫到一半時，讀回來會略過壞掉的最後一行。
+# --resume 讀回 journal，status 是 ok 的模組跳過；失敗的模組會重跑。
+
+OK = "ok"
+FAILED = "failed"
+
+
+class RunJournal:
+    def __init__(self, path, resume: bool = False):
+        """
+        :param path: journal file, created if missing
+        :param resume: keep the entries of a previous run, otherwise start a new journal
+        """
+        self.path = str(path)
+        self.entries: dict[str, dict] = {}
+        # journal 可能在輸出目錄建立之前就打開（例如 pipeline 的 sink.begin 之前）
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if resume:
+            self._load()
+        else:
+            # 舊的 journal 不算數
+            open(self.path, 'w').close()
+        self.fd = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fd:
+                for line in fd:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["module"]] = entry
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _key(module_name) -> str:
+        return module_name if isinstance(module_name, str) else ".".join(module_name)
+
+    def done(self, module_name) -> bool:
+        entry = self.entries.get(self._key(module_name))
+        return entry is not None and entry["status"] == OK
+
+    def done_entries(self) -> list[dict]:
+        return [entry for entry in self.entries.values() if entry["status"] == OK]
+
+    def record(self, module_name, status: str = OK, **info):
+        entry = {"module": self._key(module_name), "status": status, "time": round(time.time(), 3), **info}
+        self.entries[entry["module"]] = entry
+        self.fd.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.fd.flush()
+        os.fsync(self.fd.fileno())
+
+    def remaining(self, modules: list) -> list:
+        """modules not done yet, in their original order"""
+        pending = [module_name for module_name in modules if not self.done(module_name)]
+        skipped = len(modules) - len(pending)
+        if skipped:
+            print(f"Resume: {skipped} modules already done, {len(pending)} to go")
+        return pending
+
+    def close(self):
+        self.fd.close()
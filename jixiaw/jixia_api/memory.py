@@ -0,0 +1,164 @@
+import json
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+from .instrument import INSTR
+
+# =============================
+# Memory accounting
+# =============================
+# 開啟時（start_memory_tracking()，掛在 instrument.INSTR 上）每個模組記錄：
+#   peak：模組期間 tracemalloc 追蹤到的記憶體最高點，扣掉模組開始時已經在用的部分
+#   rss / max_rss：模組結束時的 RSS 與整個 process 的 RSS 最高點；max_rss_growth > 0 表示這個模組創了新高
+#   stages：load / tree_walk / serialize 各自的 peak、結束後還留著的量（retained），
+#           以及留下最多記憶體的前幾個 allocation site（stage 前後 snapshot 的差）
+# tracemalloc 會讓程式慢好幾倍，snapshot 也要時間，只在找問題時開。
+# tracemalloc 是整個 process 共用的，staged pipeline 多個 thread 同時跑時各模組的數字會混在一起。
+
+MEMORY_STAGES = ("load", "tree_walk", "serialize")
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as fd:
+            return int(fd.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def max_rss() -> int:
+    try:
+        import resource
+    except ImportError:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的單位是 KB，macOS 是 byte
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _mb(size: int) -> float:
+    return round(size / (1024 * 1024), 3)
+
+
+class MemoryTracker:
+    def __init__(self, top: int = 5, frames: int = 1):
+        """
+        :param top: allocation sites kept per stage
+        :param frames: traceback depth recorded by tracemalloc
+        """
+        self.top = top
+        self.frames = frames
+        self.stages = MEMORY_STAGES
+        self.modules: list[dict] = []
+        self.current = None
+        self.instr_enabled = False
+        """whether INSTR was enabled before start_memory_tracking, restored by stop_memory_tracking"""
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+    def _fold_peak(self, entry: dict):
+        entry["_peak"] = max(entry["_peak"], tracemalloc.get_traced_memory()[1])
+
+    @contextmanager
+    def module(self, module_name):
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        entry = {
+            "module": module_name if isinstance(module_name, str) else ".".join(module_name),
+            "_peak": 0,
+            "stages": {},
+        }
+        previous = self.current
+        self.current = entry
+        max_before = max_rss()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            self._fold_peak(entry)
+            entry["peak"] = entry.pop("_peak") - base
+            entry["rss"] = current_rss()
+            entry["max_rss"] = max_rss()
+            entry["max_rss_growth"] = entry["max_rss"] - max_before
+            self.modules.append(entry)
+            self.current = previous
+
+    @contextmanager
+    def stage(self, stage: str):
+        entry = self.current
+        if entry is None or not tracemalloc.is_tracing():
+            yield
+            return
+        self._fold_peak(entry)
+        before = self._snapshot()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            entry["_peak"] = max(entry["_peak"], peak)
+            after = self._snapshot()
+            top = []
+            for stat in after.compare_to(before, "lineno")[:self.top]:
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                top.append({"site": f"{frame.filename}:{frame.lineno}", "size": stat.size_diff, "count": stat.count_diff})
+            stats = entry["stages"].setdefault(stage, {"peak": 0, "retained": 0, "top": []})
+            # 同一個 stage 進來好幾次（例如分開的 load_info）：peak 取最大，retained 相加，top 留 peak 最大的那次
+            if peak - base >= stats["peak"]:
+                stats["top"] = top
+            stats["peak"] = max(stats["peak"], peak - base)
+            stats["retained"] += current - base
+            tracemalloc.reset_peak()
+
+    def report(self) -> dict:
+        modules = sorted(self.modules, key=lambda m: m["peak"], reverse=True)
+        return {
+            "max_rss": max_rss(),
+            "modules": modules,
+        }
+
+    def write_report(self, path, show: int = 10):
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as fd:
+            json.dump(report, fd, ensure_ascii=False, indent=2)
+        print(f"Memory report: {path}, max RSS {_mb(report['max_rss'])} MB")
+        for entry in report["modules"][:show]:
+            print(f"  peak {_mb(entry['peak']):10.1f} MB  rss {_mb(entry['rss']):10.1f} MB  {entry['module']}")
+
+
+def start_memory_tracking(top: int = 5, frames: int = 1) -> MemoryTracker:
+    """Turn on INSTR with a new MemoryTracker attached"""
+    tracker = MemoryTracker(top, frames)
+    tracker.start()
+    tracker.instr_enabled = INSTR.enabled
+    INSTR.enable()
+    INSTR.memory = tracker
+    return tracker
+
+
+def stop_memory_tracking(path):
+    """Write the report of the attached tracker to path, detach it and put INSTR back as it was"""
+    tracker = INSTR.memory
+    if tracker is None:
+        return
+    tracker.write_report(path)
+    tracker.stop()
+    INSTR.memory = None
+    if not tracker.instr_enabled:
+        INSTR.disable()
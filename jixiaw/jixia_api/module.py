@@ -12,6 +12,7 @@ from .structs import (
     LeanInfoTree, LeanOpenDecl, LeanOpenDeclSimple, LeanOpenDeclRename, LeanScopeInfo, LeanPPSyntaxWithKind,
     LeanVariable, LeanSpecialValue, LeanTermElabInfo, LeanGoal, LeanTacticElabInfo, LeanElabInfo
 )
+from .names import to_lean_ident
 
 LeanIdent = str
 
@@ -512,6 +513,3 @@ class InfoTreeData:
             ref=PPSyntaxWithKindData.lean_create(infoTree.ref),
             children=[ InfoTreeData.lean_create(child) for child in infoTree.children ]
         )
-
-def to_lean_ident(name: list[str]):
-    return ".".join([str(v) for v in name])
@@ -0,0 +1,65 @@
+import sys
+import threading
+
+# =============================
+# Name interning
+# =============================
+# LeanNameID (["Nat", "add"]) 轉成 "Nat.add" 在整個 process 只做一次：
+# 同一個名字之後都拿到同一個 interned str，*Data 物件也共用字串而不是各存一份。
+# 像 Nat.add、Eq.mpr 在 Mathlib 裡會出現上百萬次。
+# staged pipeline 會從好幾個 thread 呼叫：新名字（少數）在 lock 裡加入，ID 才不會重複；
+# 已經有的名字不拿 lock，所以 stats() 的 total 在多 thread 時只是近似值。
+
+
+class NameInterner:
+    def __init__(self):
+        self.names: dict[tuple, str] = {}
+        self.ids: dict[str, int] = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def intern(self, name) -> str:
+        """Dotted, interned form of a list-form name (a plain str is returned interned as is)"""
+        self.total += 1
+        key = name if isinstance(name, str) else tuple(name)
+        ident = self.names.get(key)
+        if ident is None:
+            with self.lock:
+                ident = self.names.get(key)
+                if ident is None:
+                    ident = name if isinstance(name, str) else ".".join([str(v) for v in name])
+                    ident = sys.intern(ident)
+                    self.ids.setdefault(ident, len(self.ids))
+                    self.names[key] = ident
+        return ident
+
+    def id(self, name) -> int:
+        """Stable integer ID of a name, in order of first appearance"""
+        return self.ids[self.intern(name)]
+
+    def stats(self) -> dict:
+        distinct = len(self.ids)
+        return {
+            "distinct": distinct,
+            "total": self.total,
+            "reuse": self.total / distinct if distinct else 0.0,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.names.clear()
+            self.ids.clear()
+            self.total = 0
+
+
+NAMES = NameInterner()
+"""Process-wide interner used by the converters and the proof extractor"""
+
+
+def to_lean_ident(name) -> str:
+    return NAMES.intern(name)
+
+
+def print_name_stats():
+    stats = NAMES.stats()
+    print(f"Names: {stats['distinct']} distinct / {stats['total']} total ({stats['reuse']:.1f}x reuse)")
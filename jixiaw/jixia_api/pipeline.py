@@ -0,0 +1,517 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from dataclasses import dataclass, field
+from queue import Queue, Empty, Full
+from typing import Iterable, Optional
+
+from jixia import LeanProject
+from jixia.structs import Declaration, InfoTree, LineModel, Symbol, ModuleInfo, ALL_PLUGINS
+from .proof import extract_module_theorems, create_theorem_lines
+from .copy_module import render_module, write_rendered
+from .util import collect_match_modules, write_atomic
+from .names import print_name_stats
+from .instrument import INSTR
+from .memory import start_memory_tracking, stop_memory_tracking
+from .journal import RunJournal, OK, FAILED
+from .shard import select_shard, write_manifest
+
+# =============================
+# Fused pipeline
+# =============================
+# 每個模組的 plugin 輸出只載入一次，再交給所有登記的 sink。
+# 每個 sink 用 needs 宣告要哪些輸出，載入的是所有 sink 的聯集；多加一種輸出不會多 parse 一次。
+
+MODULE = "module"
+"""needs entry for the module info (mod.json)"""
+
+
+@dataclass
+class ModuleInputs:
+    module_name: list[str]
+    module: Optional[ModuleInfo] = None
+    declarations: list[Declaration] = field(default_factory=list)
+    symbols: list[Symbol] = field(default_factory=list)
+    infoTrees: list[InfoTree] = field(default_factory=list)
+    lines: list[LineModel] = field(default_factory=list)
+    loaded: set = field(default_factory=set)
+    """what was found on disk: MODULE and the plugin classes"""
+
+
+class Sink(ABC):
+    """
+    extract runs on the loaded inputs and may run in several threads at once;
+    write gets its result and always runs in a single thread.
+    """
+
+    needs: set = set()
+
+    def begin(self, project):
+        pass
+
+    @abstractmethod
+    def extract(self, project, inputs: ModuleInputs):
+        pass
+
+    def write(self, result):
+        pass
+
+    def finish(self):
+        pass
+
+
+class TheoremSink(Sink):
+    """Per-theorem JSONL, same files as proof.process_searches"""
+
+    needs = {Declaration, InfoTree, LineModel}
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.operatorSet = {":=": 0}
+
+    def begin(self, project):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def extract(self, project, inputs: ModuleInputs):
+        if Declaration not in inputs.loaded or InfoTree not in inputs.loaded:
+            theorems = []
+        else:
+            theorems = extract_module_theorems(project, inputs.module_name, inputs.declarations, inputs.infoTrees, inputs.lines)
+        # 每個模組自己數，write 再合併，extract 可以平行跑
+        operatorSet = {}
+        lines = create_theorem_lines(inputs.module_name, theorems, operatorSet)
+        return ".".join(inputs.module_name), '\n'.join(lines) + '\n', operatorSet
+
+    def write(self, result):
+        module_str, content, operatorSet = result
+        for operator, count in operatorSet.items():
+            self.operatorSet[operator] = self.operatorSet.get(operator, 0) + count
+        with INSTR.timer("write"):
+            write_atomic(f"{self.output_dir}/{module_str}.jsonl", content)
+        if INSTR.enabled:
+            INSTR.count("bytes_written", len(content.encode('utf-8')))
+
+    def finish(self):
+        print(f"Theorem Operator Set: {self.operatorSet}")
+
+
+class CopySink(Sink):
+    """module/symbol/decl/elab copies, same files as copy_module.process_searches"""
+
+    needs = {MODULE, Symbol, Declaration, InfoTree}
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+
+    def begin(self, project):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def extract(self, project, inputs: ModuleInputs):
+        if MODULE not in inputs.loaded:
+            return None
+        try:
+            return inputs.module_name, render_module(inputs.module, inputs.symbols, inputs.declarations, inputs.infoTrees)
+        except Exception as e:
+            print(f"xxxx Fail to process module: {inputs.module_name}, {e}")
+            return None
+
+    def write(self, result):
+        if result is not None:
+            write_rendered(result[0], result[1], self.output_dir)
+
+
+class StatsSink(Sink):
+    """Counts over all modules"""
+
+    needs = {Declaration, Symbol, InfoTree}
+
+    def __init__(self):
+        self.stats = {"modules": 0, "declarations": 0, "theorems": 0, "symbols": 0, "nodes": 0, "tactic_nodes": 0}
+
+    def extract(self, project, inputs: ModuleInputs):
+        stats = dict.fromkeys(self.stats, 0)
+        stats["modules"] = 1
+        stats["declarations"] = len(inputs.declarations)
+        stats["theorems"] = sum(1 for decl in inputs.declarations if decl.kind == "theorem")
+        stats["symbols"] = len(inputs.symbols)
+        stack = list(inputs.infoTrees)
+        while stack:
+            node = stack.pop()
+            stats["nodes"] += 1
+            if node.info.tactic is not None:
+                stats["tactic_nodes"] += 1
+            stack.extend(node.children)
+        return stats
+
+    def write(self, result):
+        for key, count in result.items():
+            self.stats[key] += count
+
+    def finish(self):
+        print(f"Stats: {self.stats}")
+
+
+def load_module_inputs(project, module_name, needs: set) -> ModuleInputs:
+    with INSTR.timer("load"):
+        return _load_module_inputs(project, module_name, needs)
+
+
+def _load_module_inputs(project, module_name, needs: set) -> ModuleInputs:
+    inputs = ModuleInputs(module_name)
+    if MODULE in needs and project.has_module_info(module_name):
+        inputs.module = project.load_module_info(module_name)
+        inputs.loaded.add(MODULE)
+    for cls, attr in ((Declaration, "declarations"), (Symbol, "symbols"), (InfoTree, "infoTrees"), (LineModel, "lines")):
+        if cls in needs and project.has_info(module_name, cls):
+            setattr(inputs, attr, project.load_info(module_name, cls))
+            inputs.loaded.add(cls)
+    return inputs
+
+
+def extract_sinks(project, inputs: ModuleInputs, sinks: list[Sink]) -> tuple[list, str]:
+    """([(sink, result), ...], status); a sink that fails is left out and the module is FAILED"""
+    results = []
+    status = OK
+    for sink in sinks:
+        try:
+            results.append((sink, sink.extract(project, inputs)))
+        except Exception as e:
+            print(f"xxxxx Fail to extract module: {inputs.module_name}, {type(sink).__name__}, {e}")
+            status = FAILED
+    return results, status
+
+
+def write_sinks(module_name, results: list, status: str) -> str:
+    """Write the results of extract_sinks, status becomes FAILED when a write fails"""
+    for sink, result in results:
+        try:
+            sink.write(result)
+        except Exception as e:
+            print(f"xxxxx Fail to write: {module_name}, {type(sink).__name__}, {e}")
+            status = FAILED
+    return status
+
+
+def run_pipeline(project, modules: Iterable[list[str]], sinks: list[Sink], journal: Optional[RunJournal] = None):
+    needs = set()
+    for sink in sinks:
+        needs |= sink.needs
+        sink.begin(project)
+    for module_name in modules:
+        with INSTR.module(module_name):
+            try:
+                inputs = load_module_inputs(project, module_name, needs)
+            except Exception as e:
+                print(f"xxxxx Fail to load module: {module_name}, {e}")
+                status = FAILED
+            else:
+                results, status = extract_sinks(project, inputs, sinks)
+                status = write_sinks(module_name, results, status)
+        if journal is not None:
+            journal.record(module_name, status)
+    for sink in sinks:
+        sink.finish()
+    print_name_stats()
+
+
+# =============================
+# Staged pipeline
+# =============================
+# loader pool -> extractor pool -> 單一 writer thread，中間用有上限的 Queue 接起來，
+# 下游慢的時候 put 會擋住上游（backpressure），記憶體裡最多只有 queue_size 個模組。
+# 都是 thread：pydantic 的驗證和檔案 I/O 會放掉 GIL，純 Python 的 tree walking 不會，
+# 所以 extractor 多開的效益有限，主要是讓 parse、extract、write 彼此重疊。
+# 單一模組的錯誤只讓那個模組記成 FAILED；worker 本身意外結束時設 stop，
+# 其他 stage 的 put/get 每 STOP_POLL 秒檢查一次，不會永遠卡在滿的（或空的）queue 上。
+
+_DONE = object()
+
+STOP_POLL = 0.1
+"""seconds between checks of the stop event while waiting on a queue"""
+
+
+class StageCounter:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        """seconds spent working"""
+        self.blocked = 0.0
+        """seconds spent waiting on a full queue downstream"""
+        self.lock = threading.Lock()
+
+    def add(self, busy: float, blocked: float):
+        with self.lock:
+            self.items += 1
+            self.busy += busy
+            self.blocked += blocked
+
+    def report(self, elapsed: float) -> str:
+        rate = self.items / elapsed if elapsed > 0 else 0.0
+        return f"{self.name}: {self.items} modules, {rate:.2f}/s, busy {self.busy:.1f}s, blocked {self.blocked:.1f}s"
+
+
+def run_staged_pipeline(project, modules: Iterable[list[str]], sinks: list[Sink],
+                        loaders: int = 2, extractors: int = 1, queue_size: int = 8,
+                        journal: Optional[RunJournal] = None) -> list[StageCounter]:
+    """modules can be any iterable, also a generator that blocks until the next module is ready"""
+    needs = set()
+    for sink in sinks:
+        needs |= sink.needs
+        sink.begin(project)
+
+    module_it = iter(modules)
+    module_lock = threading.Lock()
+    load_q = Queue(maxsize=queue_size)
+    write_q = Queue(maxsize=queue_size)
+    stop = threading.Event()
+    counters = [StageCounter("load"), StageCounter("extract"), StageCounter("write")]
+    load_counter, extract_counter, write_counter = counters
+
+    def put(q: Queue, item) -> bool:
+        """False when the pipeline stopped before item could be queued"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=STOP_POLL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def get(q: Queue):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=STOP_POLL)
+            except Empty:
+                pass
+        return _DONE
+
+    def guarded(worker):
+        def run():
+            try:
+                worker()
+            except BaseException as e:
+                print(f"xxxxx {threading.current_thread().name} stopped: {e}")
+                stop.set()
+        return run
+
+    def load_worker():
+        while True:
+            with module_lock:
+                try:
+                    module_name = next(module_it, _DONE)
+                except Exception as e:
+                    print(f"xxxxx Fail to list modules: {e}")
+                    module_name = _DONE
+            if module_name is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                with INSTR.module(module_name):
+                    inputs = load_module_inputs(project, module_name, needs)
+            except Exception as e:
+                print(f"xxxxx Fail to load module: {module_name}, {e}")
+                # 交給 writer 記進 journal，journal 只有 writer 在寫
+                if not put(write_q, (module_name, [], FAILED)):
+                    return
+                continue
+            loaded = time.perf_counter()
+            if not put(load_q, inputs):
+                return
+            load_counter.add(loaded - start, time.perf_counter() - loaded)
+
+    def extract_worker():
+        while True:
+            inputs = get(load_q)
+            if inputs is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                with INSTR.module(inputs.module_name):
+                    results, status = extract_sinks(project, inputs, sinks)
+            except Exception as e:
+                print(f"xxxxx Fail to extract module: {inputs.module_name}, {e}")
+                results, status = [], FAILED
+            extracted = time.perf_counter()
+            if not put(write_q, (inputs.module_name, results, status)):
+                return
+            extract_counter.add(extracted - start, time.perf_counter() - extracted)
+
+    def write_worker():
+        while True:
+            item = get(write_q)
+            if item is _DONE:
+                return
+            module_name, results, status = item
+            start = time.perf_counter()
+            try:
+                with INSTR.module(module_name):
+                    status = write_sinks(module_name, results, status)
+                if journal is not None:
+                    journal.record(module_name, status)
+            except Exception as e:
+                print(f"xxxxx Fail to write: {module_name}, {e}")
+            write_counter.add(time.perf_counter() - start, 0.0)
+
+    started = time.perf_counter()
+    load_threads = [threading.Thread(target=guarded(load_worker), name=f"load-{k}") for k in range(loaders)]
+    extract_threads = [threading.Thread(target=guarded(extract_worker), name=f"extract-{k}") for k in range(extractors)]
+    writer = threading.Thread(target=guarded(write_worker), name="write")
+    for t in load_threads + extract_threads + [writer]:
+        t.start()
+    for t in load_threads:
+        t.join()
+    for _ in extract_threads:
+        put(load_q, _DONE)
+    for t in extract_threads:
+        t.join()
+    put(write_q, _DONE)
+    writer.join()
+    elapsed = time.perf_counter() - started
+
+    for sink in sinks:
+        sink.finish()
+    print_name_stats()
+    if stop.is_set():
+        print("xxxxx pipeline stopped early, modules that were not written are not in the journal")
+    print(f"Pipeline: {load_counter.items} modules in {elapsed:.1f}s")
+    for counter in counters:
+        print("  " + counter.report(elapsed))
+    return counters
+
+
+def process_searches(working_dir: str, search_list: list[str], exclude_list: list[str], sinks: list[Sink],
+                     loaders: int = 0, extractors: int = 1, queue_size: int = 8, report_path: Optional[str] = None,
+                     memory_path: Optional[str] = None, journal_path: Optional[str] = None, resume: bool = False,
+                     shard: Optional[tuple[int, int]] = None, shard_costs: Optional[dict[str, float]] = None):
+    """
+    loaders=0 runs everything in this thread, one module after another.
+    report_path: write the per-stage timings there (see instrument.py)
+    memory_path: write the per-module memory report there (see memory.py), use with loaders=0
+    journal_path: record finished modules there; with resume=True skip the ones a previous run finished (see journal.py)
+    shard=(i, N) only processes the i-th of N shards (see shard.py); give each shard its own journal_path,
+        the shard manifest is written next to it
+    """
+    project = LeanProject(working_dir)
+    modules = []
+    for search in search_list:
+        modules.extend(collect_match_modules(project, search, exclude_list))
+    modules = select_shard(modules, shard, shard_costs)
+    journal = _run(project, modules, sinks, loaders, extractors, queue_size, report_path, memory_path, journal_path, resume)
+    if shard is not None and journal is not None:
+        write_manifest(os.path.dirname(os.path.abspath(journal_path)), shard, modules, journal, shard_costs)
+
+
+def _run(project, modules, sinks, loaders, extractors, queue_size, report_path, memory_path=None,
+         journal_path=None, resume=False) -> Optional[RunJournal]:
+    journal = None
+    if journal_path is not None:
+        journal = RunJournal(journal_path, resume)
+        if isinstance(modules, list):
+            modules = journal.remaining(modules)
+        else:
+            modules = (module_name for module_name in modules if not journal.done(module_name))
+    if report_path is not None:
+        INSTR.enable()
+    if memory_path is not None:
+        if loaders > 0:
+            print("xxxxx memory numbers of modules loaded at the same time are mixed, use loaders=0")
+        start_memory_tracking()
+    if loaders > 0:
+        run_staged_pipeline(project, modules, sinks, loaders, extractors, queue_size, journal)
+    else:
+        run_pipeline(project, modules, sinks, journal)
+    if journal is not None:
+        journal.close()
+    if memory_path is not None:
+        stop_memory_tracking(memory_path)
+    if report_path is not None:
+        INSTR.write_report(report_path)
+    return journal
+
+
+# =============================
+# Overlap with jixia
+# =============================
+# jixia 在背景 thread 跑，batch_run_jixia 每完成一個模組就呼叫 on_complete，模組名稱放進 Queue，
+# pipeline 直接從 Queue 取，不用等整個專案都跑完才開始抽取。
+# 同一個模組的 plugin 由同一個 jixia process 寫出，process 結束時 sink 需要的輸出檔都已寫完。
+
+def sink_plugins(sinks: list[Sink]) -> list[str]:
+    """jixia plugins producing what the sinks need"""
+    plugins = set()
+    for sink in sinks:
+        for need in sink.needs:
+            plugins.add("module" if need == MODULE else need._plugin_name)
+    return [p for p in ALL_PLUGINS if p in plugins]
+
+
+def completed_modules(project, plugins: list[str], base_dir=None, prefixes=None, exclude_list=(),
+                      force: bool = False, max_workers: Optional[int] = None, shard: Optional[tuple[int, int]] = None):
+    """
+    Run jixia on the matching modules and yield each module name as soon as its outputs are complete.
+    Modules jixia fails on are skipped; modules whose outputs already exist come first (unless force).
+    shard=(i, N) runs only the modules of that shard (hash sharding, see jixia.run.shard_modules)
+    """
+    done_q = Queue()
+
+    def on_complete(module_name, result):
+        module_name = list(module_name)
+        if ".".join(module_name) in exclude_list:
+            return
+        if result is not None and result.returncode:
+            print(f"xxxxx jixia failed on module: {module_name}")
+            return
+        done_q.put(module_name)
+
+    def run():
+        try:
+            project.batch_run_jixia(base_dir=base_dir, prefixes=prefixes, plugins=plugins, force=force,
+                                    max_workers=max_workers, on_complete=on_complete, shard=shard)
+        except Exception as e:
+            print(f"xxxxx jixia batch failed: {e}")
+        finally:
+            done_q.put(_DONE)
+
+    runner = threading.Thread(target=run, name="jixia", daemon=True)
+    runner.start()
+    while True:
+        module_name = done_q.get()
+        if module_name is _DONE:
+            break
+        yield module_name
+    runner.join()
+
+
+def process_with_jixia(working_dir: str, search_list: list[str], exclude_list: list[str], sinks: list[Sink],
+                       base_dir=None, force: bool = False, max_workers: Optional[int] = None,
+                       loaders: int = 0, extractors: int = 1, queue_size: int = 8, report_path: Optional[str] = None,
+                       memory_path: Optional[str] = None, journal_path: Optional[str] = None, resume: bool = False,
+                       shard: Optional[tuple[int, int]] = None):
+    """Same as process_searches, but generates the jixia outputs and extracts them at the same time"""
+    project = LeanProject(working_dir)
+    prefixes = [search.split(".") for search in search_list]
+    modules = completed_modules(project, sink_plugins(sinks), base_dir, prefixes, exclude_list, force, max_workers, shard)
+    _run(project, modules, sinks, loaders, extractors, queue_size, report_path, memory_path, journal_path, resume)
+
+
+if __name__ == "__main__":
+    working_dir = "/home/linfe/math/lean_test"
+    search_list = [
+        "LeanTest",
+    ]
+    exclude_list = [
+        "Init.WF",
+        "Init.Meta.Defs",
+        'Mathlib.Data.Prod.Basic'
+    ]
+    sinks = [
+        TheoremSink(working_dir + "/.jixiaw"),
+        CopySink(working_dir + "/.jixiaw_test"),
+        StatsSink(),
+    ]
+
+    process_searches(working_dir, search_list, exclude_list, sinks, loaders=2, extractors=1)
+    # 還沒跑過 jixia 時：
+    # process_with_jixia(working_dir, search_list, exclude_list, sinks, loaders=2, extractors=1)
@@ -0,0 +1,138 @@
+import cProfile
+import heapq
+import os
+import signal
+import time
+from contextlib import contextmanager
+
+# =============================
+# Profilers
+# =============================
+# --profile sample：用 SIGPROF 定時取樣 main thread 的 stack，每個模組輸出一個 collapsed-stack 檔，
+#   每行 "frame;frame;... count"，可以直接給 flamegraph.pl 或 speedscope。
+#   SIGPROF 以 CPU 時間計時，等待 I/O 或子行程的時間不會被取樣；只有 main thread 會被取樣（Unix only）。
+# --profile cprofile：每個模組各自跑 cProfile，只保留最慢的 N 個模組的 .prof（pstats / snakeviz 可讀）。
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+class NullProfiler:
+    @contextmanager
+    def module(self, module_name):
+        yield
+
+    def finish(self):
+        pass
+
+
+def _module_id(module_name) -> str:
+    return module_name if isinstance(module_name, str) else ".".join(module_name)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SampleProfiler(NullProfiler):
+    def __init__(self, output_dir: str, interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.stacks: dict[str, dict[tuple, int]] = {}
+        """module -> stack (tuple of code objects, outermost first) -> samples"""
+        self.current = self.stacks.setdefault("-", {})
+        self.previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        key = tuple(stack)
+        current = self.current
+        current[key] = current.get(key, 0) + 1
+
+    @contextmanager
+    def module(self, module_name):
+        previous = self.current
+        self.current = self.stacks.setdefault(_module_id(module_name), {})
+        try:
+            yield
+        finally:
+            self.current = previous
+
+    def finish(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+        os.makedirs(self.output_dir, exist_ok=True)
+        labels = {}
+        totals = []
+        for module_id, stacks in self.stacks.items():
+            if not stacks:
+                continue
+            with open(os.path.join(self.output_dir, module_id + ".collapsed"), 'w', encoding='utf-8') as fd:
+                for stack, count in stacks.items():
+                    names = []
+                    for code in stack:
+                        label = labels.get(code)
+                        if label is None:
+                            label = labels[code] = _frame_label(code)
+                        names.append(label)
+                    fd.write(f"{';'.join(names)} {count}\n")
+            totals.append((sum(stacks.values()), module_id))
+        totals.sort(reverse=True)
+        print(f"Profile samples ({self.interval * 1000:.0f}ms each) -> {self.output_dir}")
+        for count, module_id in totals[:10]:
+            print(f"  {count:8d} {module_id}")
+
+
+class CProfileProfiler(NullProfiler):
+    def __init__(self, output_dir: str, top: int = 10):
+        self.output_dir = output_dir
+        self.top = top
+        self.slowest = []
+        """min-heap of (seconds, seq, module, Profile), at most top entries"""
+        self.seq = 0
+
+    @contextmanager
+    def module(self, module_name):
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            self.seq += 1
+            entry = (elapsed, self.seq, _module_id(module_name), profile)
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, entry)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def finish(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"cProfile of the {len(self.slowest)} slowest modules -> {self.output_dir}")
+        for elapsed, _, module_id, profile in sorted(self.slowest, reverse=True):
+            profile.dump_stats(os.path.join(self.output_dir, module_id + ".prof"))
+            print(f"  {elapsed:8.2f}s {module_id}")
+        self.slowest = []
+
+
+def make_profiler(mode, output_dir: str, top: int = 10, interval: float = 0.005):
+    """mode is None, "sample" or "cprofile"; the files are written to output_dir by finish()"""
+    if mode is None:
+        return NullProfiler()
+    if mode == "sample":
+        return SampleProfiler(output_dir, interval)
+    if mode == "cprofile":
+        return CProfileProfiler(output_dir, top)
+    raise ValueError(f"unknown profile mode: {mode}")
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", choices=PROFILE_MODES, help="profile every module (see jixia_api/profiler.py)")
+    parser.add_argument("--profile-top", type=int, default=10, help="cprofile: keep the N slowest modules")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="sample: seconds of CPU time between samples")
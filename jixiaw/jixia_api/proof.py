@@ -1,11 +1,19 @@
 import json
 import os
 import re
+from argparse import ArgumentParser
 from pathlib import Path
 from dataclasses import dataclass
+from typing import Optional
 from jixia import LeanProject
 from jixia.structs import Declaration, StringRange, InfoTree, LineModel, Plugin
-from .util import getLeanSourceDirOrFile, collect_match_modules
+from .util import getLeanSourceDirOrFile, collect_match_modules, write_atomic
+from .names import to_lean_ident, print_name_stats
+from .instrument import INSTR, timed
+from .profiler import NullProfiler, make_profiler, add_profile_arguments
+from .memory import start_memory_tracking, stop_memory_tracking
+from .journal import RunJournal, FAILED
+from .shard import select_shard, shard_suffix, write_manifest, load_costs, add_shard_arguments
 
 @dataclass(frozen=True, order=True)
 class FilePos:
@@ -121,6 +129,7 @@ def createTactic(ref, tactic, lines, skipMultiples = False, previousFileRange =
 
 
 def collect_sub_tactics(nodes: list, lines, previousFileRange = None):
+    INSTR.count("nodes", len(nodes))
     sub_tactics = []
     for node in nodes:
         if node.info and node.info.tactic:
@@ -136,6 +145,7 @@ def collect_sub_tactics(nodes: list, lines, previousFileRange = None):
     return sub_tactics
 
 def collect_all_terms(nodes: list, lines: list, module_name):
+    INSTR.count("nodes", len(nodes))
     terms = []
     for node in nodes:
         if node.info and node.info.term and node.ref.kind == ["ident"] and node.info.term.expected_type is None:
@@ -153,6 +163,7 @@ def find_term(fileRange: FileRange, ident: str, terms: list[Term]):
     return None
 
 def collect_all_tactics(nodes: list, lines: list):
+    INSTR.count("nodes", len(nodes))
     tactics = []
     for node in nodes:
         if node.info and node.info.tactic:
@@ -198,10 +209,11 @@ def extractLine(line: str, start: int, stop: int = -1):
     buf = buf[start : stop]
     return buf.decode('utf-8') 
 
+@timed("source")
 def getLeanSourceCode(project, module_name: list[str], fileRange: FileRange):
     file_path = getLeanSourceDirOrFile(project, module_name, True)
     if file_path is None:
-        raise "Cannot find module_name: {module_name}"
+        raise FileNotFoundError(f"Cannot find module_name: {module_name}")
 
     with open(file_path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
@@ -229,9 +241,9 @@ def getTheoremName(module_name: list[str], decl: Declaration):
     if decl.name is None or len(decl.name) == 0:
         return None
     if decl.name[0] != '_private':
-        return ".".join(decl.name)
+        return to_lean_ident(decl.name)
     private_name = decl.name[len(module_name) + 2:]
-    return ".".join(private_name)
+    return to_lean_ident(private_name)
 
 # =============================
 # Extract Theorems
@@ -254,34 +266,46 @@ def extract_theorem_signature_proof(project, module_name, lines, signature_start
 def extract_theorems(project, module_name):
     if not project.has_info(module_name, Declaration) or not project.has_info(module_name, InfoTree):
         return []
-    declarations = project.load_info(module_name, Declaration)
-    infoTrees = project.load_info(module_name, InfoTree)
-    if project.has_info(module_name, LineModel):
-        lines = project.load_info(module_name, LineModel)
-    else:
-        lines = []
-    rootTactics = collect_all_tactics(infoTrees, lines)
-    terms = collect_all_terms(infoTrees, lines, module_name)
+    with INSTR.timer("load"):
+        declarations = project.load_info(module_name, Declaration)
+        infoTrees = project.load_info(module_name, InfoTree)
+        if project.has_info(module_name, LineModel):
+            lines = project.load_info(module_name, LineModel)
+        else:
+            lines = []
+    return extract_module_theorems(project, module_name, declarations, infoTrees, lines)
+
+def extract_module_theorems(project, module_name, declarations, infoTrees, lines):
+    """extract_theorems on plugin outputs that are already loaded"""
+    with INSTR.timer("tree_walk"):
+        rootTactics = collect_all_tactics(infoTrees, lines)
+        terms = collect_all_terms(infoTrees, lines, module_name)
     theorems = []
-    for _, decl in enumerate(declarations):
-        if decl.kind == "theorem":
-            if len(decl.name) == 0:
-                continue;
-            theorem = extract_theorem(project, module_name, decl, lines, rootTactics, terms)
-            if theorem is not None:
-                theorems.append(theorem)
+    decls = [decl for decl in declarations if decl.kind == "theorem" and len(decl.name) > 0]
+    for decl, ranges in zip(decls, declaration_ranges(decls, lines)):
+        theorem = extract_theorem(project, module_name, decl, lines, rootTactics, terms, ranges)
+        if theorem is not None:
+            theorems.append(theorem)
     return theorems
 
-def extract_theorem(project, module_name, decl, lines, rootTactics, terms):
+def declaration_ranges(decls, lines):
+    """(theorem, signature, value) FileRange of every declaration, mapped in one "position" stage"""
+    with INSTR.timer("position"):
+        return [(FileRange.fromStringRange(lines, decl.ref.range),
+                 FileRange.fromStringRange(lines, decl.signature.range),
+                 FileRange.fromStringRange(lines, decl.value.range)) for decl in decls]
+
+def extract_theorem(project, module_name, decl, lines, rootTactics, terms, ranges=None):
+    """ranges: the declaration's entry of declaration_ranges, mapped here when None"""
     theorem_name = getTheoremName(module_name, decl)
-    theorem_range = FileRange.fromStringRange(lines, decl.ref.range)
+    if ranges is None:
+        ranges = declaration_ranges([decl], lines)[0]
+    theorem_range, signatureRange, theorem_proofRange = ranges
     tactics = find_root_tactrics(theorem_range, rootTactics)
 
     signature = decl.signature.pp
-    signatureRange = FileRange.fromStringRange(lines, decl.signature.range)
             
     statement = decl.value.pp
-    theorem_proofRange = FileRange.fromStringRange(lines, decl.value.range)
 
     if statement is None:
         statement = getLeanSourceCode(project, module_name, theorem_proofRange)
@@ -383,6 +407,11 @@ def create_rootTacitic_data(rootTactic):
 
 def process_module(project, module_name, operatorSet):
     theorems = extract_theorems(project,module_name)
+    return create_theorem_lines(module_name, theorems, operatorSet)
+
+@timed("serialize")
+def create_theorem_lines(module_name, theorems: list[Theorem], operatorSet):
+    INSTR.count("theorems", len(theorems))
     name = ".".join(module_name)
     lines = []
     for theorem in theorems:
@@ -431,15 +460,38 @@ def process_module(project, module_name, operatorSet):
         operatorSet[theorem_operator] = count
     return lines
 
-def process_searches(working_dir: str, search_list: list[str]):
+def process_searches(working_dir: str, search_list: list[str], exclude_list: list[str] = (), instrument: bool = False,
+                     profiler=None, memory: bool = False, resume: bool = False,
+                     shard: Optional[tuple[int, int]] = None, shard_costs: Optional[dict[str, float]] = None):
+    """
+    instrument=True writes per-stage timings to <output_dir>/instrument.json
+    profiler: see profiler.make_profiler
+    memory=True writes the modules ranked by peak memory to <output_dir>/memory.json (slow)
+    resume=True skips the modules finished by the previous run (see journal.py)
+    shard=(i, N) only processes the i-th of N shards, shard_costs balances them (see shard.py)
+    """
+    if profiler is None:
+        profiler = NullProfiler()
     output_dir = working_dir + "/.jixiaw"
     os.makedirs(output_dir, exist_ok=True)
     project = LeanProject(working_dir)
     modules = []
     for search in search_list:
-        modules.extend(collect_match_modules(project, search))
+        modules.extend(collect_match_modules(project, search, exclude_list))
+    modules = select_shard(modules, shard, shard_costs)
+    suffix = shard_suffix(shard)
+    journal = RunJournal(f"{output_dir}/.journal{suffix}", resume)
+    assigned = modules
+    modules = journal.remaining(modules)
+    if instrument:
+        INSTR.enable()
+    if memory:
+        start_memory_tracking()
 
     operatorSet = {":=": 0}
+    for entry in journal.done_entries():
+        for operator, count in entry.get("operators", {}).items():
+            operatorSet[operator] = operatorSet.get(operator, 0) + count
     #with open(output_dir + "/ast.jsonl", 'w', encoding='utf-8') as fd:
     #    for module in modules:
     #        lines = process_module(project, module, operatorSet)
@@ -448,11 +500,33 @@ def process_searches(working_dir: str, search_list: list[str]):
     for module_name in modules:
         module_str = ".".join(module_name)
         path = f"{output_dir}/{module_str}.jsonl"
-        with open(path, 'w', encoding='utf-8') as fd:
-            lines = process_module(project, module_name, operatorSet)
-            fd.write('\n'.join(lines) + '\n')
-
+        with INSTR.module(module_name), profiler.module(module_name):
+            moduleOperatorSet = {}
+            try:
+                lines = process_module(project, module_name, moduleOperatorSet)
+            except Exception as e:
+                print(f"xxxxx Fail to process module: {module_name}, {e}")
+                journal.record(module_name, FAILED, error=str(e))
+                continue
+            content = '\n'.join(lines) + '\n'
+            with INSTR.timer("write"):
+                write_atomic(path, content)
+            if INSTR.enabled:
+                INSTR.count("bytes_written", len(content.encode('utf-8')))
+        for operator, count in moduleOperatorSet.items():
+            operatorSet[operator] = operatorSet.get(operator, 0) + count
+        journal.record(module_name, theorems=len(lines), operators=moduleOperatorSet)
+
+    journal.close()
+    if shard is not None:
+        write_manifest(output_dir, shard, assigned, journal, shard_costs)
+    profiler.finish()
     print(f"Theorem Operator Set: {operatorSet}")
+    print_name_stats()
+    if memory:
+        stop_memory_tracking(f"{output_dir}/memory{suffix}.json")
+    if instrument:
+        INSTR.write_report(f"{output_dir}/instrument{suffix}.json")
 
 if __name__ == "__main__":
     search_list = [
@@ -479,5 +553,17 @@ if __name__ == "__main__":
         #"Mathlib.RingTheory.TensorProduct.Basic"
     ]
 
-    process_searches("/home/linfe/math/lean_test", search_list)
+    parser = ArgumentParser()
+    parser.add_argument("--working-dir", default="/home/linfe/math/lean_test")
+    parser.add_argument("--instrument", action="store_true")
+    parser.add_argument("--memory", action="store_true", help="per-module memory accounting with tracemalloc")
+    parser.add_argument("--resume", action="store_true", help="continue the previous run from its journal")
+    add_profile_arguments(parser)
+    add_shard_arguments(parser)
+    args = parser.parse_args()
+    shard_costs = None if args.shard_costs is None else load_costs(args.shard_costs)
+    profiler = make_profiler(args.profile, args.working_dir + "/.jixiaw/profile", args.profile_top, args.profile_interval)
+
+    process_searches(args.working_dir, search_list, instrument=args.instrument, profiler=profiler, memory=args.memory,
+                     resume=args.resume, shard=args.shard, shard_costs=shard_costs)
 
@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional
+
+from jixia.run import shard_modules
+
+from .journal import OK
+
+# =============================
+# Sharding
+# =============================
+# --shard i/N（i 從 0 開始）只處理第 i 份模組。預設用模組名稱的穩定 hash 分，
+# --shard-costs 給上一次的 instrument.json 時，依每個模組花的時間平均分給 N 份（每份拿到同一份清單才會一致）。
+# 每個 shard 結束時在輸出目錄寫 manifest.shard-i-of-N.json（分到哪些模組、完成/失敗的模組、journal 檔名），
+# journal 也各自分開，同一台機器上幾個 shard 寫同一個目錄也不會互相覆蓋。
+# 合併：python -m jixia_api.shard OUTPUT_DIR SHARD_DIR...
+
+MANIFEST = "manifest.json"
+"""Manifest of a merged dataset"""
+
+MODULE_SUFFIXES = (".jsonl", ".module.json", ".symbol.json", ".decl.json", ".elab.json")
+"""Per-module output files: <module>.jsonl of proof.py, <module>.<obj_type>.json of copy_module.py"""
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """"i/N" -> (i, N), 0 <= i < N"""
+    try:
+        index, count = (int(v) for v in text.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, got {text!r}")
+    if not 0 <= index < count:
+        raise ValueError(f"shard {index} out of range for {count} shards")
+    return index, count
+
+
+def shard_suffix(shard: Optional[tuple[int, int]]) -> str:
+    return "" if shard is None else f".shard-{shard[0]}-of-{shard[1]}"
+
+
+def load_costs(report_path) -> dict[str, float]:
+    """Seconds per module from an instrument.json (see instrument.py)"""
+    with open(report_path, 'r', encoding='utf-8') as fd:
+        report = json.load(fd)
+    return {entry["module"]: entry["elapsed"] for entry in report["modules"] if entry["module"] != "-"}
+
+
+def select_shard(modules: list, shard: Optional[tuple[int, int]], costs: Optional[dict[str, float]] = None) -> list:
+    if shard is None:
+        return modules
+    # collect_match_modules 的順序來自 rglob，先排序，每個 shard 看到的清單才一樣
+    selected = shard_modules(sorted(modules), shard[0], shard[1], costs)
+    print(f"Shard {shard[0]}/{shard[1]}: {len(selected)} of {len(modules)} modules")
+    return selected
+
+
+def write_manifest(output_dir, shard: tuple[int, int], modules: list, journal, costs: Optional[dict] = None):
+    ids = [m if isinstance(m, str) else ".".join(m) for m in modules]
+    entries = journal.entries
+    manifest = {
+        "shard": shard[0],
+        "shards": shard[1],
+        "strategy": "hash" if costs is None else "cost",
+        "journal": os.path.basename(journal.path),
+        "modules": ids,
+        "done": [m for m in ids if m in entries and entries[m]["status"] == OK],
+        "failed": [m for m in ids if m in entries and entries[m]["status"] != OK],
+    }
+    path = Path(output_dir) / f"manifest{shard_suffix(shard)}.json"
+    with open(path, 'w', encoding='utf-8') as fd:
+        json.dump(manifest, fd, ensure_ascii=False, indent=2)
+    return path
+
+
+def module_of_file(filename: str) -> Optional[str]:
+    """Module a per-module output file belongs to, None for other files"""
+    for suffix in MODULE_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return None
+
+
+def merge_shards(output_dir, shard_dirs: list) -> dict:
+    """
+    Combine the outputs of all shards into output_dir (which may be one of the shard directories):
+    the per-module files of the finished modules, their journal entries into output_dir/.journal,
+    and a manifest.json over all shards.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifests = []
+    for shard_dir in dict.fromkeys(Path(d).resolve() for d in shard_dirs):
+        for path in sorted(shard_dir.glob("manifest.shard-*.json")):
+            with open(path, 'r', encoding='utf-8') as fd:
+                manifests.append((shard_dir, json.load(fd)))
+    if not manifests:
+        raise FileNotFoundError(f"no shard manifest in {shard_dirs}")
+
+    counts = {manifest["shards"] for _, manifest in manifests}
+    if len(counts) != 1:
+        raise ValueError(f"manifests of different shard counts: {sorted(counts)}")
+    count = counts.pop()
+    seen = {}
+    for _, manifest in manifests:
+        if manifest["shard"] in seen:
+            raise ValueError(f"shard {manifest['shard']} found twice")
+        seen[manifest["shard"]] = manifest
+    missing_shards = [k for k in range(count) if k not in seen]
+
+    owners = {}
+    for _, manifest in manifests:
+        for module_id in manifest["modules"]:
+            if module_id in owners:
+                raise ValueError(f"module {module_id} in shard {owners[module_id]} and shard {manifest['shard']}")
+            owners[module_id] = manifest["shard"]
+
+    journal_lines = []
+    copied = 0
+    for shard_dir, manifest in manifests:
+        done = set(manifest["done"])
+        for path in sorted(shard_dir.iterdir()):
+            # 只複製這個 shard 完成的模組；失敗、沒跑完或屬於別的 shard 的模組留下的舊檔不要
+            if not path.is_file() or module_of_file(path.name) not in done:
+                continue
+            target = output_dir / path.name
+            if target.resolve() != path:
+                shutil.copy2(path, target)
+            copied += 1
+        journal_path = shard_dir / manifest["journal"]
+        if journal_path.is_file():
+            with open(journal_path, 'r', encoding='utf-8') as fd:
+                for line in fd:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry["module"] in done:
+                        journal_lines.append(line if line.endswith("\n") else line + "\n")
+
+    with open(output_dir / ".journal", 'w', encoding='utf-8') as fd:
+        fd.writelines(journal_lines)
+
+    modules = sorted(owners)
+    done = sorted(m for _, manifest in manifests for m in manifest["done"])
+    failed = sorted(m for _, manifest in manifests for m in manifest["failed"])
+    merged = {
+        "shards": count,
+        "missing_shards": missing_shards,
+        "modules": modules,
+        "done": done,
+        "failed": failed,
+        "unfinished": sorted(set(modules) - set(done) - set(failed)),
+    }
+    with open(output_dir / MANIFEST, 'w', encoding='utf-8') as fd:
+        json.dump(merged, fd, ensure_ascii=False, indent=2)
+    print(f"Merged {len(manifests)}/{count} shards into {output_dir}: {len(done)} done, {len(failed)} failed, "
+          f"{len(merged['unfinished'])} unfinished, {copied} files")
+    if missing_shards:
+        print(f"xxxxx missing shards: {missing_shards}")
+    return merged
+
+
+def add_shard_arguments(parser):
+    parser.add_argument("--shard", type=parse_shard, help="i/N: only process the i-th of N shards (i from 0)")
+    parser.add_argument("--shard-costs", help="instrument.json of an earlier run, to balance the shards by time")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("output_dir")
+    parser.add_argument("shard_dirs", nargs="+")
+    args = parser.parse_args()
+
+    merge_shards(args.output_dir, args.shard_dirs)
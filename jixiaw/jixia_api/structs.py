@@ -342,3 +342,44 @@ class LeanSyntaxTree(msgspec.Struct):
     value: Optional[str] = None
     range: Optional[LeanStringRange] = None
     info: Optional[LeanSyntaxTreeInfo] = None
+
+
+# Lean4dojo traces (ast.json / ast.jsonl written by Lean4dojo/ExtractData.lean)
+class LeanDojoPosition(msgspec.Struct):
+    line: int
+    column: int
+
+
+class LeanDojoTacticTrace(msgspec.Struct, rename="camel"):
+    state_before: str
+    state_after: str
+    pos: int
+    """Start byte offset of the tactic"""
+    end_pos: int
+
+
+class LeanDojoPremiseDef(msgspec.Struct, rename="camel"):
+    full_name: str
+    mod_name: str
+    def_path: str
+    def_pos: Optional[LeanDojoPosition] = None
+    def_end_pos: Optional[LeanDojoPosition] = None
+
+
+class LeanDojoPremiseTrace(msgspec.Struct, rename="camel"):
+    def_idx: int
+    """Index into `premise_defs`"""
+    pos: Optional[LeanDojoPosition] = None
+    end_pos: Optional[LeanDojoPosition] = None
+
+
+class LeanDojoTrace(msgspec.Struct):
+    """
+    Trace of one Lean file, components left out by `--components` stay empty.
+    Command ASTs are kept as raw JSON since they are rarely needed.
+    """
+
+    command_asts: list[msgspec.Raw] = msgspec.field(default_factory=list, name="commandASTs")
+    tactics: list[LeanDojoTacticTrace] = msgspec.field(default_factory=list)
+    premise_defs: list[LeanDojoPremiseDef] = msgspec.field(default_factory=list, name="premiseDefs")
+    premises: list[LeanDojoPremiseTrace] = msgspec.field(default_factory=list)
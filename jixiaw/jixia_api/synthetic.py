@@ -0,0 +1,521 @@
+import json
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import msgspec
+
+from .structs import LeanModuleInfo, LeanDeclaration, LeanSymbol, LeanInfoTree, LeanLineModel, LeanSyntaxTree
+
+# =============================
+# Synthetic jixia outputs
+# =============================
+# 產生假的 jixia 輸出（.lean 原始碼 + .mod/.decl/.sym/.elab/.ast/.line.json），
+# 讓沒有 Lean toolchain 的機器也能跑整條 pipeline，甚至到 Mathlib 的規模。
+# 欄位名稱用 jixia_api/structs.py 中 msgspec struct 的 snake_case 名稱，
+# jixia 的 pydantic model (populate_by_name=True) 也接受這些名稱。
+# python -m jixia_api.synthetic /tmp/synthetic --modules 1000 --theorems 80 --max-workers 8 --validate
+
+TACTIC_TEXTS = [
+    "intro x",
+    "rw [Nat.add_comm]",
+    "simp only [Nat.add_assoc, Nat.mul_comm]",
+    "apply Nat.succ_le_succ",
+    "exact Nat.le_refl _",
+    "omega",
+]
+
+TACTIC_REFERENCES = [
+    [],
+    [["Nat", "add_comm"]],
+    [["Nat", "add_assoc"], ["Nat", "mul_comm"]],
+    [["Nat", "succ_le_succ"]],
+    [["Nat", "le_refl"]],
+    [],
+]
+
+
+@dataclass
+class SyntheticConfig:
+    theorems: int = 100
+    """number of theorems in the module"""
+    tactics: int = 8
+    """tactics per tactic proof"""
+    depth: int = 4
+    """nested term nodes below every tactic node in the InfoTree"""
+    hypotheses: int = 3
+    """variables in every goal context"""
+    target_width: int = 40
+    """approximate length of every goal target"""
+    term_ratio: float = 0.2
+    """fraction of theorems proved by a term instead of `by`"""
+    goals: int = 1
+    """goals in every proof state before the last tactic"""
+    theorem_jitter: float = 0.0
+    """theorem count of each module varies by up to this fraction"""
+    seed: int = 0
+
+
+class _Source:
+    """Lean source being built, tracking byte offsets and line starts"""
+
+    def __init__(self):
+        self.parts = []
+        self.pos = 0
+        self.line_starts = [0]
+
+    def add(self, text: str) -> tuple[int, int]:
+        start = self.pos
+        for ch in text:
+            self.pos += len(ch.encode('utf-8'))
+            if ch == "\n":
+                self.line_starts.append(self.pos)
+        self.parts.append(text)
+        return start, self.pos
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _variable(index: int, name: str, uniq: int):
+    return {
+        "id": ["_uniq", uniq + index],
+        "name": [name],
+        "binder_info": "default",
+        "type": "ℕ",
+        "value": None,
+        "is_prop": False,
+    }
+
+
+def _goal(hyp_names: list[str], target: str, uniq: int):
+    context = [_variable(i, name, uniq) for i, name in enumerate(hyp_names)]
+    pp = " ".join(hyp_names) + " : ℕ\n⊢ " + target
+    return {
+        "tag": [],
+        "context": context,
+        "type": target,
+        "is_prop": True,
+        "pp": pp,
+    }
+
+
+def _state(hyp_names: list[str], width: int, step: int, goals: int, uniq: int):
+    state = []
+    for g in range(goals):
+        goal = _goal(hyp_names, _target(hyp_names, width, step + g), uniq)
+        if goals > 1:
+            goal["tag"] = [f"h_{g}"]
+            goal["pp"] = f"case h_{g}\n" + goal["pp"]
+        state.append(goal)
+    return state
+
+
+def _target(hyp_names: list[str], width: int, step: int):
+    terms = []
+    length = 0
+    i = step
+    while length < width or len(terms) < 2:
+        term = hyp_names[i % len(hyp_names)]
+        terms.append(term)
+        length += len(term) + 3
+        i += 1
+    return " + ".join(terms) + " = " + " + ".join(reversed(terms))
+
+
+def _ref(start: int, stop: int, pp: str, kind: list[str]):
+    return {"original": True, "range": [start, stop], "pp": pp, "kind": kind}
+
+
+def _term_node(start: int, stop: int, pp: str, kind: list[str], value: str, type: str, expected_type, children=None):
+    return {
+        "info": {"term": {"context": [], "type": type, "expected_type": expected_type, "value": value, "special": None}},
+        "ref": _ref(start, stop, pp, kind),
+        "children": children or [],
+    }
+
+
+def _tactic_node(start: int, stop: int, pp: str, kind: list[str], references, before, after, children=None):
+    return {
+        "info": {"tactic": {"references": references, "before": before, "after": after}},
+        "ref": _ref(start, stop, pp, kind),
+        "children": children or [],
+    }
+
+
+def _term_chain(start: int, stop: int, pp: str, depth: int):
+    # 每個 tactic 下方巢狀 depth 層 term 節點，模擬 Mathlib 中很深的 InfoTree
+    node = None
+    for level in range(depth):
+        children = [node] if node is not None else []
+        node = _term_node(start, stop, pp, ["Lean", "Parser", "Term", "app"], pp, "Prop", "Prop", children)
+    return [node] if node is not None else []
+
+
+# ast.json 的節點沿用 jixia 的 {"node"|"atom"|"ident": ...} 格式（jixia_ast_extract 讀這個），
+# 外層再加上 LeanSyntaxTree 需要的 kind 字串
+def _atom(val: str, start: int, stop: int):
+    original = {"pos": start, "endPos": stop, "leading": "", "trailing": ""}
+    return {"kind": "atom", "atom": {"info": {"original": original}, "val": val}}
+
+
+def _ident(name: str, start: int, stop: int):
+    original = {"pos": start, "endPos": stop, "leading": "", "trailing": ""}
+    return {"kind": "ident", "ident": {"info": {"original": original}, "preresolved": [], "rawVal": name, "val": name.split(".")}}
+
+
+def _node(kind: list[str], args: list):
+    return {"kind": "node", "node": {"args": args, "info": "none", "kind": kind}}
+
+
+def generate_module(config: SyntheticConfig, namespace: str = "Synthetic0", imports=None):
+    """
+    Build one synthetic module.
+
+    :return: (lean source, dict of plugin short name -> JSON-compatible object)
+    """
+    rnd = random.Random(config.seed)
+    src = _Source()
+    ns_atom = src.add("namespace")
+    src.add(" ")
+    ns_ident = src.add(namespace)
+    src.add("\n\n")
+
+    decls = []
+    symbols = []
+    trees = []
+    line_states = {}
+    commands = [_node(["Lean", "Parser", "Command", "namespace"], [_atom("namespace", *ns_atom), _ident(namespace, *ns_ident)])]
+    uniq = 1
+    hyp_names = [f"h{k}" for k in range(max(config.hypotheses, 1))]
+
+    for i in range(config.theorems):
+        short_name = f"thm_{i}"
+        full_name = f"{namespace}.{short_name}"
+        target = _target(hyp_names, config.target_width, i)
+        type_full = "∀ (" + " ".join(hyp_names) + " : ℕ), " + target
+        by_proof = rnd.random() >= config.term_ratio
+
+        decl_start, theorem_stop = src.add("theorem")
+        src.add(" ")
+        name_range = src.add(short_name)
+        sig_start, _ = src.add(" ")
+        binder_start, _ = src.add("(")
+        param_ranges = []
+        for k, name in enumerate(hyp_names):
+            param_ranges.append(src.add(name))
+            if k + 1 < len(hyp_names):
+                src.add(" ")
+        src.add(" : ")
+        nat_range = src.add("Nat")
+        _, binder_stop = src.add(")")
+        src.add(" : ")
+        type_range = src.add(target)
+        sig_stop = src.pos
+        value_start, _ = src.add(" ")
+        assign_range = src.add(":=")
+        src.add(" ")
+
+        node_children = [
+            _term_node(name_range[0], name_range[1], short_name, ["ident"], full_name, type_full, None),
+            _term_node(nat_range[0], nat_range[1], "Nat", ["ident"], "ℕ", "Type", "Type"),
+        ]
+
+        if by_proof:
+            by_start, by_stop = src.add("by")
+            tactic_atoms = []
+            tactic_texts = []
+            tactic_nodes = []
+            seq_start = None
+            for k in range(config.tactics):
+                src.add("\n  ")
+                choice = (i + k) % len(TACTIC_TEXTS)
+                text = TACTIC_TEXTS[choice]
+                t_start, t_stop = src.add(text)
+                if seq_start is None:
+                    seq_start = t_start
+                tactic_texts.append(text)
+                tactic_atoms.append(_atom(text, t_start, t_stop))
+                before = _state(hyp_names, config.target_width, i + k, config.goals, uniq)
+                after = _state(hyp_names, config.target_width, i + k + 1, config.goals, uniq) if k + 1 < config.tactics else []
+                line_states[src.line_starts[-1]] = before
+                tactic_nodes.append(_tactic_node(
+                    t_start, t_stop, text, ["Lean", "Parser", "Tactic", "tactic"],
+                    TACTIC_REFERENCES[choice], before, after,
+                    _term_chain(t_start, t_stop, text, config.depth),
+                ))
+            value_stop = src.pos
+            seq_pp = "\n  ".join(tactic_texts)
+            # by 節點的狀態和第一個 tactic 之前的狀態一樣，多個 goal 時也是
+            first_goal = _state(hyp_names, config.target_width, i, config.goals, uniq)
+            seq_start = seq_start if seq_start is not None else value_stop
+            seq1 = _tactic_node(seq_start, value_stop, seq_pp, ["Lean", "Parser", "Tactic", "tacticSeq1Indented"], [], first_goal, [], tactic_nodes)
+            seq = _tactic_node(seq_start, value_stop, seq_pp, ["Lean", "Parser", "Tactic", "tacticSeq"], [], first_goal, [], [seq1])
+            by_pp = "by\n  " + seq_pp
+            by_node = _tactic_node(by_start, value_stop, by_pp, ["Lean", "Parser", "Term", "byTactic"], [], first_goal, [], [seq])
+            node_children.append(_term_node(by_start, value_stop, by_pp, ["Lean", "Parser", "Term", "byTactic"], by_pp, target, target, [by_node]))
+            value_pp = " := " + by_pp
+            value_ast = _node(["Lean", "Parser", "Term", "byTactic"], [
+                _atom("by", by_start, by_stop),
+                _node(["Lean", "Parser", "Tactic", "tacticSeq"], tactic_atoms),
+            ])
+        else:
+            term_text = f"Nat.add_comm {hyp_names[0]} {hyp_names[-1]}"
+            t_start, value_stop = src.add(term_text)
+            node_children.append(_term_node(t_start, value_stop, term_text, ["Lean", "Parser", "Term", "app"], term_text, target, target,
+                                            _term_chain(t_start, value_stop, term_text, config.depth)))
+            value_pp = " := " + term_text
+            value_ast = _node(["Lean", "Parser", "Term", "app"], [_atom(term_text, t_start, value_stop)])
+        decl_stop = src.pos
+        src.add("\n\n")
+        uniq += len(hyp_names) + 1
+
+        decls.append({
+            "kind": "theorem",
+            "ref": {"original": True, "range": [decl_start, decl_stop], "pp": None},
+            "name": [namespace, short_name],
+            "signature": {"original": True, "range": [sig_start, sig_stop], "pp": None},
+            "modifiers": {
+                "visibility": "regular",
+                "is_noncomputable": False,
+                "compute_kind": "regular",
+                "rec_kind": "default",
+                "is_unsafe": False,
+                "docstring": None,
+            },
+            "params": [
+                {"ref": [binder_start, binder_stop], "id": list(r), "type": list(nat_range), "binder_info": "default"}
+                for r in param_ranges
+            ],
+            "type": {"original": True, "range": list(type_range), "pp": target},
+            "value": {"original": True, "range": [value_start, decl_stop], "pp": value_pp},
+            "scope_info": {
+                "var_decls": [],
+                "include_vars": [],
+                "omit_vars": [],
+                "curr_namespace": [namespace],
+                "open_decl": [],
+            },
+        })
+        symbols.append({
+            "kind": "theorem",
+            "name": [namespace, short_name],
+            "type_full": type_full,
+            "type_readable": type_full,
+            "type_fallback": type_full,
+            "type_references": [["Nat"], ["Eq"], ["HAdd", "hAdd"]],
+            "value_references": [["Nat", "add_comm"], ["Eq", "mpr"]],
+            "is_prop": True,
+        })
+        trees.append({
+            "info": {"simple": "command"},
+            "ref": _ref(decl_start, decl_stop, None, ["Lean", "Parser", "Command", "declaration"]),
+            "children": node_children,
+        })
+        commands.append(_node(["Lean", "Parser", "Command", "declaration"], [
+            _node(["Lean", "Parser", "Command", "declModifiers"], []),
+            _node(["Lean", "Parser", "Command", "theorem"], [
+                _atom("theorem", decl_start, theorem_stop),
+                _node(["Lean", "Parser", "Command", "declId"], [_ident(short_name, *name_range)]),
+                _node(["Lean", "Parser", "Command", "declSig"],
+                      [_ident(name, *r) for name, r in zip(hyp_names, param_ranges)] + [_atom(target, *type_range)]),
+                _node(["Lean", "Parser", "Command", "declValSimple"], [_atom(":=", *assign_range), value_ast]),
+            ]),
+        ]))
+
+    end_atom = src.add("end")
+    src.add(" ")
+    end_ident = src.add(namespace)
+    src.add("\n")
+    commands.append(_node(["Lean", "Parser", "Command", "end"], [_atom("end", *end_atom), _ident(namespace, *end_ident)]))
+
+    # ref/signature 的 pp 用實際原始碼切片，和 jixia 一樣是原文
+    source = src.text()
+    source_bytes = source.encode('utf-8')
+    for decl in decls:
+        for key in ("ref", "signature"):
+            start, stop = decl[key]["range"]
+            decl[key]["pp"] = source_bytes[start:stop].decode('utf-8')
+
+    outputs = {
+        "mod": {"imports": imports if imports is not None else [["Init"]], "docstring": []},
+        "decl": decls,
+        "sym": symbols,
+        "elab": trees,
+        "ast": commands,
+        "line": [{"start": start, "state": line_states.get(start, [])} for start in src.line_starts],
+    }
+    return source, outputs
+
+
+def write_module(root, module_name: list[str], source: str, outputs: dict, output_dir: str = ".jixia"):
+    """Write a synthetic module the way `LeanProject` expects to find it"""
+    root = Path(root)
+    lean_path = root.joinpath(*module_name).with_suffix(".lean")
+    lean_path.parent.mkdir(parents=True, exist_ok=True)
+    lean_path.write_text(source, encoding='utf-8')
+
+    jixia_dir = root / output_dir
+    jixia_dir.mkdir(parents=True, exist_ok=True)
+    module_id = ".".join(module_name)
+    paths = {}
+    for p, obj in outputs.items():
+        path = jixia_dir / f"{module_id}.{p}.json"
+        with open(path, 'w', encoding='utf-8') as fd:
+            json.dump(obj, fd, ensure_ascii=False, separators=(",", ":"))
+        paths[p] = path
+    return paths
+
+
+def dojo_trace(outputs: dict):
+    """
+    The ast.json Lean4dojo's ExtractData would write for the module, with tactics only:
+    every tactic directly in a tacticSeq1Indented whose proof state changes.
+    """
+    def pp(state):
+        return "\n\n".join(goal["pp"] for goal in state) if state else "no goals"
+
+    tactics = []
+
+    def visit(node, parent_kind):
+        tactic = node["info"].get("tactic")
+        if tactic is not None and parent_kind == ["Lean", "Parser", "Tactic", "tacticSeq1Indented"]:
+            before, after = pp(tactic["before"]), pp(tactic["after"])
+            if before != "no goals" and before != after:
+                start, stop = node["ref"]["range"]
+                tactics.append({"stateBefore": before, "stateAfter": after, "pos": start, "endPos": stop})
+        kind = node["ref"]["kind"] if tactic is not None else parent_kind
+        for child in node.get("children", []):
+            visit(child, kind)
+
+    for tree in outputs["elab"]:
+        visit(tree, None)
+    return {"commandASTs": [], "tactics": tactics, "premiseDefs": [], "premises": []}
+
+
+def write_dojo_trace(root, module_name: list[str], trace: dict):
+    """Write the trace where ExtractData would, `.lake/build/ir/<module path>.ast.json`"""
+    path = Path(root).joinpath(".lake", "build", "ir", *module_name).with_suffix(".ast.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fd:
+        json.dump(trace, fd, ensure_ascii=False, separators=(",", ":"))
+    return path
+
+
+def generate_project(root, config: SyntheticConfig, module_name: list[str] = ("LeanBench", "Synthetic0"), dojo: bool = False):
+    """Generate a single-module project under root, returning the module name"""
+    module_name = list(module_name)
+    os.makedirs(root, exist_ok=True)
+    source, outputs = generate_module(config, namespace=module_name[-1])
+    write_module(root, module_name, source, outputs)
+    if dojo:
+        write_dojo_trace(root, module_name, dojo_trace(outputs))
+    return module_name
+
+
+# 每個 plugin 輸出對應的 msgspec struct
+PLUGIN_STRUCTS = {
+    "mod": LeanModuleInfo,
+    "decl": list[LeanDeclaration],
+    "sym": list[LeanSymbol],
+    "elab": list[LeanInfoTree],
+    "ast": list[LeanSyntaxTree],
+    "line": list[LeanLineModel],
+}
+
+
+def validate_outputs(outputs: dict):
+    """Raise msgspec.ValidationError if an output does not conform to jixia_api.structs"""
+    for p, obj in outputs.items():
+        msgspec.convert(obj, PLUGIN_STRUCTS[p])
+
+
+def module_config(config: SyntheticConfig, index: int) -> SyntheticConfig:
+    rnd = random.Random(config.seed * 1000003 + index)
+    theorems = config.theorems
+    if config.theorem_jitter > 0:
+        spread = int(theorems * config.theorem_jitter)
+        theorems = max(0, theorems + rnd.randint(-spread, spread))
+    return replace(config, theorems=theorems, seed=config.seed * 1000003 + index)
+
+
+def _generate_one(root, package: str, index: int, config: SyntheticConfig, imports_per_module: int, validate: bool):
+    module_name = [package, f"Synthetic{index}"]
+    # 只 import 編號較小的模組，和真實專案一樣不會有循環
+    imports = [["Init"]] + [[package, f"Synthetic{k}"] for k in range(max(0, index - imports_per_module), index)]
+    source, outputs = generate_module(module_config(config, index), namespace=module_name[-1], imports=imports)
+    if validate:
+        validate_outputs(outputs)
+    paths = write_module(root, module_name, source, outputs)
+    return module_name, sum(os.path.getsize(path) for path in paths.values())
+
+
+def generate_dataset(
+    root,
+    modules: int,
+    config: SyntheticConfig,
+    package: str = "LeanBench",
+    imports_per_module: int = 3,
+    validate: bool = False,
+    max_workers: int | None = None,
+):
+    """
+    Generate `modules` synthetic modules under root/package and their outputs under root/.jixia.
+
+    :return: (list of module names, total bytes of JSON written)
+    """
+    os.makedirs(root, exist_ok=True)
+    args = [(root, package, i, config, imports_per_module, validate) for i in range(modules)]
+    if max_workers == 1:
+        results = [_generate_one(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_generate_one, *zip(*args))) if args else []
+    module_names = [m for m, _ in results]
+    total_bytes = sum(size for _, size in results)
+    return module_names, total_bytes
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("root", help="project root to generate into; outputs go to root/.jixia")
+    parser.add_argument("--modules", type=int, default=10)
+    parser.add_argument("--package", default="LeanBench")
+    parser.add_argument("--theorems", type=int, default=100)
+    parser.add_argument("--theorem-jitter", type=float, default=0.5)
+    parser.add_argument("--tactics", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--hypotheses", type=int, default=3)
+    parser.add_argument("--target-width", type=int, default=40)
+    parser.add_argument("--goals", type=int, default=1)
+    parser.add_argument("--term-ratio", type=float, default=0.2)
+    parser.add_argument("--imports", type=int, default=3, help="imports of earlier synthetic modules per module")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--validate", action="store_true", help="check every output against jixia_api.structs")
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(1000000)
+    config = SyntheticConfig(
+        theorems=args.theorems,
+        tactics=args.tactics,
+        depth=args.depth,
+        hypotheses=args.hypotheses,
+        target_width=args.target_width,
+        term_ratio=args.term_ratio,
+        goals=args.goals,
+        theorem_jitter=args.theorem_jitter,
+        seed=args.seed,
+    )
+    module_names, total_bytes = generate_dataset(
+        args.root, args.modules, config, args.package, args.imports, args.validate, args.max_workers
+    )
+    print(f"generated {len(module_names)} modules, {total_bytes / 1e6:.1f} MB of JSON under {Path(args.root) / '.jixia'}")
+
+
+if __name__ == "__main__":
+    main()
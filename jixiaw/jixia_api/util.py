@@ -39,3 +39,10 @@ def collect_match_modules(project, search, exclude_list):
             continue
         module_names.append(module_name)
     return module_names
+
+def write_atomic(path, content: str):
+    """Write content to a temp file next to path, then rename it over path"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as fd:
+        fd.write(content)
+    os.replace(tmp, path)
@@ -2,8 +2,13 @@ import json
 import os
 import sys
 import re
+from argparse import ArgumentParser
 from pathlib import Path
 
+from jixia_api.digest import write_digest_line
+from jixia_api.profiler import make_profiler, add_profile_arguments
+from jixia_api.shard import select_shard, shard_suffix, load_costs, add_shard_arguments
+
 # 提升遞迴限制
 sys.setrecursionlimit(1000000)
 
@@ -77,7 +82,11 @@ def find_correct_lean_source(toolchain_root, project_root, ast_filename):
         if os.path.exists(rel_path): return rel_path
     return None
 
-def process_ast(fd, ast_name, project_root, toolchain_root):
+def module_of_ast_file(ast_name):
+    """Mathlib.Foo.ast.json -> Mathlib.Foo (any <module>.<plugin>.json)"""
+    return ast_name.removesuffix(".json").rsplit(".", 1)[0]
+
+def process_ast(fd, ast_name, project_root, toolchain_root, digest_fd=None):
     ast_path = os.path.join(project_root, ".jixia", ast_name)
     module_name = Path(ast_name).with_suffix("").with_suffix("").as_posix()
 
@@ -93,12 +102,14 @@ def process_ast(fd, ast_name, project_root, toolchain_root):
 
     results = []
     seen_ranges = set()
+    # digest 需要每筆紀錄在輸出檔中的位移；只在這裡 tell 一次，之後自己累加
+    offset = fd.tell() if digest_fd is not None else -1
     
     # 核心修復：使用全局狀態追蹤 Namespace
     global_ns_stack = []
 
     def scan(obj):
-        nonlocal global_ns_stack
+        nonlocal global_ns_stack, offset
         if isinstance(obj, list):
             for item in obj: scan(item)
             return
@@ -151,7 +162,11 @@ def process_ast(fd, ast_name, project_root, toolchain_root):
                                     "full_name": full_name, # 使用修正後的名稱 
                                     "tactic_proof": proof
                                 }
-                                fd.write(json.dumps(data, ensure_ascii=False) + '\n')
+                                line = json.dumps(data, ensure_ascii=False) + '\n'
+                                fd.write(line)
+                                if digest_fd is not None:
+                                    write_digest_line(digest_fd, module_name, full_name, proof, offset)
+                                    offset += len(line.encode('utf-8'))
 
             # 遞迴子節點 (不主動彈出 NS)
             for k, v in inner.items():
@@ -165,14 +180,33 @@ TOOLCHAIN_ROOT = "/home/linfe/.elan/toolchains/leanprover--lean4---v4.24.0"
 PROJECT_ROOT = "/home/linfe/math/jixiaw/lean_test"
 
 if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--digest", action="store_true", help="also write ast.digest.tsv for comparison.compare_digests")
+    add_profile_arguments(parser)
+    add_shard_arguments(parser)
+    args = parser.parse_args()
+    profiler = make_profiler(args.profile, PROJECT_ROOT + "/profile", args.profile_top, args.profile_interval)
+    shard_costs = None if args.shard_costs is None else load_costs(args.shard_costs)
+    # 每個 shard 寫自己的 ast.shard-i-of-N.jsonl；digest 的 offset 是對各自的檔案
+    suffix = shard_suffix(args.shard)
+
     #AST_NAME = "Mathlib.Algebra.Homology.Refinements.ast.json"
     #extract_proof_from_ast(AST_NAME, PROJECT_ROOT, TOOLCHAIN_ROOT)
     jixia_path = Path(PROJECT_ROOT) / Path(".jixia")
-    with open(PROJECT_ROOT + "/ast.jsonl", 'w', encoding='utf-8') as fd:
-        for path in jixia_path.glob("Mathlib.NumberTheory.NumberField.*.json"):
-        #for path in jixia_path.glob("*.ast.json"):
-            ast_name = path.name
-            process_ast(fd, ast_name, PROJECT_ROOT, TOOLCHAIN_ROOT)
+    digest_fd = open(PROJECT_ROOT + f"/ast{suffix}.digest.tsv", 'w', encoding='utf-8') if args.digest else None
+    with open(PROJECT_ROOT + f"/ast{suffix}.jsonl", 'w', encoding='utf-8') as fd:
+        ast_names = [path.name for path in jixia_path.glob("Mathlib.NumberTheory.NumberField.*.json")]
+        #ast_names = [path.name for path in jixia_path.glob("*.ast.json")]
+        # shard 依模組名稱分（和 jixia.run.shard_key、--shard-costs 的 key 一致），同一模組的檔案分在一起
+        selected = set(select_shard(list(dict.fromkeys(map(module_of_ast_file, ast_names))), args.shard, shard_costs))
+        for ast_name in ast_names:
+            if module_of_ast_file(ast_name) not in selected:
+                continue
+            with profiler.module(ast_name.removesuffix(".ast.json")):
+                process_ast(fd, ast_name, PROJECT_ROOT, TOOLCHAIN_ROOT, digest_fd)
+    profiler.finish()
+    if digest_fd is not None:
+        digest_fd.close()
 
 
 
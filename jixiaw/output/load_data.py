@@ -6,6 +6,7 @@ from argparse import ArgumentParser
 
 from jixia import LeanProject
 from jixia.structs_debug import parse_name
+from jixia_api.shard import add_shard_arguments, load_costs
 from sympy import python
 
 _LEAN4_TOOLCHAINS_DIR = Path(".elan/toolchains")
@@ -41,6 +42,9 @@ def main():
         "prefixes",
         help="Comma-separated list of module prefixes to be included in the index; e.g., Init,Mathlib",
     )
+    add_shard_arguments(jixia_parser)
+    jixia_parser.add_argument("--log-dir", default="logs",
+                              help="write the stderr of every module to <log-dir>/<module>.log, relative to .jixia (default: logs)")
 
     args = parser.parse_args()
 
@@ -49,6 +53,10 @@ def main():
 
     project = LeanProject(args.project_root)
     prefixes = [parse_name(p) for p in args.prefixes.split(",")]
+    shard = args.shard
+    if shard is not None:
+        print(f"shard: {shard[0]}/{shard[1]}")
+    shard_costs = None if args.shard_costs is None else load_costs(args.shard_costs)
 
     lean_sysroot = os.environ.get("LEAN_SYSROOT")
     if lean_sysroot is None:
@@ -61,6 +69,9 @@ def main():
             prefixes=prefixes,
             plugins=["module", "declaration", "symbol", "ast", "line"],
             force=True,
+            shard=shard,
+            shard_costs=shard_costs,
+            log_dir=args.log_dir,
         )
         #print(f"Results for {d} with plugins module, declaration, symbol, ast, line:")
         #print(results)
@@ -71,6 +82,10 @@ def main():
             prefixes=prefixes,
             plugins=["elaboration"],
             force=True,
+            shard=shard,
+            shard_costs=shard_costs,
+            # 不要蓋掉上一輪同一個模組的 log
+            log_dir=f"{args.log_dir}/elaboration",
         )
         #print(f"Results for {d} with elaboration:")
         #print(results)
@@ -1,12 +1,18 @@
+import asyncio
 import concurrent.futures
+import hashlib
+import heapq
 import logging
 import os
+import signal
 import subprocess
+import tempfile
+import time
 from concurrent.futures.thread import ThreadPoolExecutor
 from pathlib import Path
 from string import Template
 from subprocess import CompletedProcess
-from typing import Optional, Iterable, TypeVar
+from typing import AsyncIterator, Callable, Optional, Iterable, TypeVar
 
 from .structs_debug import (
     AnyPath,
@@ -19,12 +25,169 @@ from .structs_debug import (
     ModuleInfo,
     RootModel,
 )
+from .cache import load_cached
 
 logger = logging.getLogger(__name__)
 
 executable: AnyPath = "jixia"
 """path to jixia executable"""
 
+STDERR_TAIL = 64 * 1024
+"""bytes at the end of stderr kept in CompletedProcess.stderr, unless run_jixia is asked to capture_stderr"""
+
+KILL_GRACE = 5.0
+"""seconds between SIGTERM and SIGKILL when a run is over its limits"""
+
+
+def _group_pids(pgid: int) -> list[int]:
+    """The group leader and its descendants, through /proc/<pid>/task/<tid>/children (Linux only)"""
+    pids = []
+    stack = [pgid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        try:
+            tids = os.listdir(f"/proc/{pid}/task")
+        except OSError:
+            continue
+        for tid in tids:
+            try:
+                with open(f"/proc/{pid}/task/{tid}/children") as fp:
+                    stack.extend(int(child) for child in fp.read().split())
+            except OSError:
+                continue
+    return pids
+
+
+def _group_rss(pgid: int) -> int:
+    """
+    Resident memory of the process group led by pgid, in bytes (Linux only, 0 elsewhere).
+    Only the leader's descendants are read, not all of /proc; a process of the group whose parent already exited is missed.
+    """
+    page = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in _group_pids(pgid):
+        try:
+            with open(f"/proc/{pid}/stat") as fp:
+                stat = fp.read()
+        except OSError:
+            continue
+        # comm 可能有空白，從最後一個 ')' 之後開始數：[2] 是 pgrp，[21] 是 rss（page 數）
+        fields = stat[stat.rindex(")") + 2:].split()
+        if int(fields[2]) == pgid:
+            total += int(fields[21]) * page
+    return total
+
+
+class _Limits:
+    """
+    Limit and kill policy of one limited run, shared by :func:`_run_limited` and :func:`arun_jixia`;
+    the two only differ in how they wait on the process.
+    """
+
+    def __init__(self, timeout: Optional[float], memory_limit: Optional[int], poll_interval: float):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.poll_interval = poll_interval
+        self.start = time.monotonic()
+        self.reason: Optional[str] = None
+        """why the run was killed"""
+
+    def next_wait(self) -> Optional[float]:
+        """Seconds to wait on the process before the next check, None to wait until it exits"""
+        if self.memory_limit is not None:
+            return self.poll_interval
+        if self.timeout is not None:
+            return max(0.0, self.start + self.timeout - time.monotonic())
+        return None
+
+    def exceeded(self, pgid: int) -> bool:
+        """True (with reason set) when the process group is over one of the limits"""
+        if self.timeout is not None and time.monotonic() - self.start >= self.timeout:
+            self.reason = f"timeout after {self.timeout}s"
+        elif self.memory_limit is not None:
+            rss = _group_rss(pgid)
+            if rss > self.memory_limit:
+                self.reason = f"memory {rss >> 20} MB over limit {self.memory_limit >> 20} MB"
+        return self.reason is not None
+
+    def stderr(self, err) -> str:
+        """Last STDERR_TAIL bytes of err, after the kill reason is appended to it"""
+        if self.reason is not None:
+            err.write(f"\n[run_jixia] killed: {self.reason}\n".encode())
+        err.flush()
+        size = err.seek(0, os.SEEK_END)
+        err.seek(max(0, size - STDERR_TAIL))
+        return err.read().decode("utf-8", errors="replace")
+
+
+def _open_stderr(log_file: Optional[AnyPath]):
+    """Binary file stderr of a limited run goes to: log_file, or a temporary file"""
+    if log_file is None:
+        return tempfile.TemporaryFile()
+    log_file = Path(log_file)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    return log_file.open("w+b")
+
+
+def _kill_steps() -> tuple:
+    """(signal, seconds to wait for the group to exit after it); None waits until it exits"""
+    return (signal.SIGTERM, KILL_GRACE), (signal.SIGKILL, None)
+
+
+def _signal_group(pgid: int, sig: int) -> bool:
+    """False when the process group is already gone"""
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def _kill_group(proc: subprocess.Popen) -> int:
+    """SIGTERM the process group of proc, SIGKILL it if it is still there after KILL_GRACE"""
+    for sig, wait in _kill_steps():
+        if not _signal_group(proc.pid, sig):
+            break
+        try:
+            return proc.wait(timeout=wait)
+        except subprocess.TimeoutExpired:
+            continue
+    return proc.wait()
+
+
+def _run_limited(
+    args: list,
+    cwd: Optional[Path],
+    timeout: Optional[float],
+    memory_limit: Optional[int],
+    log_file: Optional[AnyPath],
+    poll_interval: float = 1.0,
+) -> CompletedProcess:
+    """
+    Run args in a new process group with stderr going to log_file (or a temporary file),
+    killing the whole group when it runs longer than timeout seconds or its RSS goes over memory_limit bytes.
+    """
+    limits = _Limits(timeout, memory_limit, poll_interval)
+    with _open_stderr(log_file) as err:
+        proc = subprocess.Popen(args, stderr=err, cwd=cwd, start_new_session=True)
+        try:
+            while True:
+                try:
+                    returncode = proc.wait(timeout=limits.next_wait())
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if limits.exceeded(proc.pid):
+                    returncode = _kill_group(proc)
+                    break
+        except BaseException:
+            # KeyboardInterrupt 或 cancel：不要留下孤兒行程
+            _kill_group(proc)
+            raise
+        stderr = limits.stderr(err)
+    return CompletedProcess(args, returncode, None, stderr)
+
 
 def run_jixia(
     file: AnyPath,
@@ -34,6 +197,10 @@ def run_jixia(
     output_template: Template = Template("$file_dir/$module.$p.json"),
     run_initializers: bool = True,
     force: bool = False,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    log_file: Optional[AnyPath] = None,
+    capture_stderr: bool = False,
 ) -> Optional[CompletedProcess]:
     """
     Run jixia with given options.
@@ -52,8 +219,26 @@ def run_jixia(
             - p: short name of the plugin
     :param run_initializers: run initializers in analysis.  set to True for mathlib
     :param force: always run jixia even if all output files are already present
+    :param timeout: kill jixia (with its whole process group) after this many seconds
+    :param memory_limit: kill jixia when the resident memory of its process group goes over this many bytes
+    :param log_file: write stderr to this file, defaults to a temporary file
+    :param capture_stderr: read the whole stderr through a pipe instead, with no limits and no log file
     :return: the completed process object, or None if jixia was not run (when force is False and all output files are already present)
+        unless capture_stderr is set, stderr is only the last STDERR_TAIL bytes,
+        and a killed run has a negative returncode and the reason at the end of stderr
     """
+    if capture_stderr and (timeout is not None or memory_limit is not None or log_file is not None):
+        raise ValueError("capture_stderr cannot be used with timeout, memory_limit or log_file")
+    args = _jixia_args(file, module, root, plugins, output_template, run_initializers, force)
+    if args is not None:
+        logger.debug(f"run: {args}")
+        if capture_stderr:
+            return subprocess.run(args, stderr=subprocess.PIPE, cwd=root, text=True)
+        return _run_limited(args, root, timeout, memory_limit, log_file)
+
+
+def _jixia_args(file, module, root, plugins, output_template, run_initializers, force) -> Optional[list]:
+    """Command line of run_jixia, None if jixia does not need to run"""
     file = Path(file)
     if module is None:
         module = file.stem
@@ -75,21 +260,109 @@ def run_jixia(
         args.append(output_file)
     if run:
         args.append(file)
-        logger.debug(f"run: {args}")
-        return subprocess.run(args, stderr=subprocess.PIPE, cwd=root, text=True)
+        return args
+    return None
+
+
+async def _akill_group(proc: asyncio.subprocess.Process) -> int:
+    """Async version of _kill_group"""
+    for sig, wait in _kill_steps():
+        if not _signal_group(proc.pid, sig):
+            break
+        try:
+            return await asyncio.wait_for(proc.wait(), wait)
+        except asyncio.TimeoutError:
+            continue
+    return await proc.wait()
+
+
+async def arun_jixia(
+    file: AnyPath,
+    module: Optional[str] = None,
+    root: Optional[Path] = None,
+    plugins: Iterable[Plugin] = ALL_PLUGINS,
+    output_template: Template = Template("$file_dir/$module.$p.json"),
+    run_initializers: bool = True,
+    force: bool = False,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    log_file: Optional[AnyPath] = None,
+    poll_interval: float = 1.0,
+) -> Optional[CompletedProcess]:
+    """
+    Async version of :func:`run_jixia`.  stderr always goes to log_file (or a temporary file),
+    and is cut to the last STDERR_TAIL bytes in the result.
+    Cancelling the task kills the process group of jixia.
+    """
+    args = _jixia_args(file, module, root, plugins, output_template, run_initializers, force)
+    if args is None:
+        return None
+    logger.debug(f"run: {args}")
+    limits = _Limits(timeout, memory_limit, poll_interval)
+    with _open_stderr(log_file) as err:
+        proc = await asyncio.create_subprocess_exec(*args, stderr=err, cwd=root, start_new_session=True)
+        try:
+            while True:
+                try:
+                    returncode = await asyncio.wait_for(proc.wait(), limits.next_wait())
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                if limits.exceeded(proc.pid):
+                    returncode = await _akill_group(proc)
+                    break
+        except BaseException:
+            await _akill_group(proc)
+            raise
+        stderr = limits.stderr(err)
+    return CompletedProcess(args, returncode, None, stderr)
+
+
+def shard_key(module_name) -> int:
+    """Stable hash of a module name, the same in every process and on every machine (unlike hash())"""
+    name = module_name if isinstance(module_name, str) else pp_name(module_name)
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big")
+
+
+def shard_modules(modules: list, index: int, count: int, costs: Optional[dict[str, float]] = None) -> list:
+    """
+    Modules of shard index (0 <= index < count), in their original order.
+    Every shard must be given the same module list (and the same costs) for the shards to be disjoint and complete.
+
+    :param costs: seconds per module name from an earlier run.  without it a module goes to ``shard_key % count``;
+        with it the modules are handed out most expensive first to the least loaded shard,
+        modules missing from costs counting as the mean cost
+    """
+    if not 0 <= index < count:
+        raise ValueError(f"shard {index} out of range for {count} shards")
+    names = [m if isinstance(m, str) else pp_name(m) for m in modules]
+    if costs is None:
+        return [m for m, name in zip(modules, names) if shard_key(name) % count == index]
+    known = [costs[name] for name in names if name in costs]
+    default = sum(known) / len(known) if known else 1.0
+    order = sorted(set(names), key=lambda name: (-costs.get(name, default), name))
+    loads = [(0.0, k) for k in range(count)]
+    assigned = {}
+    for name in order:
+        load, k = heapq.heappop(loads)
+        assigned[name] = k
+        heapq.heappush(loads, (load + costs.get(name, default), k))
+    return [m for m, name in zip(modules, names) if assigned[name] == index]
 
 
 M = TypeVar("M", bound="RootModel")
 
 
 class LeanProject:
-    def __init__(self, root: AnyPath, output_dir: AnyPath = ".jixia"):
+    def __init__(self, root: AnyPath, output_dir: AnyPath = ".jixia", cache: bool = True):
         """
         :param root: project root, where ``lakefile.lean`` or ``lakefile.toml`` is found
         :param output_dir: path of the directory where the output files will be placed, relative to `root`
+        :param cache: keep parsed plugin outputs in ``<output_dir>/.cache`` for later ``load_info`` calls
         """
         self.root = Path(root)
         self.output_dir = self.root / output_dir
+        self.cache = cache
 
     def all_lean_paths(self, base_dir) -> list[Path]:
         """Return the packages directory of the project"""
@@ -141,6 +414,13 @@ class LeanProject:
         run_initializers: bool = True,
         force: bool = False,
         max_workers: int | None = None,
+        on_complete: Optional[Callable[[LeanName, CompletedProcess | None], None]] = None,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        log_dir: Optional[AnyPath] = "logs",
+        capture_stderr: bool = False,
+        shard: Optional[tuple[int, int]] = None,
+        shard_costs: Optional[dict[str, float]] = None,
     ) -> list[tuple[LeanName, CompletedProcess]]:
         """
         Run jixia on every file in the context of this project.
@@ -150,13 +430,23 @@ class LeanProject:
         :param run_initializers:
         :param force:
             see documentation of :func:`run_jixia`
+        :param on_complete: called as ``on_complete(module, result)`` as soon as each module is finished,
+            in the calling thread, in order of completion
+        :param timeout:
+        :param memory_limit:
+            per-module limits, see documentation of :func:`run_jixia`
+        :param log_dir: send stderr of each module to ``<log_dir>/<module>.log``, relative to `output_dir`;
+            None sends it to temporary files.  either way the result keeps only the last STDERR_TAIL bytes
+        :param capture_stderr: see documentation of :func:`run_jixia`, log_dir is not used then
+        :param shard: (index, count), only run the modules of that shard
+        :param shard_costs:
+            see documentation of :func:`shard_modules`
         :return: a list of all (module, CompletedProcess | None) pairs
         """
-        modules = self.find_modules(base_dir)
-        if prefixes is not None:
-            modules = [m for m in modules if any(is_prefix_of(p, m) for p in prefixes)]
+        modules = self._batch_modules(base_dir, prefixes, shard, shard_costs)
         self.output_dir.mkdir(exist_ok=True)
         output_dir_path = self.output_dir.resolve()
+        log_path = None if log_dir is None or capture_stderr else output_dir_path / log_dir
         ret = []
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = {
@@ -169,6 +459,10 @@ class LeanProject:
                     Template(str(output_dir_path) + "/$module.$p.json"),
                     run_initializers,
                     force,
+                    timeout,
+                    memory_limit,
+                    None if log_path is None else log_path / f"{pp_name(m)}.log",
+                    capture_stderr,
                 ): m
                 for m in modules
             }
@@ -176,16 +470,92 @@ class LeanProject:
                 m = futures[f]
                 r: CompletedProcess | None = f.result()
                 ret.append((m, r))
-                if r is None:
-                    logger.info(f"skip {m}")
-                else:
-                    if r.returncode:
-                        logger.error(f"error while processing {m}: {r.stderr}")
-                        ret.append((m, r))
-                    else:
-                        logger.info(f"processed {m}: {r.stderr}")
+                if self._log_result(m, r):
+                    ret.append((m, r))
+                if on_complete is not None:
+                    on_complete(m, r)
         return ret
 
+    async def abatch_run_jixia(
+        self,
+        *,
+        base_dir: Optional[AnyPath] = None,
+        prefixes: Optional[list[LeanName]] = None,
+        plugins: Iterable[Plugin] = ALL_PLUGINS,
+        run_initializers: bool = True,
+        force: bool = False,
+        max_concurrency: int | None = None,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        log_dir: Optional[AnyPath] = "logs",
+        shard: Optional[tuple[int, int]] = None,
+        shard_costs: Optional[dict[str, float]] = None,
+    ) -> AsyncIterator[tuple[LeanName, CompletedProcess | None]]:
+        """
+        Async version of :meth:`batch_run_jixia`, yielding (module, CompletedProcess | None) as each module finishes.
+        All the jixia processes are waited on by the running event loop, no thread per process.
+
+        :param max_concurrency: jixia processes running at the same time, defaults to the number of CPUs
+        :param log_dir: as in :meth:`batch_run_jixia`
+
+        Closing the generator (``contextlib.aclosing``) or cancelling the consuming task
+        cancels the modules not finished yet and kills their jixia processes.
+        """
+        modules = self._batch_modules(base_dir, prefixes, shard, shard_costs)
+        self.output_dir.mkdir(exist_ok=True)
+        output_dir_path = self.output_dir.resolve()
+        log_path = None if log_dir is None else output_dir_path / log_dir
+        semaphore = asyncio.Semaphore(max_concurrency or os.cpu_count() or 1)
+
+        async def run_one(m: LeanName):
+            async with semaphore:
+                r = await arun_jixia(
+                    self.path_of_module(m, base_dir),
+                    pp_name(m),
+                    self.root,
+                    plugins,
+                    Template(str(output_dir_path) + "/$module.$p.json"),
+                    run_initializers,
+                    force,
+                    timeout,
+                    memory_limit,
+                    None if log_path is None else log_path / f"{pp_name(m)}.log",
+                )
+                return m, r
+
+        tasks = [asyncio.create_task(run_one(m)) for m in modules]
+        try:
+            for f in asyncio.as_completed(tasks):
+                m, r = await f
+                self._log_result(m, r)
+                yield m, r
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _batch_modules(self, base_dir: Optional[AnyPath], prefixes: Optional[list[LeanName]],
+                       shard: Optional[tuple[int, int]] = None, shard_costs: Optional[dict[str, float]] = None) -> list[LeanName]:
+        modules = self.find_modules(base_dir)
+        if prefixes is not None:
+            modules = [m for m in modules if any(is_prefix_of(p, m) for p in prefixes)]
+        if shard is not None:
+            # os.walk 的順序與檔案系統有關，先排序，每台機器拿到的清單才一樣
+            modules = shard_modules(sorted(modules), shard[0], shard[1], shard_costs)
+        return modules
+
+    @staticmethod
+    def _log_result(m: LeanName, r: CompletedProcess | None) -> bool:
+        """Log the result of one module, True if jixia failed"""
+        if r is None:
+            logger.info(f"skip {m}")
+            return False
+        if r.returncode:
+            logger.error(f"error while processing {m}: {r.stderr}")
+            return True
+        logger.info(f"processed {m}: {r.stderr}")
+        return False
+
     def load_module_info(self, module: LeanName) -> ModuleInfo:
         filename = f"{pp_name(module)}.mod.json"
         with (self.output_dir / filename).open() as fp:
@@ -197,6 +567,8 @@ class LeanProject:
 
     def load_info(self, module: LeanName, cls: type[M]) -> list[M]:
         filename = f"{pp_name(module)}.{plugin_short_name(cls._plugin_name)}.json"
+        if self.cache:
+            return load_cached(self.output_dir / filename, cls, cls.from_json_file)
         return cls.from_json_file(self.output_dir / filename)
 
     def has_info(self, module: LeanName, cls: type[M]) -> list[M]:
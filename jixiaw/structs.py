@@ -428,3 +428,8 @@ class InfoTree(RootModel):
     info: ElabInfo
     ref: PPSyntaxWithKind
     children: list[Self]
+
+
+class LineModel(RootModel):
+    _plugin_name = "line"
+    start: int
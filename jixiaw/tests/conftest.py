@@ -0,0 +1,42 @@
+import os
+import sys
+import types
+
+import pytest
+
+JIXIAW = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 和腳本一樣從 jixiaw 目錄 import jixia_api、comparison
+sys.path.insert(0, JIXIAW)
+# pydantic 建巢狀的 InfoTree 時遞迴很深
+sys.setrecursionlimit(100000)
+
+
+def _load_jixia():
+    """
+    run.py、cache.py、structs.py、structs_debug.py 是改過的 jixia 套件檔案：測試把 jixiaw 目錄當成 jixia 套件，
+    測的是這裡的版本而不是環境裡裝的那一份。缺少 pydantic 等依賴時直接 import 失敗，不會默默跳過。
+    """
+    package = types.ModuleType("jixia")
+    package.__path__ = [JIXIAW]
+    sys.modules["jixia"] = package
+    # 和 jixia/__init__.py 一樣
+    from jixia.run import run_jixia, executable, LeanProject
+    package.run_jixia = run_jixia
+    package.executable = executable
+    package.LeanProject = LeanProject
+    package.__all__ = ["run_jixia", "executable", "LeanProject"]
+
+
+_load_jixia()
+
+
+@pytest.fixture
+def synthetic_project(tmp_path):
+    """make(modules, dojo=False, **config) -> (root, module names), synthetic outputs of LeanBench.Synthetic<k>"""
+    from jixia_api.synthetic import SyntheticConfig, generate_project
+
+    def make(modules: int = 1, dojo: bool = False, **config):
+        names = [generate_project(tmp_path, SyntheticConfig(**config), ["LeanBench", f"Synthetic{k}"], dojo)
+                 for k in range(modules)]
+        return tmp_path, names
+    return make
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from jixia import LeanProject
+from jixia.cache import load_cached, cache_path
+from jixia.structs import Declaration, InfoTree, LineModel, Symbol
+from jixia.structs_debug import plugin_short_name
+
+PLUGIN_CLASSES = (Declaration, Symbol, InfoTree, LineModel)
+
+
+@pytest.mark.parametrize("cls", PLUGIN_CLASSES, ids=lambda cls: cls.__name__)
+def test_cache_round_trip(synthetic_project, cls):
+    root, (module_name,) = synthetic_project(theorems=20, goals=2)
+    project = LeanProject(root, cache=False)
+    json_path = project.output_dir / f"{'.'.join(module_name)}.{plugin_short_name(cls._plugin_name)}.json"
+    expected = project.load_info(module_name, cls)
+    assert expected
+
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        return cls.from_json_file(path)
+
+    assert load_cached(json_path, cls, loader) == expected
+    assert cache_path(json_path).is_file()
+    warm = load_cached(json_path, cls, loader)
+    assert len(calls) == 1
+    assert warm == expected
+    assert [m.model_dump() for m in warm] == [m.model_dump() for m in expected]
+
+    # JSON 重新產生（大小或 mtime 變了）之後 cache 不算數
+    stat = os.stat(json_path)
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_cached(json_path, cls, loader) == expected
+    assert len(calls) == 2
+
+
+def test_project_cache_matches_json(synthetic_project):
+    root, (module_name,) = synthetic_project(theorems=10)
+    cold = LeanProject(root, cache=False)
+    cached = LeanProject(root)
+    for cls in PLUGIN_CLASSES:
+        cached.load_info(module_name, cls)
+        assert cached.load_info(module_name, cls) == cold.load_info(module_name, cls)
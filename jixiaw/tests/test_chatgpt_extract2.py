@@ -0,0 +1,79 @@
+import random
+
+from chatgpt_extract2 import (
+    extract_theorems, extract_all_tactics, build_line_index, build_dataset,
+    group_tactics_by_theorem, locate_tactic_lines,
+)
+
+
+def pairwise_dataset(theorems, tactics, line_idx):
+    """build_dataset before the sweep: every theorem scans every tactic, every tactic scans every line"""
+    dataset = []
+    for thm in theorems:
+        start, end = thm["range"]
+        proof_steps = []
+        for t in tactics:
+            pos = t["range"][0]
+            if not (start <= pos <= end):
+                continue
+            best = None
+            for k in sorted(line_idx.keys()):
+                if k <= pos:
+                    best = k
+                else:
+                    break
+            line, pretty = (None, None) if best is None else (best, line_idx[best])
+            proof_steps.append({
+                "line": line,
+                "tactic_text": t["tactic_text"],
+                "semantic_before": t["semantic_before"],
+                "semantic_after": t["semantic_after"],
+                "pretty_state": pretty
+            })
+        dataset.append({"theorem_name": thm["name"], "theorem_type": thm["type"], "proof": proof_steps})
+    return dataset
+
+
+def random_module(rnd, size=2000):
+    decl = []
+    x = 0
+    while x < size:
+        start = rnd.randint(x, size)
+        stop = rnd.randint(start, min(size, start + 300))
+        decl.append({"name": ["thm", str(len(decl))], "type": "P", "range": [start, stop]})
+        if rnd.random() < 0.3:
+            # 巢狀的 declaration
+            inner = rnd.randint(start, stop)
+            decl.append({"name": ["inner", str(len(decl))], "type": "Q", "range": [inner, rnd.randint(inner, stop)]})
+        x = stop + rnd.randint(0, 20)
+    decl.append({"name": ["no_range"], "type": None, "range": None})
+    decl.append({"name": None, "range": [0, size]})
+    rnd.shuffle(decl)
+
+    def tactic(k):
+        start = rnd.randint(0, size)
+        return {"info": {"tactic": {"before": [f"b{k}"], "after": [f"a{k}"], "references": []}},
+                "ref": {"pp": f"tac{k}", "range": [start, start + rnd.randint(0, 30)]}}
+
+    elab = [{"info": {}, "ref": {}, "children": [tactic(k) for k in range(j, j + 10)] + [{"info": {"term": {}}, "ref": {}}]}
+            for j in range(0, 200, 10)]
+    elab.append(tactic(-1) | {"ref": {"pp": "no range", "range": None}})
+    lines = [{"start": s, "state": f"line {s}"} for s in sorted(rnd.sample(range(1, size), 100))] + [{"state": "none"}]
+    return decl, elab, lines
+
+
+def test_sweep_matches_pairwise_scan():
+    rnd = random.Random(0)
+    for _ in range(20):
+        decl, elab, lines = random_module(rnd)
+        theorems = extract_theorems(decl)
+        tactics = extract_all_tactics(elab)
+        line_idx = build_line_index(lines)
+        assert build_dataset(theorems, tactics, line_idx) == pairwise_dataset(theorems, tactics, line_idx)
+
+
+def test_group_and_locate():
+    theorems = [{"range": [0, 10]}, {"range": [2, 5]}, {"range": [12, 20]}]
+    tactics = [{"range": [r, r]} for r in (0, 3, 6, 11, 12, 25)]
+    assert group_tactics_by_theorem(theorems, tactics) == [[0, 1, 2], [1], [4]]
+    assert locate_tactic_lines(tactics, {1: "a", 6: "b"}) == [(None, None), (1, "a"), (6, "b"), (6, "b"), (6, "b"), (6, "b")]
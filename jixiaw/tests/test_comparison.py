@@ -0,0 +1,100 @@
+import json
+import random
+
+import pytest
+
+from comparison import OUTPUT_NAMES, compare_jsonl, compare_jsonl_streaming, compare_digests
+from jixia_api.digest import digest_jsonl, proof_digest
+
+
+def write_records(path, records):
+    with open(path, 'w', encoding='utf-8') as fd:
+        for record in records:
+            fd.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+@pytest.fixture
+def jsonl_pair(tmp_path):
+    """Two extraction outputs: some theorems dropped, some changed, some added, in another order"""
+    rnd = random.Random(0)
+    records = [{"module": f"LeanBench.Synthetic{k % 3}", "full_name": f"Synthetic{k % 3}.thm_{k}",
+                "tactic_proof": "\n  ".join(rnd.choice(["intro x", "simp", "omega", "rw [h]"]) for _ in range(4)),
+                "theorem_proof": "by ..."}
+               for k in range(60)]
+    other = [dict(record) for record in records[5:]]
+    for record in other[::4]:
+        record["tactic_proof"] += "\n  simp"
+    other += [{"module": "LeanBench.Extra", "full_name": f"定理_{k}", "tactic_proof": "rfl"} for k in range(3)]
+    rnd.shuffle(other)
+    file1, file2 = tmp_path / "file1.jsonl", tmp_path / "file2.jsonl"
+    write_records(file1, records)
+    write_records(file2, other)
+    return file1, file2
+
+
+def read_output(output_dir, name):
+    with open(output_dir / OUTPUT_NAMES[name], 'r', encoding='utf-8') as fd:
+        return fd.read()
+
+
+@pytest.fixture
+def reference(jsonl_pair, tmp_path, monkeypatch):
+    """Output directory of compare_jsonl"""
+    output_dir = tmp_path / "reference"
+    output_dir.mkdir()
+    # compare_jsonl 寫在目前目錄
+    monkeypatch.chdir(output_dir)
+    compare_jsonl(*jsonl_pair)
+    return output_dir
+
+
+@pytest.mark.parametrize("partitions, max_workers", [(1, 1), (4, 1), (7, 2)])
+def test_streaming_matches_in_memory(jsonl_pair, reference, tmp_path, partitions, max_workers):
+    output_dir = tmp_path / "streaming"
+    counts = compare_jsonl_streaming(*jsonl_pair, output_dir, partitions=partitions, max_workers=max_workers)
+    assert counts == {"only_in_1": 5, "only_in_2": 3, "same": 41, "different": 14}
+    for name in OUTPUT_NAMES:
+        assert read_output(output_dir, name) == read_output(reference, name)
+
+
+def keys_of(text):
+    return [(r["module"], r["full_name"]) for r in map(json.loads, text.splitlines())]
+
+
+def test_digest_matches_in_memory(jsonl_pair, reference, tmp_path):
+    file1, file2 = jsonl_pair
+    digest1, digest2 = tmp_path / "file1.digest.tsv", tmp_path / "file2.digest.tsv"
+    digest_jsonl(file1, digest1)
+    digest_jsonl(file2, digest2)
+    output_dir = tmp_path / "digest"
+    counts = compare_digests(digest1, digest2, file1, file2, output_dir)
+    assert counts == {"only_in_1": 5, "only_in_2": 3, "same": 41, "different": 14}
+    for name in ("only_in_1", "only_in_2", "different"):
+        assert read_output(output_dir, name) == read_output(reference, name)
+    # same.jsonl 在 digest 模式只有 key
+    assert keys_of(read_output(output_dir, "same")) == keys_of(read_output(reference, "same"))
+
+    # 沒給完整檔案時每個輸出都只有 key
+    compare_digests(digest1, digest2, output_dir=tmp_path / "keys")
+    for name in OUTPUT_NAMES:
+        assert keys_of(read_output(tmp_path / "keys", name)) == keys_of(read_output(reference, name))
+
+
+def test_digest_ignores_whitespace():
+    assert proof_digest("intro x\n  simp") == proof_digest("intro x simp ") != proof_digest("intro x\n  omega")
+    assert proof_digest(None) == proof_digest("")
+
+
+def test_summary_is_the_same_in_every_mode(jsonl_pair, tmp_path, monkeypatch, capsys):
+    file1, file2 = jsonl_pair
+    monkeypatch.chdir(tmp_path)
+    compare_jsonl(file1, file2)
+    in_memory = capsys.readouterr().out
+    assert "- 內容不同: 14" in in_memory
+    compare_jsonl_streaming(file1, file2, tmp_path / "streaming", partitions=2, max_workers=1)
+    assert capsys.readouterr().out.endswith(in_memory)
+    digest_jsonl(file1, tmp_path / "file1.digest.tsv")
+    digest_jsonl(file2, tmp_path / "file2.digest.tsv")
+    capsys.readouterr()
+    compare_digests(tmp_path / "file1.digest.tsv", tmp_path / "file2.digest.tsv", output_dir=tmp_path / "digest")
+    assert capsys.readouterr().out.endswith(in_memory)
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from jixia import LeanProject
+from jixia_api import proof, dojo
+
+
+@pytest.mark.parametrize("goals", [1, 3])
+def test_dojo_matches_jixia_on_tactic_proofs(synthetic_project, goals):
+    root, (module_name,) = synthetic_project(dojo=True, theorems=30, term_ratio=0.3, goals=goals)
+    project = LeanProject(root)
+    expected = [line for line in proof.process_module(project, module_name, {})
+                if json.loads(line)["theorem_proofType"] == "Tactic"]
+    # term proof 的 goal 只有 elaboration 才有，trace 裡沒有
+    assert 0 < len(expected) < 30
+    assert dojo.process_module(project, module_name, {}) == expected
+
+
+def test_stream_trace_matches_json(synthetic_project, tmp_path):
+    root, (module_name,) = synthetic_project(dojo=True, theorems=5)
+    project = LeanProject(root)
+    trace_path = dojo.find_dojo_trace(project, module_name)
+    with open(trace_path, 'r', encoding='utf-8') as fd:
+        trace = json.load(fd)
+    # ExtractData --stream：每行一筆紀錄
+    stream_path = tmp_path / "trace.ast.jsonl"
+    with open(stream_path, 'w', encoding='utf-8') as fd:
+        for tactic in trace["tactics"]:
+            fd.write(json.dumps({"tactic": tactic}) + "\n")
+
+    assert dojo.load_trace(stream_path) == dojo.load_trace(trace_path)
+    assert dojo.load_trace(stream_path, ("premises",)).tactics == []
+    assert dojo.process_module(project, module_name, {}, stream_path) == dojo.process_module(project, module_name, {})
+
+
+def test_find_token_skips_identifiers_containing_by():
+    source = b"theorem hby : standby := hby.trans by_cases\ntheorem t : p :=\n  by exact standby"
+    value_start = source.index(b":=")
+    # 直接找 b"by" 會停在 hby 裡
+    assert dojo.find_token(source, value_start, len(source), 1).group() == b"hby.trans"
+    value_start = source.index(b":=", value_start + 1)
+    by_token = dojo.find_token(source, value_start, len(source), 1)
+    assert by_token.group() == b"by" and by_token.start() == source.index(b"\n  by") + 3
+    assert dojo.find_token(source, value_start, len(source), 5) is None
+
+
+def test_missing_source_with_explicit_trace(synthetic_project):
+    root, (module_name,) = synthetic_project(dojo=True, theorems=3)
+    project = LeanProject(root)
+    trace_path = dojo.find_dojo_trace(project, module_name)
+    project.path_of_module(module_name).unlink()
+    assert dojo.process_module(project, module_name, {}, trace_path) == []
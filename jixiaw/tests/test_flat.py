@@ -0,0 +1,160 @@
+import json
+import random
+from dataclasses import asdict
+
+import pytest
+
+from jixia import LeanProject
+from jixia.structs import InfoTree, LineModel
+from jixia_api import proof, flat
+from jixia_api.synthetic import _tactic_node, _term_node
+
+
+def as_dicts(items):
+    # Term / Tactic 是 eq=False 的 dataclass
+    return [asdict(item) for item in items]
+
+
+@pytest.fixture
+def module_trees(synthetic_project):
+    root, (module_name,) = synthetic_project(theorems=40, goals=2, term_ratio=0.3)
+    project = LeanProject(root)
+    return module_name, project.load_info(module_name, InfoTree), project.load_info(module_name, LineModel)
+
+
+def test_flat_tactics_match_tree_walk(module_trees):
+    module_name, trees, lines = module_trees
+    expected = proof.collect_all_tactics(trees, lines)
+    assert len(expected) > 20
+    assert as_dicts(flat.collect_all_tactics(flat.flatten(trees), lines)) == as_dicts(expected)
+
+
+def test_flat_terms_match_tree_walk(module_trees):
+    module_name, trees, lines = module_trees
+    expected = proof.collect_all_terms(trees, lines, module_name)
+    assert expected
+    assert as_dicts(flat.collect_all_terms(flat.flatten(trees), lines)) == as_dicts(expected)
+
+
+def test_flatten_preorder(module_trees):
+    _, trees, _ = module_trees
+    tree = flat.flatten(trees)
+    nodes = []
+
+    def visit(node):
+        nodes.append(node)
+        for child in node.children:
+            visit(child)
+    for node in trees:
+        visit(node)
+    assert len(tree.start) == len(nodes)
+    assert [tree.start[k] for k in range(len(nodes))] == [flat.NONE if n.ref.range is None else n.ref.range[0] for n in nodes]
+
+
+def theorem_lines(extract, project, module_name):
+    return proof.create_theorem_lines(module_name, extract(project, module_name), {})
+
+
+def test_flat_theorems_match_tree_walk(synthetic_project):
+    root, (module_name,) = synthetic_project(theorems=40, goals=2, term_ratio=0.3)
+    project = LeanProject(root)
+    expected = theorem_lines(proof.extract_theorems, project, module_name)
+    assert len(expected) == 40
+    assert theorem_lines(flat.extract_theorems, project, module_name) == expected
+
+
+def test_flat_theorems_match_tree_walk_nested(synthetic_project):
+    root, (module_name,) = synthetic_project(theorems=10)
+    project = LeanProject(root)
+    path = project.output_dir / (".".join(module_name) + ".decl.json")
+    with open(path, 'r', encoding='utf-8') as fd:
+        declarations = json.load(fd)
+    theorems = [decl for decl in declarations if decl["kind"] == "theorem"]
+    # 包住第 2 到第 4 個定理的外層 declaration，tree walk 會把三個定理的 tactic 都算給它
+    outer = json.loads(json.dumps(theorems[2]))
+    outer["name"] = outer["name"][:-1] + ["outer"]
+    outer["ref"]["range"] = [theorems[2]["ref"]["range"][0], theorems[4]["ref"]["range"][1]]
+    declarations.append(outer)
+    with open(path, 'w', encoding='utf-8') as fd:
+        json.dump(declarations, fd)
+
+    expected = theorem_lines(proof.extract_theorems, project, module_name)
+    assert [json.loads(line)["theorem"] for line in expected].count("Synthetic0.outer") == 1
+    assert theorem_lines(flat.extract_theorems, project, module_name) == expected
+
+
+def laminar(rnd, count, lo, hi, out):
+    """Random ranges in [lo, hi] that are nested or disjoint"""
+    x = lo
+    while x < hi and len(out) < count:
+        start = rnd.randint(x, hi)
+        stop = rnd.randint(start, hi)
+        out.append((start, stop))
+        if rnd.random() < 0.5:
+            laminar(rnd, count, start, stop, out)
+        x = stop + 1
+    return out
+
+
+def random_ranges(rnd):
+    outer = laminar(rnd, 20, 0, 1000, [])
+    rnd.shuffle(outer)
+    inner = [(start, start + rnd.randint(0, 50)) for start in (rnd.randint(0, 1000) for _ in range(100))]
+    return outer, inner
+
+
+def containing(outer, s, e):
+    return [j for j, (outer_start, outer_stop) in enumerate(outer) if outer_start <= s and e <= outer_stop]
+
+
+def test_containment_join_brute_force():
+    rnd = random.Random(1)
+    for _ in range(200):
+        outer, inner = random_ranges(rnd)
+        owner = flat.containment_join([s for s, _ in outer], [e for _, e in outer], [s for s, _ in inner], [e for _, e in inner])
+        for k, (s, e) in enumerate(inner):
+            around = containing(outer, s, e)
+            if not around:
+                assert owner[k] == flat.NONE
+                continue
+            # 最內層：其他包住它的 range 都包住 owner
+            start, stop = outer[owner[k]]
+            assert owner[k] in around
+            assert all(outer[j][0] <= start and stop <= outer[j][1] for j in around)
+
+
+def test_containment_groups_brute_force():
+    rnd = random.Random(2)
+    for _ in range(200):
+        outer, inner = random_ranges(rnd)
+        groups = flat.containment_groups([s for s, _ in outer], [e for _, e in outer], [s for s, _ in inner], [e for _, e in inner])
+        for j, (outer_start, outer_stop) in enumerate(outer):
+            assert list(groups[j]) == [k for k, (s, e) in enumerate(inner) if outer_start <= s and e <= outer_stop]
+
+
+def random_tactic_node(rnd, start, stop, depth):
+    """Tactic (or term) node over [start, stop] with nested children, some over the same range as their parent"""
+    children = []
+    x = start
+    while depth and x <= stop and rnd.random() < 0.75:
+        child_start = x if rnd.random() < 0.3 else rnd.randint(x, stop)
+        child_stop = stop if rnd.random() < 0.3 else rnd.randint(child_start, stop)
+        children.append(random_tactic_node(rnd, child_start, child_stop, depth - 1))
+        x = child_stop + rnd.randint(0, 1)
+    pp = rnd.choice(["simp", "omega", "exact h", "by", "constructor; simp", "intro x\n  simp"])
+    if rnd.random() < 0.2:
+        return _term_node(start, stop, pp, ["ident"], pp, "Prop", None, children)
+    return _tactic_node(start, stop, pp, ["Lean", "Parser", "Tactic", "tactic"], [], [], [], children)
+
+
+def test_flat_tactics_match_tree_walk_nested():
+    rnd = random.Random(3)
+    lines = LineModel.from_obj([{"start": 40 * k} for k in range(30)])
+    for _ in range(100):
+        roots = [random_tactic_node(rnd, 100 * k, 100 * k + 90, 6) for k in range(10)]
+        # 最外層是 by 區塊（pp 剛好是 "by" 的 root 在 tree walk 會失敗）
+        roots = [_tactic_node(100 * k, 100 * k + 90, "by\n  simp", ["Lean", "Parser", "Term", "byTactic"], [], [], [], [root])
+                 for k, root in enumerate(roots)]
+        trees = InfoTree.from_obj(roots)
+        expected = proof.collect_all_tactics(trees, lines)
+        assert as_dicts(flat.collect_all_tactics(flat.flatten(trees), lines)) == as_dicts(expected)
@@ -0,0 +1,59 @@
+from jixia_api import proof
+from jixia_api.journal import RunJournal, OK, FAILED
+
+
+def test_journal_resume(tmp_path):
+    path = tmp_path / "out" / ".journal"
+    journal = RunJournal(path)
+    journal.record(["A"])
+    journal.record(["A", "B"], FAILED, error="boom")
+    journal.close()
+    # crash 在寫到一半的那一行
+    with open(path, 'a', encoding='utf-8') as fd:
+        fd.write('{"module": "A.B.C", "sta')
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.done(["A"]) and resumed.done("A")
+    assert not resumed.done(["A", "B"]) and not resumed.done(["A", "B", "C"])
+    assert resumed.remaining([["A"], ["A", "B"], ["A", "B", "C"]]) == [["A", "B"], ["A", "B", "C"]]
+    assert [entry["module"] for entry in resumed.done_entries()] == ["A"]
+    resumed.close()
+
+    assert RunJournal(path).entries == {}
+    assert path.read_text() == ""
+
+
+def test_process_searches_resume(synthetic_project, monkeypatch):
+    root, modules = synthetic_project(3, theorems=5)
+    output_dir = root / ".jixiaw"
+    process_module = proof.process_module
+    processed = []
+
+    def failing(project, module_name, operatorSet):
+        processed.append(".".join(module_name))
+        if module_name[-1] == "Synthetic1":
+            raise RuntimeError("boom")
+        return process_module(project, module_name, operatorSet)
+
+    monkeypatch.setattr(proof, "process_module", failing)
+    proof.process_searches(str(root), ["LeanBench"])
+    assert sorted(processed) == ["LeanBench.Synthetic0", "LeanBench.Synthetic1", "LeanBench.Synthetic2"]
+    statuses = {m: e["status"] for m, e in RunJournal(output_dir / ".journal", resume=True).entries.items()}
+    assert statuses == {"LeanBench.Synthetic0": OK, "LeanBench.Synthetic1": FAILED, "LeanBench.Synthetic2": OK}
+    assert not (output_dir / "LeanBench.Synthetic1.jsonl").exists()
+
+    first = {m: (output_dir / f"{m}.jsonl").read_bytes() for m in ("LeanBench.Synthetic0", "LeanBench.Synthetic2")}
+    processed.clear()
+    monkeypatch.setattr(proof, "process_module", lambda *args: processed.append(".".join(args[1])) or process_module(*args))
+    proof.process_searches(str(root), ["LeanBench"], resume=True)
+    assert processed == ["LeanBench.Synthetic1"]
+    assert RunJournal(output_dir / ".journal", resume=True).done(["LeanBench", "Synthetic1"])
+    resumed = {m: (output_dir / f"{m}.jsonl").read_bytes() for m in first}
+    assert resumed == first
+
+    # 重新從頭跑的輸出和 resume 的一樣
+    resumed_output = (output_dir / "LeanBench.Synthetic1.jsonl").read_bytes()
+    processed.clear()
+    proof.process_searches(str(root), ["LeanBench"])
+    assert len(processed) == 3
+    assert (output_dir / "LeanBench.Synthetic1.jsonl").read_bytes() == resumed_output
@@ -0,0 +1,84 @@
+import filecmp
+import threading
+
+from jixia import LeanProject
+from jixia_api import pipeline, proof, copy_module
+from jixia_api.journal import RunJournal, OK, FAILED
+
+
+class FailOn(pipeline.Sink):
+    """Fails extracting one module"""
+
+    def __init__(self, module_id: str):
+        self.module_id = module_id
+
+    def extract(self, project, inputs):
+        if ".".join(inputs.module_name) == self.module_id:
+            raise RuntimeError("extract failed")
+        return None
+
+
+def run(root, output_dir, loaders):
+    sinks = [pipeline.TheoremSink(str(output_dir)), pipeline.CopySink(str(output_dir / "copy")),
+             FailOn("LeanBench.Synthetic2")]
+    pipeline.process_searches(str(root), ["LeanBench"], [], sinks, loaders=loaders, queue_size=1,
+                              journal_path=str(output_dir / ".journal"))
+    entries = RunJournal(output_dir / ".journal", resume=True).entries
+    return {module: entry["status"] for module, entry in entries.items()}
+
+
+def same_tree(left, right):
+    compare = filecmp.dircmp(left, right, ignore=[".journal"])
+    if compare.left_only or compare.right_only:
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(left, right, compare.common_files, shallow=False)
+    return not mismatch and not errors and all(same_tree(left / d, right / d) for d in compare.common_dirs)
+
+
+def test_fused_pipeline_matches_separate_runs(synthetic_project):
+    root, modules = synthetic_project(3, theorems=8)
+    stats = pipeline.StatsSink()
+    sinks = [pipeline.TheoremSink(str(root / "fused")), pipeline.CopySink(str(root / "fused" / "copy")), stats]
+    pipeline.process_searches(str(root), ["LeanBench"], [], sinks)
+
+    copy_module.process_searches(str(root), ["LeanBench"], [])
+    project = LeanProject(root)
+    assert sorted(p.name for p in (root / "fused").glob("*.jsonl")) == [f"{'.'.join(m)}.jsonl" for m in modules]
+    for module_name in modules:
+        expected = '\n'.join(proof.process_module(project, module_name, {})) + '\n'
+        assert (root / "fused" / f"{'.'.join(module_name)}.jsonl").read_text(encoding='utf-8') == expected
+    assert same_tree(root / "fused" / "copy", root / ".jixiaw_test")
+    assert stats.stats["modules"] == 3
+    assert stats.stats["theorems"] == 24
+
+
+def test_staged_matches_sequential(synthetic_project):
+    root, modules = synthetic_project(5, theorems=8)
+    # 壞掉的 mod.json：CopySink 載入失敗
+    (root / ".jixia" / "LeanBench.Synthetic1.mod.json").write_text("{broken")
+    expected = {
+        "LeanBench.Synthetic0": OK,
+        "LeanBench.Synthetic1": FAILED,
+        "LeanBench.Synthetic2": FAILED,
+        "LeanBench.Synthetic3": OK,
+        "LeanBench.Synthetic4": OK,
+    }
+    assert run(root, root / "sequential", loaders=0) == expected
+    assert run(root, root / "staged", loaders=2) == expected
+    assert (root / "sequential" / "LeanBench.Synthetic0.jsonl").is_file()
+    assert same_tree(root / "sequential", root / "staged")
+
+
+def test_staged_stops_when_a_stage_dies(synthetic_project):
+    class Die(pipeline.Sink):
+        def extract(self, project, inputs):
+            raise SystemExit("extractor gone")
+
+    root, modules = synthetic_project(4, theorems=2)
+    # extractor 不在了，loader 不能一直卡在滿的 queue 上
+    runner = threading.Thread(target=pipeline.run_staged_pipeline,
+                              args=(LeanProject(str(root)), modules, [Die()]), kwargs=dict(loaders=2, queue_size=1),
+                              daemon=True)
+    runner.start()
+    runner.join(30)
+    assert not runner.is_alive()
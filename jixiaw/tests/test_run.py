@@ -0,0 +1,145 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from jixia import run
+
+# 記憶體用 /proc 讀，行程群組用 killpg
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc")
+
+ALLOCATE = "x = bytearray(300 << 20); import time; time.sleep(30)"
+
+
+@pytest.fixture(autouse=True)
+def short_grace(monkeypatch):
+    monkeypatch.setattr(run, "KILL_GRACE", 1.0)
+
+
+def alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as fp:
+            stat = fp.read()
+    except OSError:
+        return False
+    return stat[stat.rindex(")") + 2] != "Z"
+
+
+def wait_gone(pid: int, seconds: float = 5.0) -> bool:
+    deadline = time.monotonic() + seconds
+    while alive(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_timeout_kills_the_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    log_file = tmp_path / "logs" / "A.log"
+    start = time.monotonic()
+    result = run._run_limited(["bash", "-c", f"echo started >&2; sleep 30 & echo $! > {pid_file}; sleep 30"],
+                              None, 1, None, log_file)
+    assert time.monotonic() - start < 10
+    assert result.returncode == -signal.SIGTERM
+    assert "started" in result.stderr
+    assert "killed: timeout" in result.stderr
+    assert log_file.read_text() == result.stderr
+    assert wait_gone(int(pid_file.read_text()))
+
+
+def test_memory_limit_counts_grandchildren(tmp_path):
+    child = f"import subprocess, sys; subprocess.run([sys.executable, '-c', {ALLOCATE!r}])"
+    start = time.monotonic()
+    result = run._run_limited([sys.executable, "-c", child], None, None, 100 << 20, None, poll_interval=0.1)
+    assert time.monotonic() - start < 20
+    assert result.returncode < 0
+    assert "killed: memory" in result.stderr
+
+
+def test_within_limits(tmp_path):
+    result = run._run_limited([sys.executable, "-c", "import sys; sys.stderr.write('e' * 200000); sys.exit(3)"],
+                              None, 30, 1 << 30, None, poll_interval=0.1)
+    assert result.returncode == 3
+    # log_file 沒給時只留最後 STDERR_TAIL
+    assert result.stderr == "e" * run.STDERR_TAIL
+
+
+@pytest.fixture
+def fake_jixia(tmp_path, monkeypatch):
+    """
+    lake env <jixia> ... FILE, the fake jixia leaving a sleeping grandchild and writing its pid to FILE.pid;
+    both sleep FAKE_JIXIA_SLEEP seconds (30 by default)
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "lake").write_text('#!/bin/bash\nshift\nexec "$@"\n')
+    (bin_dir / "jixia").write_text('#!/bin/bash\nfile="${@: -1}"\necho "processing $file" >&2\n'
+                                   'sleep ${FAKE_JIXIA_SLEEP:-30} & echo $! > "$file.pid"\nsleep ${FAKE_JIXIA_SLEEP:-30}\n')
+    for script in bin_dir.iterdir():
+        script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    monkeypatch.setattr(run, "executable", "jixia")
+    source = tmp_path / "A.lean"
+    source.write_text("")
+    return source
+
+
+def test_run_jixia_timeout(fake_jixia, tmp_path):
+    log_file = tmp_path / "logs" / "A.log"
+    result = run.run_jixia(fake_jixia, root=fake_jixia.parent, plugins=["declaration"], force=True,
+                           timeout=1, log_file=log_file)
+    assert result.returncode == -signal.SIGTERM
+    assert "processing" in result.stderr and "killed: timeout" in result.stderr
+    assert log_file.read_text() == result.stderr
+    assert wait_gone(int(fake_jixia.with_suffix(".lean.pid").read_text()))
+
+
+def test_run_jixia_limited_by_default(fake_jixia, monkeypatch):
+    monkeypatch.setenv("FAKE_JIXIA_SLEEP", "0")
+    limited = []
+    run_limited = run._run_limited
+    monkeypatch.setattr(run, "_run_limited", lambda *args: limited.append(args) or run_limited(*args))
+    result = run.run_jixia(fake_jixia, root=fake_jixia.parent, plugins=["declaration"], force=True)
+    assert result.returncode == 0
+    # 預設走 _run_limited：新的行程群組，stderr 寫到暫存檔
+    assert len(limited) == 1
+    assert result.stderr == f"processing {fake_jixia}\n"
+    piped = run.run_jixia(fake_jixia, root=fake_jixia.parent, plugins=["declaration"], force=True, capture_stderr=True)
+    assert piped.stderr == result.stderr
+    assert len(limited) == 1
+    with pytest.raises(ValueError):
+        run.run_jixia(fake_jixia, root=fake_jixia.parent, plugins=["declaration"], force=True, capture_stderr=True, timeout=1)
+
+
+def test_batch_run_jixia_logs_by_default(fake_jixia, monkeypatch):
+    monkeypatch.setenv("FAKE_JIXIA_SLEEP", "0")
+    project = run.LeanProject(fake_jixia.parent)
+    [(module, result)] = project.batch_run_jixia(plugins=["declaration"], force=True)
+    assert module == ("A",)
+    assert (project.output_dir / "logs" / "A.log").read_text() == result.stderr == f"processing {fake_jixia}\n"
+
+
+def test_arun_jixia_timeout(fake_jixia):
+    result = asyncio.run(run.arun_jixia(fake_jixia, root=fake_jixia.parent, plugins=["declaration"], force=True, timeout=1))
+    assert result.returncode == -signal.SIGTERM
+    assert "processing" in result.stderr and "killed: timeout" in result.stderr
+    assert wait_gone(int(fake_jixia.with_suffix(".lean.pid").read_text()))
+
+
+def test_arun_jixia_cancel(fake_jixia):
+    pid_file = fake_jixia.with_suffix(".lean.pid")
+
+    async def cancel():
+        task = asyncio.create_task(run.arun_jixia(fake_jixia, root=fake_jixia.parent, plugins=["declaration"], force=True))
+        while not pid_file.exists() or not pid_file.read_text().strip():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert wait_gone(int(pid_file.read_text()))
@@ -0,0 +1,101 @@
+import hashlib
+import json
+
+import pytest
+
+from jixia.run import shard_key, shard_modules
+from jixia_api.journal import RunJournal, FAILED
+from jixia_api.shard import parse_shard, select_shard, write_manifest, merge_shards, MANIFEST
+from jixia_ast_extract import module_of_ast_file
+
+MODULES = [["Mathlib", "M" + str(k)] for k in range(50)] + [["A"], ["A", "B"], ["A", "B", "C"]]
+
+
+@pytest.mark.parametrize("count", [1, 3, 8])
+@pytest.mark.parametrize("costs", [None, {"A": 100.0, "A.B": 1.0, "Mathlib.M3": 40.0}])
+def test_shards_are_disjoint_and_complete(count, costs):
+    shards = [shard_modules(MODULES, k, count, costs) for k in range(count)]
+    assigned = [".".join(m) for shard in shards for m in shard]
+    assert sorted(assigned) == sorted(".".join(m) for m in MODULES)
+    for shard in shards:
+        # 保留原本的順序
+        assert shard == [m for m in MODULES if m in shard]
+    # 其他機器看到不同順序的清單也分到一樣的 shard
+    assert [sorted(select_shard(list(reversed(MODULES)), (k, count), costs)) for k in range(count)] == \
+           [sorted(select_shard(MODULES, (k, count), costs)) for k in range(count)]
+
+
+def test_hash_shard_is_stable():
+    expected = int.from_bytes(hashlib.blake2b(b"A.B", digest_size=8).digest(), "big")
+    assert shard_key(["A", "B"]) == shard_key("A.B") == expected
+    assert shard_modules(MODULES, 0, 1) == MODULES
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for text in ("4/4", "-1/2", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+def test_ast_files_shard_by_module():
+    assert module_of_ast_file("Mathlib.Data.Nat.ast.json") == "Mathlib.Data.Nat"
+    assert module_of_ast_file("A.elab.json") == "A"
+
+
+def write_shard(shard_dir, shard, modules, done=(), failed=(), files=()):
+    shard_dir.mkdir(exist_ok=True)
+    for name in files:
+        (shard_dir / name).write_text(f"{shard_dir.name}:{name}")
+    journal = RunJournal(shard_dir / f".journal.shard-{shard[0]}-of-{shard[1]}")
+    for module in done:
+        journal.record(module)
+    for module in failed:
+        journal.record(module, FAILED)
+    journal.close()
+    write_manifest(shard_dir, shard, modules, journal)
+
+
+def test_merge_shards(tmp_path):
+    write_shard(tmp_path / "s0", (0, 2), [["A"], ["B"]], done=["A"], failed=["B"],
+                files=["A.jsonl", "A.decl.json", "B.jsonl"])
+    write_shard(tmp_path / "s1", (1, 2), [["C"], ["D"]], done=["C"], files=["C.jsonl", "D.jsonl", "notes.txt"])
+    output = tmp_path / "merged"
+    merged = merge_shards(output, [tmp_path / "s0", tmp_path / "s1"])
+
+    assert sorted(p.name for p in output.iterdir()) == [".journal", "A.decl.json", "A.jsonl", "C.jsonl", MANIFEST]
+    assert (output / "A.jsonl").read_text() == "s0:A.jsonl"
+    assert merged["done"] == ["A", "C"]
+    assert merged["failed"] == ["B"]
+    assert merged["unfinished"] == ["D"]
+    assert merged["missing_shards"] == []
+    assert json.loads((output / MANIFEST).read_text()) == merged
+    assert sorted(RunJournal(output / ".journal", resume=True).entries) == ["A", "C"]
+
+
+def test_merge_copies_only_finished_modules(tmp_path):
+    # A.B 失敗、A.B.C 沒跑完，它們留下的檔案和 A 的檔名前綴相同，都不能算成 A 的
+    write_shard(tmp_path / "s0", (0, 2), [["A"], ["A", "B"]], done=["A"], failed=["A.B"],
+                files=["A.jsonl", "A.decl.json", "A.B.jsonl", "A.B.decl.json"])
+    # s1 留著舊的 A.jsonl，A 屬於 shard 0
+    write_shard(tmp_path / "s1", (1, 2), [["A", "B", "C"], ["C"]], done=["C"],
+                files=["A.jsonl", "A.B.C.jsonl", "C.jsonl", "notes.txt"])
+    output = tmp_path / "merged"
+    merged = merge_shards(output, [tmp_path / "s0", tmp_path / "s1"])
+
+    assert sorted(p.name for p in output.iterdir()) == [".journal", "A.decl.json", "A.jsonl", "C.jsonl", MANIFEST]
+    assert (output / "A.jsonl").read_text() == "s0:A.jsonl"
+    assert merged["failed"] == ["A.B"]
+    assert merged["unfinished"] == ["A.B.C"]
+
+
+def test_merge_reports_missing_shards(tmp_path):
+    write_shard(tmp_path / "s0", (0, 3), [["A"]], done=["A"], files=["A.jsonl"])
+    assert merge_shards(tmp_path / "s0", [tmp_path / "s0"])["missing_shards"] == [1, 2]
+
+
+def test_merge_rejects_overlapping_shards(tmp_path):
+    write_shard(tmp_path / "s0", (0, 2), [["A"]], done=["A"])
+    write_shard(tmp_path / "s1", (1, 2), [["A"]], done=["A"])
+    with pytest.raises(ValueError):
+        merge_shards(tmp_path / "merged", [tmp_path / "s0", tmp_path / "s1"])